@@ -0,0 +1,138 @@
+"""Compressed, month-partitioned archive of old activity log rows.
+
+Each archival run writes one gzip JSONL segment per calendar month it
+touched, under ``<directory>/<YYYY>/<MM>/``. A segment is written to a
+temporary file, fsynced and renamed into place, so the caller can delete the
+archived rows from the database once ``write_segments`` returns and a crash
+can never leave a row in neither place.
+"""
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime
+
+SEGMENT_SUFFIX = '.jsonl.gz'
+
+
+def encode_row(row):
+    return {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in row.items()}
+
+
+def month_range(start, end):
+    """(year, month) pairs from ``end`` back to ``start``, newest first."""
+    year, month = end.year, end.month
+    while (year, month) >= (start.year, start.month):
+        yield year, month
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+
+
+class ActivityArchive:
+    def __init__(self, directory, compresslevel=6):
+        self.directory = directory
+        self.compresslevel = compresslevel
+
+    def _month_dir(self, year, month):
+        return os.path.join(self.directory, f'{year:04d}', f'{month:02d}')
+
+    def write_segments(self, rows):
+        """Write ``rows`` (dicts with ``id`` and a ``created_at`` datetime,
+        in id order) and return a list of (path, row_count)."""
+        open_segments = {}
+        try:
+            for row in rows:
+                created_at = row['created_at']
+                key = (created_at.year, created_at.month)
+                segment = open_segments.get(key)
+                if segment is None:
+                    month_dir = self._month_dir(*key)
+                    os.makedirs(month_dir, exist_ok=True)
+                    fd, temp_path = tempfile.mkstemp(dir=month_dir, suffix='.tmp')
+                    handle = gzip.GzipFile(fileobj=os.fdopen(fd, 'wb'), mode='wb', compresslevel=self.compresslevel)
+                    segment = open_segments[key] = {'temp_path': temp_path, 'handle': handle,
+                                                    'first_id': row['id'], 'last_id': row['id'], 'count': 0}
+                segment['handle'].write(json.dumps(encode_row(row)).encode('utf-8') + b'\n')
+                segment['last_id'] = row['id']
+                segment['count'] += 1
+        except BaseException:
+            for segment in open_segments.values():
+                segment['handle'].close()
+                segment['handle'].fileobj.close()
+                os.remove(segment['temp_path'])
+            raise
+
+        written = []
+        for (year, month), segment in sorted(open_segments.items()):
+            fileobj = segment['handle'].fileobj
+            segment['handle'].close()
+            fileobj.flush()
+            os.fsync(fileobj.fileno())
+            fileobj.close()
+            path = os.path.join(self._month_dir(year, month),
+                                f'{segment["first_id"]:012d}-{segment["last_id"]:012d}{SEGMENT_SUFFIX}')
+            os.replace(segment['temp_path'], path)
+            written.append((path, segment['count']))
+        return written
+
+    def _segments(self, year, month):
+        month_dir = self._month_dir(year, month)
+        try:
+            names = sorted(name for name in os.listdir(month_dir) if name.endswith(SEGMENT_SUFFIX))
+        except OSError:
+            return []
+        return [os.path.join(month_dir, name) for name in names]
+
+    def months(self):
+        """Archived (year, month) pairs, oldest first."""
+        found = []
+        try:
+            years = os.listdir(self.directory)
+        except OSError:
+            return found
+        for year in sorted(years):
+            if not year.isdigit():
+                continue
+            for month in sorted(os.listdir(os.path.join(self.directory, year))):
+                if month.isdigit() and self._segments(int(year), int(month)):
+                    found.append((int(year), int(month)))
+        return found
+
+    def read(self, start=None, end=None, faculty_id=None, action=None):
+        """Yield archived rows between ``start`` and ``end`` (datetimes,
+        either may be None), newest first, optionally for one faculty
+        member or action."""
+        months = self.months()
+        if not months:
+            return
+        first = start or datetime(*months[0], 1)
+        last = end or datetime(*months[-1], 1)
+        for year, month in month_range(first, last):
+            rows = []
+            for path in self._segments(year, month):
+                with gzip.open(path, 'rt', encoding='utf-8') as handle:
+                    for line in handle:
+                        row = json.loads(line)
+                        if faculty_id is not None and row['faculty_id'] != faculty_id:
+                            continue
+                        if action is not None and row['action'] != action:
+                            continue
+                        created_at = datetime.fromisoformat(row['created_at'])
+                        if (start and created_at < start) or (end and created_at >= end):
+                            continue
+                        rows.append(row)
+            rows.sort(key=lambda row: (row['created_at'], row['id']), reverse=True)
+            yield from rows
+
+    def get_stats(self):
+        stats = {'months': 0, 'segments': 0, 'bytes': 0, 'oldest': None, 'newest': None}
+        months = self.months()
+        for year, month in months:
+            for path in self._segments(year, month):
+                stats['segments'] += 1
+                stats['bytes'] += os.path.getsize(path)
+        if months:
+            stats['months'] = len(months)
+            stats['oldest'] = '%04d-%02d' % months[0]
+            stats['newest'] = '%04d-%02d' % months[-1]
+        return stats
@@ -0,0 +1,127 @@
+"""Background writer that batches audit-log rows.
+
+Requests hand rows to ``submit`` and return immediately; a daemon thread
+drains the bounded queue and passes lists of rows to the ``flush`` callable
+once ``batch_size`` rows are waiting or the oldest one has waited
+``flush_interval`` seconds. When the queue is full new rows are dropped and
+counted instead of blocking the request.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class BatchedWriter:
+    def __init__(self, flush, max_queue=10000, batch_size=100, flush_interval=1.0, logger=None):
+        self.flush_rows = flush
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        self._stats_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+    def _ensure_started(self):
+        # A forked worker inherits the queue object but not the thread, so
+        # every process starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        return True
+
+    def flush(self, timeout=5.0):
+        """Block until everything submitted so far has been written."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.flush_rows(batch)
+            self._count('written', len(batch))
+            self._count('batches')
+        except Exception as e:
+            self._count('failed', len(batch))
+            self.logger.error('Error writing %d activity log rows: %s', len(batch), e)
+
+    def _run(self):
+        batch = []
+        batch_started = 0.0
+        while True:
+            if batch:
+                wait = max(0.0, batch_started + self.flush_interval - time.monotonic())
+            else:
+                wait = None
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(batch)
+                return
+            if isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                item.set()
+                continue
+            if item is not None:
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(item)
+
+            if batch and (len(batch) >= self.batch_size
+                          or time.monotonic() - batch_started >= self.flush_interval):
+                self._write(batch)
+                batch = []
@@ -1,9 +1,51 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, send_file, jsonify, abort, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from sqlalchemy import and_, column, event, inspect, or_, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from werkzeug.http import is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
+from activity_archive import ActivityArchive
+from activity_writer import BatchedWriter
+from chunked_upload import ChunkedUploadStore, OffsetMismatch, UploadError
+from counter_buffer import CounterBuffer
+from event_stream import EventBroadcaster, StreamFull
+from file_index import FileIndex
+from image_variants import content_type as variant_content_type, discard_output, render_variants
+from identity_cache import IdentityCache
+from job_worker import JobWorker
+from mail_outbox import OutboxSender, create_transport
+from pdf_processing import extract_pdf_text as read_pdf_text, process_pdf
+from pyqp_import import ManifestError, load_manifest, open_source, plan_import
+from rate_limiter import RateLimiter
+from request_profiler import RequestProfiler
+from response_cache import ResponseCache
+from static_assets import StaticManifest, build as build_static_assets
+from storage import create_storage
+import base64
+import binascii
+import click
+import collections
+import contextlib
+import functools
+import hashlib
+import hmac
+import importlib.util
+import itertools
+import json
+import mimetypes
 import os
-from datetime import datetime
+import posixpath
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime, parseaddr
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -21,15 +63,217 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///school.db'
     app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'static', 'uploads')
 
+if os.environ.get('DATABASE_URL'):
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+if os.environ.get('UPLOAD_FOLDER'):
+    app.config['UPLOAD_FOLDER'] = os.environ['UPLOAD_FOLDER']
+
+# Uploaded files live in STORAGE_BACKEND: 'local' keeps them in UPLOAD_FOLDER,
+# 's3' in a bucket of any S3-compatible store (AWS S3, MinIO, R2; needs
+# boto3), with UPLOAD_FOLDER left as scratch space for uploads in progress.
+# Credentials left unset come from boto3's own chain. Downloads and images
+# from a bucket are redirects to URLs presigned for STORAGE_URL_EXPIRES seconds.
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')
+app.config['STORAGE_S3_BUCKET'] = os.environ.get('STORAGE_S3_BUCKET')
+app.config['STORAGE_S3_PREFIX'] = os.environ.get('STORAGE_S3_PREFIX', '')
+app.config['STORAGE_S3_ENDPOINT_URL'] = os.environ.get('STORAGE_S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+app.config['STORAGE_S3_REGION'] = os.environ.get('STORAGE_S3_REGION')
+app.config['STORAGE_S3_ACCESS_KEY'] = os.environ.get('STORAGE_S3_ACCESS_KEY')
+app.config['STORAGE_S3_SECRET_KEY'] = os.environ.get('STORAGE_S3_SECRET_KEY')
+app.config['STORAGE_S3_ADDRESSING_STYLE'] = os.environ.get('STORAGE_S3_ADDRESSING_STYLE')  # 'path' for MinIO
+app.config['STORAGE_URL_EXPIRES'] = int(os.environ.get('STORAGE_URL_EXPIRES', 3600))
+
+# Creating the schema and sample data is an explicit `flask init-db` step.
+# Serverless instances start from an empty /tmp database, so there it runs
+# automatically, once per process, before the first request is handled.
+# Otherwise the first request checks that the schema is up to date and, until
+# `flask init-db` has been run, answers 503 with a message saying so.
+app.config['AUTO_INIT_DB'] = os.environ.get('AUTO_INIT_DB', '1' if os.environ.get('VERCEL') else '0') == '1'
+
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['SESSION_COOKIE_SECURE'] = True
+app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE', '1') == '1'
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+# SQLite engine profile: 'production' switches to WAL so readers never wait
+# for writers, relaxes fsync to NORMAL, enlarges the page cache and mmap
+# window and sizes the connection pool; 'default' keeps SQLite's own settings
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 10))
+app.config['SQLITE_MAX_OVERFLOW'] = int(os.environ.get('SQLITE_MAX_OVERFLOW', 20))
+
+def use_sqlite_profile():
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    return (app.config['SQLITE_PROFILE'] == 'production'
+            and uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') != 'sqlite:')
+
+if use_sqlite_profile():
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': app.config['SQLITE_POOL_SIZE'],
+        'max_overflow': app.config['SQLITE_MAX_OVERFLOW'],
+        'connect_args': {
+            'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+            'check_same_thread': False
+        }
+    }
+
+# Rendered-page cache: 'memory' (per-process LRU), 'filesystem', 'redis' or 'null' to disable
+app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+app.config['RESPONSE_CACHE_DIR'] = os.environ.get('RESPONSE_CACHE_DIR', os.path.join(app.instance_path, 'page_cache'))
+app.config['RESPONSE_CACHE_REDIS_URL'] = os.environ.get('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+# PYQP downloads: 'direct' streams from Flask, 'x-sendfile' (Apache/lighttpd) and
+# 'x-accel-redirect' (nginx) hand a local file over to the reverse proxy, and
+# 'redirect' sends clients to a presigned object store URL
+app.config['PYQP_DOWNLOAD_MODE'] = os.environ.get('PYQP_DOWNLOAD_MODE', 'redirect' if app.config['STORAGE_BACKEND'] == 's3' else 'direct')
+app.config['PYQP_ACCEL_REDIRECT_PREFIX'] = os.environ.get('PYQP_ACCEL_REDIRECT_PREFIX', '/protected-uploads/')
+app.config['PYQP_DOWNLOAD_MAX_AGE'] = int(os.environ.get('PYQP_DOWNLOAD_MAX_AGE', 30 * 24 * 3600))
+
+# Resumable uploads send the PDF in chunks, each well under MAX_CONTENT_LENGTH
+app.config['CHUNKED_UPLOAD_MAX_SIZE'] = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 100 * 1024 * 1024))
+app.config['CHUNKED_UPLOAD_CHUNK_SIZE'] = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE', 2 * 1024 * 1024))
+
+# Bulk imports store a batch of papers, then insert their rows in one commit
+app.config['PYQP_IMPORT_BATCH_SIZE'] = int(os.environ.get('PYQP_IMPORT_BATCH_SIZE', 100))
+
+# Activity logs are written in batches by a background thread. Serverless
+# instances can be frozen between requests, so they keep writing inline.
+app.config['ACTIVITY_LOG_ASYNC'] = os.environ.get('ACTIVITY_LOG_ASYNC', '0' if os.environ.get('VERCEL') else '1') == '1'
+app.config['ACTIVITY_LOG_QUEUE_SIZE'] = int(os.environ.get('ACTIVITY_LOG_QUEUE_SIZE', 10000))
+app.config['ACTIVITY_LOG_BATCH_SIZE'] = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', 100))
+app.config['ACTIVITY_LOG_FLUSH_INTERVAL'] = float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', 1.0))
+
+# PYQP downloads are counted in memory and written every
+# DOWNLOAD_STATS_FLUSH_INTERVAL seconds as per-paper totals and daily
+# subject/year rollups. Serverless instances write each download inline.
+app.config['DOWNLOAD_STATS_ASYNC'] = os.environ.get('DOWNLOAD_STATS_ASYNC', '0' if os.environ.get('VERCEL') else '1') == '1'
+app.config['DOWNLOAD_STATS_FLUSH_INTERVAL'] = float(os.environ.get('DOWNLOAD_STATS_FLUSH_INTERVAL', 10.0))
+app.config['POPULAR_PYQP_DAYS'] = int(os.environ.get('POPULAR_PYQP_DAYS', 30))
+
+# `flask archive-activity-log` moves activity older than the retention window
+# into gzip JSONL files, one directory per month
+app.config['ACTIVITY_LOG_RETENTION_DAYS'] = int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', 90))
+app.config['ACTIVITY_LOG_ARCHIVE_DIR'] = os.environ.get('ACTIVITY_LOG_ARCHIVE_DIR', os.path.join(app.instance_path, 'activity_archive'))
+app.config['ACTIVITY_LOG_ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ACTIVITY_LOG_ARCHIVE_BATCH_SIZE', 1000))
+
+# PDF analysis (page count, first-page thumbnail, search text) is queued in
+# the pdf_job table. 'thread' runs a dispatcher with a process pool inside
+# each web worker, 'worker' leaves the queue to `flask process-pdf-jobs`, and
+# 'inline' processes uploads during the request (serverless default).
+app.config['PDF_JOBS_MODE'] = os.environ.get('PDF_JOBS_MODE', 'inline' if os.environ.get('VERCEL') else 'thread')
+app.config['PDF_WORKER_PROCESSES'] = int(os.environ.get('PDF_WORKER_PROCESSES', 2))
+app.config['PDF_JOB_MAX_ATTEMPTS'] = int(os.environ.get('PDF_JOB_MAX_ATTEMPTS', 3))
+app.config['PDF_JOB_TIMEOUT'] = int(os.environ.get('PDF_JOB_TIMEOUT', 600))
+app.config['PDF_THUMBNAIL_WIDTH'] = int(os.environ.get('PDF_THUMBNAIL_WIDTH', 240))
+
+# Faculty photos are resized in the background into AVIF, WebP and JPEG
+# variants PHOTO_VARIANT_WIDTHS pixels wide (needs Pillow), which pages offer
+# through srcset. A job is queued whenever a photo changes. PHOTO_JOBS_MODE is
+# 'thread' or 'worker' as for PDF jobs; serverless instances leave the queue
+# to `flask process-photos`, since nothing runs there between requests. 'off'
+# (the default without Pillow) queues nothing and pages show the originals.
+# Photos linked from other sites are only fetched with PHOTO_FETCH_REMOTE=1.
+if importlib.util.find_spec('PIL') is None:
+    app.config['PHOTO_JOBS_MODE'] = os.environ.get('PHOTO_JOBS_MODE', 'off')
+else:
+    app.config['PHOTO_JOBS_MODE'] = os.environ.get('PHOTO_JOBS_MODE', 'worker' if os.environ.get('VERCEL') else 'thread')
+app.config['PHOTO_FETCH_REMOTE'] = os.environ.get('PHOTO_FETCH_REMOTE', '0') == '1'
+app.config['PHOTO_WORKER_PROCESSES'] = int(os.environ.get('PHOTO_WORKER_PROCESSES', 1))
+app.config['PHOTO_JOB_MAX_ATTEMPTS'] = int(os.environ.get('PHOTO_JOB_MAX_ATTEMPTS', 3))
+app.config['PHOTO_JOB_RETRY_DELAY'] = int(os.environ.get('PHOTO_JOB_RETRY_DELAY', 60))
+app.config['PHOTO_JOB_TIMEOUT'] = int(os.environ.get('PHOTO_JOB_TIMEOUT', 300))
+app.config['PHOTO_VARIANT_WIDTHS'] = [int(width) for width in os.environ.get('PHOTO_VARIANT_WIDTHS', '320,480,640,960').split(',') if width.strip()]
+app.config['PHOTO_VARIANT_FORMATS'] = [name.strip() for name in os.environ.get('PHOTO_VARIANT_FORMATS', 'avif,webp,jpeg').split(',') if name.strip()]
+app.config['PHOTO_VARIANT_QUALITY'] = int(os.environ.get('PHOTO_VARIANT_QUALITY', 80))
+app.config['PHOTO_MAX_BYTES'] = int(os.environ.get('PHOTO_MAX_BYTES', 10 * 1024 * 1024))
+
+# How often get_image_url may check the upload/static trees for changes
+app.config['IMAGE_INDEX_REFRESH_INTERVAL'] = int(os.environ.get('IMAGE_INDEX_REFRESH_INTERVAL', 60))
+
+# `flask build-static` writes minified, fingerprinted and precompressed copies
+# of static/ into static/dist. While its manifest exists, url_for('static')
+# links to those copies and they are cached for STATIC_ASSET_MAX_AGE seconds.
+app.config['STATIC_ASSET_MAX_AGE'] = int(os.environ.get('STATIC_ASSET_MAX_AGE', 365 * 24 * 3600))
+
+# Request profiling: Server-Timing headers, slow query log and /metrics.
+# Without METRICS_TOKEN the metrics endpoint needs a faculty login.
+app.config['REQUEST_PROFILING'] = os.environ.get('REQUEST_PROFILING', '0') == '1'
+app.config['SLOW_QUERY_THRESHOLD_MS'] = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['METRICS_PREFIX'] = os.environ.get('METRICS_PREFIX', 'school')
+
+# Token-bucket limits ("<count>/<second|minute|hour|day>", empty disables)
+# checked before the contact form writes and before login hashes a password.
+# Failed guesses are limited per username and address; the looser limit per
+# username alone lets no single address lock an account out.
+# Buckets are per process unless RATE_LIMIT_BACKEND is sqlite (one file
+# shared by the host's workers) or redis; null turns limiting off.
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+app.config['RATE_LIMIT_SQLITE_PATH'] = os.environ.get('RATE_LIMIT_SQLITE_PATH', os.path.join(app.instance_path, 'rate_limit.db'))
+app.config['RATE_LIMIT_REDIS_URL'] = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+app.config['RATE_LIMIT_LOGIN_PER_IP'] = os.environ.get('RATE_LIMIT_LOGIN_PER_IP', '20/minute')
+app.config['RATE_LIMIT_LOGIN_PER_USERNAME_IP'] = os.environ.get('RATE_LIMIT_LOGIN_PER_USERNAME_IP', '5/minute')
+app.config['RATE_LIMIT_LOGIN_PER_USERNAME'] = os.environ.get('RATE_LIMIT_LOGIN_PER_USERNAME', '30/minute')
+app.config['RATE_LIMIT_CONTACT_PER_IP'] = os.environ.get('RATE_LIMIT_CONTACT_PER_IP', '10/hour')
+
+# Number of proxies in front of the app whose X-Forwarded-For is trusted, so
+# rate limits and activity logs see the client's address (Vercel has one)
+app.config['PROXY_FIX_X_FOR'] = int(os.environ.get('PROXY_FIX_X_FOR', 1 if os.environ.get('VERCEL') else 0))
+
+# Logged-in faculty rows are cached per process for USER_CACHE_TTL seconds
+# (0 disables). Each hit is checked against the row's is_active, password
+# hash and updated_at, so changes from any process take effect immediately.
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 60))
+
+# Announcement feeds (/api/announcements, /announcements.atom) are revalidated
+# with ETags after ANNOUNCEMENT_FEED_MAX_AGE seconds. /announcements/stream
+# pushes new announcements over server-sent events; each open stream holds a
+# worker thread, so it is off on serverless hosts.
+app.config['ANNOUNCEMENT_FEED_MAX_AGE'] = int(os.environ.get('ANNOUNCEMENT_FEED_MAX_AGE', 30))
+app.config['ANNOUNCEMENT_FEED_PAGE_SIZE'] = int(os.environ.get('ANNOUNCEMENT_FEED_PAGE_SIZE', 20))
+app.config['ANNOUNCEMENT_STREAM'] = os.environ.get('ANNOUNCEMENT_STREAM', '0' if os.environ.get('VERCEL') else '1') == '1'
+app.config['ANNOUNCEMENT_STREAM_MAX_CLIENTS'] = int(os.environ.get('ANNOUNCEMENT_STREAM_MAX_CLIENTS', 100))
+app.config['ANNOUNCEMENT_STREAM_POLL_INTERVAL'] = float(os.environ.get('ANNOUNCEMENT_STREAM_POLL_INTERVAL', 5.0))
+app.config['ANNOUNCEMENT_STREAM_HEARTBEAT'] = float(os.environ.get('ANNOUNCEMENT_STREAM_HEARTBEAT', 15.0))
+
+# Replies to contact messages are queued in the outbound_email table and
+# sent in batches of MAIL_BATCH_SIZE over one connection. MAIL_TRANSPORT
+# 'file' writes .eml files to MAIL_FILE_DIR; 'smtp' sends through
+# MAIL_SMTP_HOST. MAIL_OUTBOX_MODE works like PDF_JOBS_MODE: 'thread',
+# 'worker' (`flask send-mail`) or 'inline' (serverless default).
+app.config['MAIL_TRANSPORT'] = os.environ.get('MAIL_TRANSPORT', 'file')
+app.config['MAIL_FILE_DIR'] = os.environ.get('MAIL_FILE_DIR', os.path.join(app.instance_path, 'outbox'))
+app.config['MAIL_FROM'] = os.environ.get('MAIL_FROM', 'Global High School <noreply@globalhighschool.edu.in>')
+app.config['MAIL_SMTP_HOST'] = os.environ.get('MAIL_SMTP_HOST', 'localhost')
+app.config['MAIL_SMTP_PORT'] = int(os.environ.get('MAIL_SMTP_PORT', 587))
+app.config['MAIL_SMTP_USERNAME'] = os.environ.get('MAIL_SMTP_USERNAME')
+app.config['MAIL_SMTP_PASSWORD'] = os.environ.get('MAIL_SMTP_PASSWORD')
+app.config['MAIL_SMTP_SECURITY'] = os.environ.get('MAIL_SMTP_SECURITY', 'starttls')  # starttls, ssl or none
+app.config['MAIL_OUTBOX_MODE'] = os.environ.get('MAIL_OUTBOX_MODE', 'inline' if os.environ.get('VERCEL') else 'thread')
+app.config['MAIL_BATCH_SIZE'] = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+app.config['MAIL_MAX_ATTEMPTS'] = int(os.environ.get('MAIL_MAX_ATTEMPTS', 5))
+app.config['MAIL_SEND_TIMEOUT'] = int(os.environ.get('MAIL_SEND_TIMEOUT', 300))
+
+# Contact inbox page size
+app.config['INBOX_PAGE_SIZE'] = int(os.environ.get('INBOX_PAGE_SIZE', 50))
+
+if app.config['PROXY_FIX_X_FOR']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
 # Initialize extensions
+request_profiler = RequestProfiler(app)
 db = SQLAlchemy(app)
+response_cache = ResponseCache(app)
+rate_limiter = RateLimiter(app)
+storage = create_storage(app.config)
 
 # Flask-Login setup
 login_manager = LoginManager()
@@ -38,6 +282,31 @@ login_manager.login_view = 'faculty_login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'warning'
 
+db_ready = False
+db_init_lock = threading.Lock()
+
+@app.before_request
+def auto_init_db():
+    global db_ready
+    if db_ready:
+        return
+    with db_init_lock:
+        if db_ready:
+            return
+        if app.config['AUTO_INIT_DB']:
+            init_db()
+        else:
+            missing = missing_schema()
+            if missing:
+                # An upgraded deployment on an old database would otherwise
+                # fail inside the first view with an OperationalError
+                app.logger.critical('The database schema is out of date (missing %s). '
+                                    'Run `flask --app app init-db` to upgrade it.', ', '.join(missing))
+                return app.response_class('The database schema is out of date. '
+                                          'Run `flask --app app init-db` to upgrade it.\n',
+                                          status=503, mimetype='text/plain')
+        db_ready = True
+
 # Database Models
 class Faculty(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -78,6 +347,7 @@ class FacultyMember(db.Model):
     qualification = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     image_path = db.Column(db.String(200))
+    image_variants = db.Column(db.Text)  # JSON manifest written by the photo job
     experience = db.Column(db.String(100))
     specialization = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -94,6 +364,76 @@ class PYQP(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     file_size = db.Column(db.Integer)
+    content_hash = db.Column(db.String(64))  # sha256 of the PDF, used as its ETag
+    processing_status = db.Column(db.String(20))  # pending, ready or failed; None before PDF jobs existed
+    page_count = db.Column(db.Integer)
+    thumbnail_path = db.Column(db.String(200))
+
+# Composite indexes backing the paged catalogue: the default listing walks
+# (year DESC, subject, id) and the subject filter walks (subject, year DESC, id)
+db.Index('ix_pyqp_active_year_subject', PYQP.is_active, PYQP.year.desc(), PYQP.subject, PYQP.id)
+db.Index('ix_pyqp_active_subject_year', PYQP.is_active, PYQP.subject, PYQP.year.desc(), PYQP.id)
+# Reference counting for shared content-addressed blobs
+db.Index('ix_pyqp_file_path', PYQP.file_path)
+# An uploader's most recent papers, read in index order
+db.Index('ix_pyqp_uploaded_by_uploaded_at', PYQP.uploaded_by, PYQP.uploaded_at)
+
+class PYQPCounter(db.Model):
+    # Active paper counts kept up to date by update_pyqp_counters. Rows are
+    # ('total', 0, '', 0), ('uploader', faculty_id, '', 0) and
+    # ('subject_year', 0, subject, year).
+    scope = db.Column(db.String(20), primary_key=True)
+    uploaded_by = db.Column(db.Integer, primary_key=True, default=0)
+    subject = db.Column(db.String(100), primary_key=True, default='')
+    year = db.Column(db.Integer, primary_key=True, default=0)
+    paper_count = db.Column(db.Integer, nullable=False, default=0)
+
+class PYQPDownloadCount(db.Model):
+    # All-time downloads per paper, written in batches by download_counter
+    pyqp_id = db.Column(db.Integer, db.ForeignKey('pyqp.id'), primary_key=True)
+    download_count = db.Column(db.Integer, nullable=False, default=0)
+
+    pyqp = db.relationship('PYQP', backref=db.backref('download_stats', cascade='all, delete-orphan'))
+
+db.Index('ix_pyqp_download_count_count', PYQPDownloadCount.download_count)
+
+class PYQPDownloadDaily(db.Model):
+    # Downloads per UTC day and subject/year; outlives deleted papers
+    day = db.Column(db.Date, primary_key=True)
+    subject = db.Column(db.String(100), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    download_count = db.Column(db.Integer, nullable=False, default=0)
+
+class PDFJob(db.Model):
+    # Queued PDF analysis for one paper; finished jobs are deleted
+    id = db.Column(db.Integer, primary_key=True)
+    pyqp_id = db.Column(db.Integer, db.ForeignKey('pyqp.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    pyqp = db.relationship('PYQP', backref=db.backref('pdf_jobs', cascade='all, delete-orphan'))
+
+db.Index('ix_pdf_job_status_run_after', PDFJob.status, PDFJob.run_after)
+
+class PhotoJob(db.Model):
+    # Queued resizing of one faculty photo; finished jobs are deleted
+    id = db.Column(db.Integer, primary_key=True)
+    faculty_member_id = db.Column(db.Integer, db.ForeignKey('faculty_member.id'), nullable=False)
+    image_path = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    faculty_member = db.relationship('FacultyMember', backref=db.backref('photo_jobs', cascade='all, delete-orphan'))
+
+db.Index('ix_photo_job_status_run_after', PhotoJob.status, PhotoJob.run_after)
 
 class ContactMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -106,6 +446,34 @@ class ContactMessage(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     replied_at = db.Column(db.DateTime)
     reply_message = db.Column(db.Text)
+    archived_at = db.Column(db.DateTime)
+
+# The inbox's default view reads unread messages straight from this partial
+# index, however many read and archived messages pile up behind them
+db.Index('ix_contact_message_unread', ContactMessage.created_at, ContactMessage.id,
+         sqlite_where=and_(ContactMessage.is_read == False, ContactMessage.archived_at.is_(None)),
+         postgresql_where=and_(ContactMessage.is_read == False, ContactMessage.archived_at.is_(None)))
+db.Index('ix_contact_message_created', ContactMessage.created_at, ContactMessage.id)
+
+class OutboundEmail(db.Model):
+    # Queued mail; sent rows stay as the delivery record
+    id = db.Column(db.Integer, primary_key=True)
+    contact_message_id = db.Column(db.Integer, db.ForeignKey('contact_message.id'))
+    recipient = db.Column(db.String(100), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent or failed
+    claim_token = db.Column(db.String(32))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    contact_message = db.relationship('ContactMessage', backref='outbound_emails')
+
+db.Index('ix_outbound_email_status_run_after', OutboundEmail.status, OutboundEmail.run_after)
 
 class Announcement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -117,20 +485,231 @@ class Announcement(db.Model):
 
     creator = db.relationship('Faculty', backref='announcements')
 
+# Feed pages walk active announcements newest first
+db.Index('ix_announcement_active_created', Announcement.is_active, Announcement.created_at, Announcement.id)
+
+class UserAgent(db.Model):
+    # Each distinct User-Agent string is stored once and referenced by id
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Text, nullable=False, unique=True)
+
 class ActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=False)
     action = db.Column(db.String(100), nullable=False)
     details = db.Column(db.Text)
     ip_address = db.Column(db.String(45))
-    user_agent = db.Column(db.Text)
+    raw_user_agent = db.Column('user_agent', db.Text)  # rows logged before interning
+    user_agent_id = db.Column(db.Integer, db.ForeignKey('user_agent.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     faculty = db.relationship('Faculty', backref='activity_logs')
+    agent = db.relationship('UserAgent', lazy='joined')
+
+    @property
+    def user_agent(self):
+        return self.agent.value if self.agent else self.raw_user_agent
+
+db.Index('ix_activity_log_faculty_created', ActivityLog.faculty_id, ActivityLog.created_at)
+# Finds rows past the retention window without scanning the table
+db.Index('ix_activity_log_created_at', ActivityLog.created_at)
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection) or not use_sqlite_profile():
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.execute(f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_SIZE_KB']}")
+    cursor.execute(f"PRAGMA mmap_size={app.config['SQLITE_MMAP_SIZE']}")
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+# Page cache invalidation: remember which cached pages a flush touched and
+# bump their tags once the transaction actually commits
+def cache_tags_for(obj):
+    if isinstance(obj, PYQP):
+        return ('pyqp',)
+    if isinstance(obj, Announcement):
+        return ('announcements',)
+    if isinstance(obj, FacultyMember):
+        return ('faculty',)
+    if isinstance(obj, Faculty) and inspect(obj).attrs.name.history.has_changes():
+        # Announcements display their creator's name
+        return ('announcements',)
+    return ()
+
+@event.listens_for(db.session, 'after_flush')
+def collect_cache_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    faculty_ids = session.info.setdefault('faculty_ids', set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        tags.update(cache_tags_for(obj))
+        if isinstance(obj, Faculty) and obj.id is not None:
+            faculty_ids.add(obj.id)
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_cached_pages(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        response_cache.invalidate(*tags)
+        if 'announcements' in tags:
+            announcement_stream.notify()
+    faculty_ids = session.info.pop('faculty_ids', None)
+    if faculty_ids:
+        user_cache.invalidate(*faculty_ids)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_cache_tags(session):
+    session.info.pop('cache_tags', None)
+    session.info.pop('faculty_ids', None)
+
+def is_remote_image(image_path):
+    return str(image_path).strip().startswith(('http://', 'https://'))
+
+def needs_photo_job(image_path):
+    if not image_path or str(image_path).startswith('data:') or app.config['PHOTO_JOBS_MODE'] == 'off':
+        return False
+    return app.config['PHOTO_FETCH_REMOTE'] or not is_remote_image(image_path)
+
+@event.listens_for(db.session, 'before_flush')
+def queue_photo_jobs(session, flush_context, instances):
+    # A changed photo drops its old variants and jobs and queues a new job in
+    # the same transaction; a job already running finds its row gone
+    for obj in itertools.chain(session.new, session.dirty):
+        if not isinstance(obj, FacultyMember) or not inspect(obj).attrs.image_path.history.has_changes():
+            continue
+        obj.image_variants = None
+        if obj in session.dirty:
+            for job in obj.photo_jobs:
+                session.delete(job)
+        if needs_photo_job(obj.image_path):
+            session.add(PhotoJob(faculty_member=obj, image_path=obj.image_path))
+            session.info['photo_jobs'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def notify_photo_worker(session):
+    if session.info.pop('photo_jobs', None):
+        photo_worker.notify()
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_photo_jobs(session):
+    session.info.pop('photo_jobs', None)
+
+# Maintained PYQP counters, so dashboards and filters never count rows
+def pyqp_counter_keys(uploaded_by, subject, year):
+    return [('total', 0, '', 0), ('uploader', uploaded_by, '', 0), ('subject_year', 0, subject, year)]
+
+PYQP_COUNTED_ATTRIBUTES = ('is_active', 'uploaded_by', 'subject', 'year')
+
+def pyqp_committed_values(paper, connection):
+    # Values as stored before this flush; is_active is None until the column
+    # default is applied on insert
+    histories = [inspect(paper).attrs[name].history for name in PYQP_COUNTED_ATTRIBUTES]
+    if any(history.added and not history.deleted for history in histories):
+        # Set on an expired instance, so the old value was never loaded
+        columns = [PYQP.__table__.c[name] for name in PYQP_COUNTED_ATTRIBUTES]
+        row = connection.execute(select(*columns).where(PYQP.__table__.c.id == paper.id)).first()
+        if row is not None:
+            return list(row)
+    return [history.deleted[0] if history.deleted else getattr(paper, name)
+            for name, history in zip(PYQP_COUNTED_ATTRIBUTES, histories)]
+
+PYQP_COUNTER_UPSERT = text(
+    'INSERT INTO pyqp_counter (scope, uploaded_by, subject, year, paper_count) '
+    'VALUES (:scope, :uploaded_by, :subject, :year, :delta) '
+    'ON CONFLICT (scope, uploaded_by, subject, year) '
+    'DO UPDATE SET paper_count = pyqp_counter.paper_count + excluded.paper_count'
+)
+
+@event.listens_for(db.session, 'before_flush')
+def update_pyqp_counters(session, flush_context, instances):
+    # Runs inside the flush's transaction, so counts commit or roll back
+    # together with the papers they describe
+    connection = session.connection()
+    deltas = collections.Counter()
+    for obj in session.new:
+        if isinstance(obj, PYQP) and obj.is_active is not False:
+            deltas.update(pyqp_counter_keys(obj.uploaded_by, obj.subject, obj.year))
+    for obj in session.deleted:
+        if isinstance(obj, PYQP):
+            is_active, uploaded_by, subject, year = pyqp_committed_values(obj, connection)
+            if is_active:
+                deltas.subtract(pyqp_counter_keys(uploaded_by, subject, year))
+    for obj in session.dirty:
+        if not isinstance(obj, PYQP) or not session.is_modified(obj):
+            continue
+        old = pyqp_committed_values(obj, connection)
+        new = [getattr(obj, name) for name in PYQP_COUNTED_ATTRIBUTES]
+        if old == new:
+            continue
+        if old[0]:
+            deltas.subtract(pyqp_counter_keys(*old[1:]))
+        if new[0]:
+            deltas.update(pyqp_counter_keys(*new[1:]))
+
+    rows = [{'scope': scope, 'uploaded_by': uploaded_by, 'subject': subject, 'year': year, 'delta': delta}
+            for (scope, uploaded_by, subject, year), delta in deltas.items() if delta]
+    if rows:
+        connection.execute(PYQP_COUNTER_UPSERT, rows)
+
+def rebuild_pyqp_counters():
+    """Recount every active paper, for databases filled outside the ORM."""
+    PYQPCounter.query.delete()
+    active = PYQP.query.filter_by(is_active=True)
+    rows = [{'scope': 'total', 'paper_count': active.count()}]
+    rows += [{'scope': 'uploader', 'uploaded_by': uploaded_by, 'paper_count': count}
+             for uploaded_by, count in active.with_entities(PYQP.uploaded_by, db.func.count())
+             .group_by(PYQP.uploaded_by)]
+    rows += [{'scope': 'subject_year', 'subject': subject, 'year': year, 'paper_count': count}
+             for subject, year, count in active.with_entities(PYQP.subject, PYQP.year, db.func.count())
+             .group_by(PYQP.subject, PYQP.year)]
+    for row in rows:
+        db.session.add(PYQPCounter(**row))
+    db.session.commit()
+    return rows[0]['paper_count']
+
+def get_pyqp_count(uploaded_by=None):
+    if uploaded_by is None:
+        key = ('total', 0, '', 0)
+    else:
+        key = ('uploader', uploaded_by, '', 0)
+    counter = db.session.get(PYQPCounter, key)
+    return counter.paper_count if counter else 0
+
+user_cache = IdentityCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+def faculty_column_values(faculty):
+    return {attr.key: getattr(faculty, attr.key) for attr in inspect(Faculty).column_attrs}
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Faculty.query.get(int(user_id))
+    user_id = int(user_id)
+    values = user_cache.get(user_id)
+    if values is not None:
+        # Another worker may have deactivated the account, changed its
+        # password or edited it since this copy was cached, so a hit still
+        # compares those columns, with one primary-key lookup
+        current = db.session.execute(
+            select(Faculty.is_active, Faculty.password_hash, Faculty.updated_at).where(Faculty.id == user_id)
+        ).first()
+        if current is None or tuple(current) != (values['is_active'], values['password_hash'], values['updated_at']):
+            user_cache.invalidate(user_id)
+            values = None
+    if values is None:
+        faculty = db.session.get(Faculty, user_id)
+        if faculty is None or not faculty.is_active:
+            # A deactivated account's sessions end with its next request
+            return None
+        user_cache.set(user_id, faculty_column_values(faculty))
+        return faculty
+    # Rebuild the row from the cache and attach it to the session without a
+    # SELECT, so relationships and later updates behave as if it was queried
+    faculty = Faculty(**values)
+    make_transient_to_detached(faculty)
+    return db.session.merge(faculty, load=False)
 
 # Allowed extensions
 ALLOWED_PDF_EXTENSIONS = {'pdf'}
@@ -138,14 +717,398 @@ ALLOWED_PDF_EXTENSIONS = {'pdf'}
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+def get_pyqp_full_path(paper):
+    # Older rows were saved on Windows with backslash separators
+    return os.path.join(app.config['UPLOAD_FOLDER'], *paper.file_path.replace('\\', '/').split('/'))
+
+def get_pyqp_key(paper):
+    return paper.file_path.replace('\\', '/')
+
+@contextlib.contextmanager
+def local_stored_file(key):
+    """Yield a local path to the stored file ``key``; a file in an object
+    store is downloaded to a temp file for the duration."""
+    if storage.is_local:
+        yield storage.path(key)
+        return
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+    os.close(fd)
+    try:
+        storage.download(key, temp_path)
+        yield temp_path
+    finally:
+        os.remove(temp_path)
+
+def compute_file_hash(full_path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Content-addressed PYQP storage: every distinct PDF is stored once under
+# pyqp/<aa>/<bb>/<sha256>.pdf and shared by all PYQP rows with that content
+UPLOAD_CHUNK_SIZE = 64 * 1024
+DEDUPE_BATCH_SIZE = 100
+PDF_MAGIC = b'%PDF-'
+
+chunked_uploads = ChunkedUploadStore(
+    os.path.join(app.config['UPLOAD_FOLDER'], 'pyqp', 'incoming'),
+    max_size=app.config['CHUNKED_UPLOAD_MAX_SIZE'],
+    magic=PDF_MAGIC,
+    chunk_size=UPLOAD_CHUNK_SIZE
+)
+
+def get_blob_path(content_hash):
+    return '/'.join(['pyqp', content_hash[:2], content_hash[2:4], f'{content_hash}.pdf'])
+
+BLOB_PATH_PATTERN = re.compile(r'^pyqp/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.pdf$')
+
+def is_blob_path(file_path):
+    match = BLOB_PATH_PATTERN.match(file_path.replace('\\', '/'))
+    return bool(match) and match.group(3).startswith(match.group(1) + match.group(2))
+
+def commit_blob(temp_path, content_hash):
+    """Move a fully written temp file to its blob location, or drop it when an
+    identical blob already exists. Returns the blob's relative path."""
+    blob_path = get_blob_path(content_hash)
+    if storage.exists(blob_path):
+        os.remove(temp_path)
+    else:
+        storage.put_file(temp_path, blob_path, content_type='application/pdf')
+    return blob_path
+
+def store_pyqp_stream(stream, max_size=None):
+    """Stream a file to disk through a sha256 hasher and store it
+    content-addressed. Returns (file_path, content_hash, file_size)."""
+    pyqp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'pyqp')
+    os.makedirs(pyqp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    file_size = 0
+    # A stream may return fewer bytes than the magic in its first read
+    head = b''
+    fd, temp_path = tempfile.mkstemp(dir=pyqp_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                if len(head) < len(PDF_MAGIC):
+                    head += chunk[:len(PDF_MAGIC) - len(head)]
+                    if not PDF_MAGIC.startswith(head):
+                        raise ValueError('File is not a valid PDF')
+                digest.update(chunk)
+                handle.write(chunk)
+                file_size += len(chunk)
+                if max_size is not None and file_size > max_size:
+                    raise ValueError('File is too large')
+        if head != PDF_MAGIC:
+            raise ValueError('File is not a valid PDF')
+        content_hash = digest.hexdigest()
+        return commit_blob(temp_path, content_hash), content_hash, file_size
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def store_pyqp_upload(file):
+    return store_pyqp_stream(file.stream)
+
+def save_uploaded_pyqp(form, filename, file_path, content_hash, file_size):
+    subject = form['subject']
+    if subject == 'Other' and form.get('custom_subject'):
+        subject = form['custom_subject']
+    
+    new_pyqp = PYQP(
+        subject=subject,
+        year=int(form['year']),
+        filename=filename,
+        file_path=file_path,
+        description=form.get('description', ''),
+        uploaded_by=current_user.id,
+        file_size=file_size,
+        content_hash=content_hash
+    )
+    db.session.add(new_pyqp)
+    job = enqueue_pdf_job(new_pyqp)
+    db.session.commit()
+    # Metadata is searchable right away; the job adds the PDF text
+    index_pyqp(new_pyqp, content='')
+    start_pdf_job(job)
+    
+    log_activity(
+        current_user.id,
+        'upload_pyqp',
+        f'Uploaded PYQP: {subject} {form["year"]}',
+        request.remote_addr,
+        request.headers.get('User-Agent')
+    )
+    return new_pyqp
+
+def release_pyqp_blob(file_path):
+    # Remove the stored file once no PYQP row references it any more
+    if PYQP.query.filter_by(file_path=file_path).count() > 0:
+        return False
+    match = BLOB_PATH_PATTERN.match(file_path.replace('\\', '/'))
+    try:
+        if match:
+            storage.delete(get_thumbnail_path(match.group(3)))
+        return storage.delete(file_path.replace('\\', '/'))
+    except Exception as e:
+        app.logger.error('Error deleting stored file %s: %s', file_path, e)
+        return False
+
+def store_import_entry(source, entry, result):
+    if not allowed_file(entry['file'], ALLOWED_PDF_EXTENSIONS):
+        result.update(status='failed', error='Not a PDF file')
+        return None
+    max_size = app.config['CHUNKED_UPLOAD_MAX_SIZE']
+    if source.size(entry['file']) > max_size:
+        result.update(status='failed', error='File is too large')
+        return None
+    try:
+        with source.open(entry['file']) as handle:
+            return store_pyqp_stream(handle, max_size)
+    except ValueError as e:
+        result.update(status='failed', error=str(e))
+    except Exception as e:
+        app.logger.warning('Error reading %s from %s: %s', entry['file'], source.name, e)
+        result.update(status='failed', error='Could not read file')
+    return None
+
+def import_pyqps(source, rows, uploaded_by, ip_address=None, user_agent=None):
+    """Store the manifest's papers from ``source`` and insert them in
+    batches. A paper whose content, subject and year are already in the
+    catalogue is reported as a duplicate, so an import can be rerun."""
+    entries, results = plan_import(source, rows)
+    batch_size = app.config['PYQP_IMPORT_BATCH_SIZE']
+    for start in range(0, len(entries), batch_size):
+        stored = []
+        for entry in entries[start:start + batch_size]:
+            result = {'file': entry['file']}
+            results.append(result)
+            blob = store_import_entry(source, entry, result)
+            if blob:
+                stored.append((entry, result) + blob)
+        if not stored:
+            continue
+
+        existing = {
+            (row.content_hash, row.subject, row.year): row.id
+            for row in db.session.query(PYQP.id, PYQP.content_hash, PYQP.subject, PYQP.year)
+            .filter(PYQP.is_active == True, PYQP.content_hash.in_({blob[3] for blob in stored}))
+        }
+        papers = []
+        jobs = []
+        for entry, result, file_path, content_hash, file_size in stored:
+            key = (content_hash, entry['subject'], entry['year'])
+            if key in existing:
+                result.update(status='duplicate', id=existing[key])
+                continue
+            paper = PYQP(
+                subject=entry['subject'],
+                year=entry['year'],
+                filename=secure_filename(posixpath.basename(entry['file'])),
+                file_path=file_path,
+                description=entry['description'],
+                uploaded_by=uploaded_by,
+                file_size=file_size,
+                content_hash=content_hash
+            )
+            db.session.add(paper)
+            jobs.append(enqueue_pdf_job(paper))
+            existing[key] = paper
+            papers.append((paper, result))
+
+        try:
+            db.session.flush()
+            for paper, result in papers:
+                result.update(status='imported', id=paper.id)
+                if search_index_available():
+                    write_search_entry(paper, '')
+            for entry, result, *_ in stored:
+                if isinstance(result.get('id'), PYQP):
+                    # A duplicate of a paper earlier in this batch
+                    result['id'] = result['id'].id
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error('Error importing PYQP batch from %s: %s', source.name, e)
+            for entry, result, *_ in stored:
+                result.clear()
+                result.update(file=entry['file'], status='failed', error='Could not save the paper')
+            for file_path in {blob[2] for blob in stored}:
+                release_pyqp_blob(file_path)
+            continue
+
+        for job in jobs:
+            start_pdf_job(job)
+
+    summary = collections.Counter(result['status'] for result in results)
+    log_activity(
+        uploaded_by,
+        'bulk_import_pyqp',
+        f"Imported {summary['imported']} PYQPs from {source.name} "
+        f"({summary['duplicate']} duplicates, {summary['failed']} failed)",
+        ip_address,
+        user_agent
+    )
+    return {
+        'imported': summary['imported'],
+        'duplicates': summary['duplicate'],
+        'failed': summary['failed'],
+        'skipped': summary['skipped'],
+        'results': results
+    }
+
+def dedupe_pyqp_files():
+    """Move legacy per-upload files into content-addressed blobs. Returns
+    (papers_migrated, duplicates_found, bytes_reclaimed)."""
+    migrated = duplicates = reclaimed = 0
+    last_id = 0
+    while True:
+        batch = PYQP.query.filter(PYQP.id > last_id).order_by(PYQP.id).limit(DEDUPE_BATCH_SIZE).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        stale_paths = set()
+        for paper in batch:
+            if is_blob_path(paper.file_path):
+                continue
+            full_path = get_pyqp_full_path(paper)
+            if not os.path.isfile(full_path):
+                continue
+
+            content_hash = compute_file_hash(full_path)
+            blob_path = get_blob_path(content_hash)
+            blob_full_path = os.path.join(app.config['UPLOAD_FOLDER'], *blob_path.split('/'))
+            if os.path.exists(blob_full_path):
+                duplicates += 1
+                reclaimed += os.path.getsize(full_path)
+            else:
+                # Copy rather than move so the old path stays valid until the
+                # rows pointing at it are committed
+                os.makedirs(os.path.dirname(blob_full_path), exist_ok=True)
+                shutil.copy2(full_path, blob_full_path)
+
+            stale_paths.add(paper.file_path)
+            paper.file_path = blob_path
+            paper.content_hash = content_hash
+            paper.file_size = os.path.getsize(blob_full_path)
+            migrated += 1
+        db.session.commit()
+
+        for file_path in stale_paths:
+            release_pyqp_blob(file_path)
+    return migrated, duplicates, reclaimed
+
+# Scratch space under UPLOAD_FOLDER that never belongs in the storage backend
+PUSH_UPLOADS_SKIP = ('pyqp/incoming/', 'pyqp/processing/', 'photos/processing/')
+
+def push_uploads(source):
+    """Copy files under ``source`` into the storage backend under the same
+    keys, skipping keys it already has. Returns (copied, skipped)."""
+    copied = skipped = 0
+    for directory, _, filenames in os.walk(source):
+        for filename in filenames:
+            full_path = os.path.join(directory, filename)
+            key = os.path.relpath(full_path, source).replace(os.sep, '/')
+            if key.startswith(PUSH_UPLOADS_SKIP) or filename.endswith('.part') or storage.exists(key):
+                skipped += 1
+                continue
+            storage.put_file(full_path, key, content_type=mimetypes.guess_type(filename)[0], move=False)
+            copied += 1
+    return copied, skipped
+
+# User-Agent interning: value -> UserAgent.id, shared by request threads and
+# the activity writer. Cleared rather than evicted when it fills up.
+USER_AGENT_CACHE_SIZE = 10000
+USER_AGENT_INSERT = text('INSERT INTO user_agent (value) VALUES (:value) ON CONFLICT (value) DO NOTHING')
+user_agent_ids = {}
+
+def intern_user_agents(values):
+    """Return {value: UserAgent.id} for the given strings, inserting the
+    ones not seen before. Runs in the caller's transaction."""
+    ids = {}
+    missing = set()
+    for value in values:
+        if not value:
+            continue
+        user_agent_id = user_agent_ids.get(value)
+        if user_agent_id is None:
+            missing.add(value)
+        else:
+            ids[value] = user_agent_id
+    if missing:
+        # ON CONFLICT covers another worker inserting the same agent first
+        db.session.execute(USER_AGENT_INSERT, [{'value': value} for value in missing])
+        found = db.session.execute(select(UserAgent.id, UserAgent.value).where(UserAgent.value.in_(missing)))
+        if len(user_agent_ids) + len(missing) > USER_AGENT_CACHE_SIZE:
+            user_agent_ids.clear()
+        for user_agent_id, value in found:
+            user_agent_ids[value] = user_agent_id
+            ids[value] = user_agent_id
+    return ids
+
+def write_activity_rows(rows):
+    with app.app_context():
+        agent_ids = intern_user_agents(row['user_agent'] for row in rows)
+        db.session.execute(ActivityLog.__table__.insert(), [
+            dict(row, user_agent=None, user_agent_id=agent_ids.get(row['user_agent'])) for row in rows
+        ])
+        db.session.commit()
+
+def intern_activity_user_agents(batch_size=1000):
+    """Move user agents stored inline on older rows into the dictionary
+    table. Returns the number of rows converted."""
+    table = ActivityLog.__table__
+    converted = 0
+    while True:
+        batch = db.session.execute(
+            select(table.c.id, table.c.user_agent)
+            .where(table.c.user_agent.isnot(None), table.c.user_agent_id.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        agent_ids = intern_user_agents(user_agent for _, user_agent in batch)
+        db.session.execute(
+            table.update()
+            .where(table.c.id == db.bindparam('row_id'))
+            .values(user_agent_id=db.bindparam('agent_id'), user_agent=None),
+            [{'row_id': row_id, 'agent_id': agent_ids.get(user_agent)} for row_id, user_agent in batch]
+        )
+        db.session.commit()
+        converted += len(batch)
+    return converted
+
+activity_writer = BatchedWriter(
+    write_activity_rows,
+    max_queue=app.config['ACTIVITY_LOG_QUEUE_SIZE'],
+    batch_size=app.config['ACTIVITY_LOG_BATCH_SIZE'],
+    flush_interval=app.config['ACTIVITY_LOG_FLUSH_INTERVAL'],
+    logger=app.logger
+)
+
 def log_activity(faculty_id, action, details=None, ip_address=None, user_agent=None):
+    if app.config['ACTIVITY_LOG_ASYNC']:
+        activity_writer.submit({
+            'faculty_id': faculty_id,
+            'action': action,
+            'details': details,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': datetime.utcnow()
+        })
+        return
+
     try:
         activity = ActivityLog(
             faculty_id=faculty_id,
             action=action,
             details=details,
             ip_address=ip_address,
-            user_agent=user_agent
+            user_agent_id=intern_user_agents([user_agent]).get(user_agent)
         )
         db.session.add(activity)
         db.session.commit()
@@ -153,46 +1116,1072 @@ def log_activity(faculty_id, action, details=None, ip_address=None, user_agent=N
         print(f"Error logging activity: {e}")
         db.session.rollback()
 
-def get_image_url(image_path):
-    placeholder = url_for('static', filename='images/image-placeholder.svg')
+# Activity log retention: rows older than the window are copied to the
+# archive first and only then deleted, one short transaction per batch
+activity_archive = ActivityArchive(app.config['ACTIVITY_LOG_ARCHIVE_DIR'])
+
+def archive_activity_logs(retention_days=None):
+    """Move activity older than the retention window into the archive.
+    Returns (rows_archived, segment_paths)."""
+    if retention_days is None:
+        retention_days = app.config['ACTIVITY_LOG_RETENTION_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    batch_size = app.config['ACTIVITY_LOG_ARCHIVE_BATCH_SIZE']
+    table = ActivityLog.__table__
+    agents = UserAgent.__table__
+    archived = {'rows': 0, 'last_id': 0}
+    # Archived rows carry the user agent string itself
+    columns = [table.c.id, table.c.faculty_id, table.c.action, table.c.details, table.c.ip_address,
+               db.func.coalesce(agents.c.value, table.c.user_agent).label('user_agent'), table.c.created_at]
+
+    def expired_rows():
+        while True:
+            batch = db.session.execute(
+                select(*columns)
+                .select_from(table.outerjoin(agents, agents.c.id == table.c.user_agent_id))
+                .where(table.c.created_at < cutoff, table.c.id > archived['last_id'])
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).mappings().all()
+            db.session.commit()
+            if not batch:
+                return
+            archived['last_id'] = batch[-1]['id']
+            archived['rows'] += len(batch)
+            for row in batch:
+                yield dict(row)
+
+    segments = activity_archive.write_segments(expired_rows())
+
+    # Rows written after the cutoff was taken are newer than it, so this
+    # deletes exactly what was archived
+    while True:
+        ids = [row[0] for row in db.session.execute(
+            select(table.c.id)
+            .where(table.c.created_at < cutoff, table.c.id <= archived['last_id'])
+            .limit(batch_size)
+        )]
+        if not ids:
+            break
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+    return archived['rows'], [path for path, _ in segments]
+
+def activity_to_dict(activity):
+    return {
+        'id': activity.id,
+        'faculty_id': activity.faculty_id,
+        'action': activity.action,
+        'details': activity.details,
+        'ip_address': activity.ip_address,
+        'user_agent': activity.user_agent,
+        'created_at': activity.created_at.isoformat() if activity.created_at else None
+    }
 
+def query_activity_logs(faculty_id=None, action=None, start=None, end=None, limit=100):
+    """Newest-first activity from the live table, continued from the
+    archive when the live rows run out."""
+    query = ActivityLog.query
+    if faculty_id is not None:
+        query = query.filter_by(faculty_id=faculty_id)
+    if action:
+        query = query.filter_by(action=action)
+    if start:
+        query = query.filter(ActivityLog.created_at >= start)
+    if end:
+        query = query.filter(ActivityLog.created_at < end)
+    rows = [activity_to_dict(activity)
+            for activity in query.order_by(ActivityLog.created_at.desc(), ActivityLog.id.desc()).limit(limit)]
+    if len(rows) < limit:
+        # Everything archived is older than every live row
+        archived = activity_archive.read(start=start, end=end, faculty_id=faculty_id, action=action)
+        rows.extend(itertools.islice(archived, limit - len(rows)))
+    return rows
+
+# Image URL resolution runs against in-memory indexes of the upload and
+# static trees (PYQP storage excluded), and each image_path is resolved once
+# per index generation, so rendering faculty cards performs no syscalls
+upload_file_index = storage.file_index(
+    exclude=['pyqp'],
+    refresh_interval=app.config['IMAGE_INDEX_REFRESH_INTERVAL']
+)
+static_file_index = FileIndex(
+    app.static_folder,
+    exclude=[os.path.join(app.config['UPLOAD_FOLDER'], 'pyqp'), os.path.join(app.static_folder, 'dist')],
+    refresh_interval=app.config['IMAGE_INDEX_REFRESH_INTERVAL']
+)
+# Resolved URLs are kept per index generation, for at most this many paths
+IMAGE_URL_CACHE_SIZE = 4096
+
+def normalize_image_path(image_path):
+    # Stored paths may be URLs, or relative to the upload or static folders
+    normalized_path = str(image_path).replace('\\', '/').strip()
+
+    if normalized_path.startswith(('http://', 'https://', 'data:')):
+        return normalized_path
+
+    if normalized_path.startswith('/uploads/'):
+        normalized_path = normalized_path[len('/uploads/'):]
+    elif normalized_path.startswith('uploads/'):
+        normalized_path = normalized_path[len('uploads/'):]
+
+    if normalized_path.startswith('/static/'):
+        normalized_path = normalized_path[len('/static/'):]
+    elif normalized_path.startswith('static/'):
+        normalized_path = normalized_path[len('static/'):]
+    return normalized_path
+
+IMAGE_PLACEHOLDER = ('static', 'images/image-placeholder.svg')
+
+def resolve_image_target(image_path):
+    """Return (endpoint, filename) for ``image_path``, or (None, url) for an
+    image served from elsewhere."""
     if not image_path:
-        return placeholder
+        return IMAGE_PLACEHOLDER
 
     try:
-        normalized_path = str(image_path).replace('\\', '/').strip()
+        normalized_path = normalize_image_path(image_path)
 
         if normalized_path.startswith(('http://', 'https://', 'data:')):
-            return normalized_path
+            return None, normalized_path
+
+        if normalized_path in upload_file_index:
+            return 'serve_uploaded_file', normalized_path
 
-        if normalized_path.startswith('/uploads/'):
-            normalized_path = normalized_path[len('/uploads/'):]
-        elif normalized_path.startswith('uploads/'):
-            normalized_path = normalized_path[len('uploads/'):]
+        if normalized_path in static_file_index:
+            return 'static', normalized_path
 
-        if normalized_path.startswith('/static/'):
-            normalized_path = normalized_path[len('/static/'):]
-        elif normalized_path.startswith('static/'):
-            normalized_path = normalized_path[len('static/'):]
+        return IMAGE_PLACEHOLDER
+    except Exception:
+        return IMAGE_PLACEHOLDER
+
+def get_image_url(image_path):
+    upload_file_index.refresh()
+    static_file_index.refresh()
+    generation = (upload_file_index.generation, static_file_index.generation)
+    endpoint, target = resolve_cached_image_target(image_path, generation)
+    # The URL itself depends on the request's script root and, for static
+    # files, on the loaded asset manifest, so it is built on every call
+    return url_for(endpoint, filename=target) if endpoint else target
+
+@functools.lru_cache(maxsize=IMAGE_URL_CACHE_SIZE)
+def resolve_cached_image_target(image_path, generation):
+    # Entries for an older generation are never asked for again and age out
+    return resolve_image_target(image_path)
+
+@functools.lru_cache(maxsize=IMAGE_URL_CACHE_SIZE)
+def build_image_sources(variants, script_root):
+    # Parsed variant manifests, keyed by the stored JSON and the script root
+    # the upload URLs are relative to; callers must not modify the result
+    manifest = json.loads(variants)
+    sources = []
+    for name, content_type in (('avif', 'image/avif'), ('webp', 'image/webp'), ('jpeg', 'image/jpeg')):
+        entries = manifest['variants'].get(name)
+        if entries:
+            srcset = ', '.join(f"{url_for('serve_uploaded_file', filename=key)} {width}w" for width, key in entries)
+            sources.append({'type': content_type, 'srcset': srcset,
+                            'src': url_for('serve_uploaded_file', filename=entries[-1][1])})
+    fallback = sources.pop() if sources and sources[-1]['type'] == 'image/jpeg' else None
+    return {
+        'source': manifest['source'],
+        'src': fallback['src'] if fallback else None,
+        'srcset': fallback['srcset'] if fallback else None,
+        'sources': sources,
+        'width': manifest['width'],
+        'height': manifest['height']
+    }
 
-        uploads_dir = app.config.get('UPLOAD_FOLDER', '')
-        if uploads_dir:
-            upload_candidate = os.path.join(uploads_dir, normalized_path)
-            if os.path.isfile(upload_candidate):
-                return url_for('serve_uploaded_file', filename=normalized_path)
+def get_image_sources(image_path, variants=None):
+    """Attributes for a responsive photo: 'src' and 'srcset' for the <img>,
+    'sources' (type and srcset, best format first) for <picture>, and the
+    original 'width' and 'height'. Until the photo's variants exist, only
+    'src' is set, from get_image_url."""
+    plain = {'src': get_image_url(image_path), 'srcset': None, 'sources': [], 'width': None, 'height': None}
+    if not variants:
+        return plain
+    try:
+        sources = build_image_sources(variants, request.script_root if has_request_context() else '')
+    except (ValueError, KeyError, TypeError):
+        return plain
+    if sources['source'] != image_path:
+        # Left over from an earlier photo
+        return plain
+    if not sources['src']:
+        # No JPEG variants were configured
+        return dict(sources, src=plain['src'])
+    return sources
+
+# PYQP catalogue pagination
+PYQP_PAGE_SIZE = 24
+PYQP_MAX_PAGE_SIZE = 100
+
+def encode_cursor(paper):
+    payload = json.dumps([paper.year, paper.subject, paper.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        year, subject, paper_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return int(year), str(subject), int(paper_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None
 
-        static_candidate = os.path.join(app.static_folder, normalized_path)
-        if os.path.isfile(static_candidate):
-            return url_for('static', filename=normalized_path)
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
 
-        return placeholder
-    except Exception:
-        return placeholder
+def parse_page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return PYQP_PAGE_SIZE
+    return max(1, min(size, PYQP_MAX_PAGE_SIZE))
+
+def paginate_pyqp(subject=None, year=None, text_query=None, cursor=None, limit=PYQP_PAGE_SIZE):
+    """Return one page of active papers ordered by (year DESC, subject, id)
+    plus the cursor for the next page, or None when this is the last page.
+    Raises ValueError for a cursor that can't be decoded."""
+    position = decode_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        raise ValueError('Invalid cursor')
+    query = PYQP.query.filter_by(is_active=True)
+
+    if subject:
+        query = query.filter(PYQP.subject == subject)
+    if year:
+        query = query.filter(PYQP.year == year)
+    if text_query:
+        match = build_match_query(text_query) if search_index_available() else None
+        if match:
+            query = query.filter(PYQP.id.in_(
+                select(pyqp_search.c.rowid).where(text('pyqp_search MATCH :match').bindparams(match=match))
+            ))
+        else:
+            pattern = f'%{escape_like(text_query)}%'
+            query = query.filter(or_(
+                PYQP.subject.ilike(pattern, escape='\\'),
+                PYQP.description.ilike(pattern, escape='\\'),
+                PYQP.filename.ilike(pattern, escape='\\')
+            ))
+
+    if position:
+        last_year, last_subject, last_id = position
+        query = query.filter(or_(
+            PYQP.year < last_year,
+            and_(PYQP.year == last_year, PYQP.subject > last_subject),
+            and_(PYQP.year == last_year, PYQP.subject == last_subject, PYQP.id > last_id)
+        ))
+
+    papers = query.order_by(PYQP.year.desc(), PYQP.subject, PYQP.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(papers) > limit:
+        papers = papers[:limit]
+        next_cursor = encode_cursor(papers[-1])
+    return papers, next_cursor
+
+def get_pyqp_filter_options():
+    counters = PYQPCounter.query.filter(PYQPCounter.scope == 'subject_year', PYQPCounter.paper_count > 0)
+    pairs = [(counter.subject, counter.year) for counter in counters]
+    subjects = sorted({subject for subject, _ in pairs})
+    years = sorted({year for _, year in pairs}, reverse=True)
+    return subjects, years
+
+# Download statistics: downloads are counted in memory by download_counter
+# and added to the totals and rollups in batches, so a download writes nothing
+PYQP_DOWNLOAD_UPSERT = text(
+    'INSERT INTO pyqp_download_count (pyqp_id, download_count) '
+    'SELECT :pyqp_id, :delta WHERE EXISTS (SELECT 1 FROM pyqp WHERE id = :pyqp_id) '
+    'ON CONFLICT (pyqp_id) '
+    'DO UPDATE SET download_count = pyqp_download_count.download_count + excluded.download_count'
+)
+PYQP_DOWNLOAD_DAILY_UPSERT = text(
+    'INSERT INTO pyqp_download_daily (day, subject, year, download_count) '
+    'VALUES (:day, :subject, :year, :delta) '
+    'ON CONFLICT (day, subject, year) '
+    'DO UPDATE SET download_count = pyqp_download_daily.download_count + excluded.download_count'
+).bindparams(db.bindparam('day', type_=db.Date))
+
+def write_download_counts(counts):
+    # counts maps (pyqp_id, subject, year, day) to downloads; papers deleted
+    # since are left out of the totals but kept in the rollups
+    totals = collections.Counter()
+    daily = collections.Counter()
+    for (pyqp_id, subject, year, day), count in counts.items():
+        totals[pyqp_id] += count
+        daily[(day, subject, year)] += count
+    with app.app_context():
+        # Sorted, so concurrent writers lock rows in the same order
+        db.session.execute(PYQP_DOWNLOAD_UPSERT, [
+            {'pyqp_id': pyqp_id, 'delta': count} for pyqp_id, count in sorted(totals.items())
+        ])
+        db.session.execute(PYQP_DOWNLOAD_DAILY_UPSERT, [
+            {'day': day, 'subject': subject, 'year': year, 'delta': count}
+            for (day, subject, year), count in sorted(daily.items())
+        ])
+        db.session.commit()
+
+download_counter = CounterBuffer(
+    write_download_counts,
+    flush_interval=app.config['DOWNLOAD_STATS_FLUSH_INTERVAL'],
+    logger=app.logger,
+    name='download-counter'
+)
+
+def count_pyqp_download(paper, response):
+    # A revalidation or a partial range request is not another download; a
+    # viewer probing the first bytes is counted once it fetches the whole file
+    if request.method != 'GET':
+        return
+    if response.status_code == 206:
+        content_range = response.content_range
+        if not content_range or content_range.start != 0 or content_range.stop != content_range.length:
+            return
+    elif response.status_code not in (200, 302):
+        return
+    download_counter.add((paper.id, paper.subject, paper.year, datetime.utcnow().date()))
+    if not app.config['DOWNLOAD_STATS_ASYNC']:
+        download_counter.flush()
+
+def popular_subject_years(days, limit=5):
+    """Subject/year pairs with the most downloads over the last ``days``
+    days, from the daily rollups, leaving out pairs with no active papers."""
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    downloads = db.func.sum(PYQPDownloadDaily.download_count).label('downloads')
+    rows = (db.session.query(PYQPDownloadDaily.subject, PYQPDownloadDaily.year, downloads)
+            .join(PYQPCounter, and_(PYQPCounter.scope == 'subject_year',
+                                    PYQPCounter.subject == PYQPDownloadDaily.subject,
+                                    PYQPCounter.year == PYQPDownloadDaily.year,
+                                    PYQPCounter.paper_count > 0))
+            .filter(PYQPDownloadDaily.day >= since)
+            .group_by(PYQPDownloadDaily.subject, PYQPDownloadDaily.year)
+            .order_by(downloads.desc(), PYQPDownloadDaily.subject, PYQPDownloadDaily.year.desc())
+            .limit(limit))
+    return [{'subject': subject, 'year': year, 'downloads': int(count)} for subject, year, count in rows]
+
+def most_downloaded_pyqps(limit=10):
+    return (db.session.query(PYQP, PYQPDownloadCount.download_count)
+            .join(PYQPDownloadCount, PYQPDownloadCount.pyqp_id == PYQP.id)
+            .filter(PYQP.is_active == True)
+            .order_by(PYQPDownloadCount.download_count.desc(), PYQP.id)
+            .limit(limit).all())
+
+def pyqp_to_dict(paper):
+    return {
+        'id': paper.id,
+        'subject': paper.subject,
+        'year': paper.year,
+        'filename': paper.filename,
+        'description': paper.description,
+        'file_size': paper.file_size,
+        'uploaded_at': paper.uploaded_at.isoformat() if paper.uploaded_at else None,
+        'page_count': paper.page_count,
+        'thumbnail_url': url_for('serve_uploaded_file', filename=paper.thumbnail_path) if paper.thumbnail_path else None,
+        'download_url': url_for('download_pyqp', paper_id=paper.id)
+    }
+
+# Keyset pages over (created_at, id), used by the announcement feeds and the
+# contact inbox
+def encode_created_cursor(row):
+    payload = json.dumps([row.created_at.isoformat(), row.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_created_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+def paginate_by_created(query, model, cursor=None, limit=20, oldest_first=False):
+    """Return one page of ``query`` ordered by (created_at, id), newest first
+    unless ``oldest_first``, plus the cursor for the next page, or None when
+    this is the last page. Raises ValueError for a cursor that can't be
+    decoded, rather than quietly starting over from the first page."""
+    position = decode_created_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        raise ValueError('Invalid cursor')
+    if position:
+        created_at, row_id = position
+        if oldest_first:
+            query = query.filter(or_(model.created_at > created_at,
+                                     and_(model.created_at == created_at, model.id > row_id)))
+        else:
+            query = query.filter(or_(model.created_at < created_at,
+                                     and_(model.created_at == created_at, model.id < row_id)))
+    if oldest_first:
+        query = query.order_by(model.created_at, model.id)
+    else:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_created_cursor(items[-1])
+    return items, next_cursor
+
+# Announcement feeds, with validators that let polling clients be answered
+# without loading any announcement
+def paginate_announcements(cursor=None, since=None, limit=None):
+    """Return one page of active announcements and the next page's cursor.
+    Pages run newest first and ``cursor`` continues with older ones; with
+    ``since`` (the cursor of the newest announcement a client already has)
+    they run oldest first from there, so a client catches up without
+    refetching anything."""
+    query = Announcement.query.options(joinedload(Announcement.creator)).filter(Announcement.is_active == True)
+    limit = limit or app.config['ANNOUNCEMENT_FEED_PAGE_SIZE']
+    if since is not None:
+        return paginate_by_created(query, Announcement, since, limit, oldest_first=True)
+    return paginate_by_created(query, Announcement, cursor, limit)
+
+def announcement_feed_state():
+    """Return (ETag, newest created_at) of the active announcements. One
+    grouped aggregate covers posting, withdrawing and renamed authors."""
+    rows = (db.session.query(Announcement.created_by, Faculty.name, db.func.count(Announcement.id),
+                             db.func.max(Announcement.id), db.func.max(Announcement.created_at))
+            .outerjoin(Faculty, Faculty.id == Announcement.created_by)
+            .filter(Announcement.is_active == True)
+            .group_by(Announcement.created_by, Faculty.name)
+            .order_by(Announcement.created_by)
+            .all())
+    newest = max((row[4] for row in rows if row[4] is not None), default=None)
+    digest = hashlib.sha1(repr([tuple(row) for row in rows]).encode('utf-8')).hexdigest()
+    return 'announcements-' + digest[:20], newest
+
+def announcement_feed_response(build_response):
+    """Answer 304 while the client's copy is current, otherwise return
+    ``build_response()``; both carry the feed's validators."""
+    etag, newest = announcement_feed_state()
+    if is_resource_modified(request.environ, etag=etag, last_modified=newest):
+        response = build_response()
+    else:
+        response = app.response_class(status=304)
+    response.set_etag(etag)
+    if newest:
+        response.last_modified = newest
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['ANNOUNCEMENT_FEED_MAX_AGE']
+    return response
+
+def announcement_to_dict(announcement):
+    return {
+        'id': announcement.id,
+        'title': announcement.title,
+        'message': announcement.message,
+        'author': announcement.creator.name if announcement.creator else 'School Administration',
+        'created_at': announcement.created_at.isoformat() if announcement.created_at else None,
+        'cursor': encode_created_cursor(announcement)
+    }
+
+def fetch_announcement_events(after_id, limit):
+    with app.app_context():
+        announcements = (Announcement.query.options(joinedload(Announcement.creator))
+                         .filter(Announcement.is_active == True, Announcement.id > after_id)
+                         .order_by(Announcement.id)
+                         .limit(limit)
+                         .all())
+        return [(announcement.id, announcement_to_dict(announcement)) for announcement in announcements]
+
+announcement_stream = EventBroadcaster(
+    fetch_announcement_events,
+    event='announcement',
+    poll_interval=app.config['ANNOUNCEMENT_STREAM_POLL_INTERVAL'],
+    heartbeat=app.config['ANNOUNCEMENT_STREAM_HEARTBEAT'],
+    max_clients=app.config['ANNOUNCEMENT_STREAM_MAX_CLIENTS'],
+    logger=app.logger
+)
+
+# PYQP full-text search (SQLite FTS5, rowid == PYQP.id)
+SEARCH_TEXT_MAX_PAGES = 50
+SEARCH_TEXT_MAX_CHARS = 200000
+SEARCH_REBUILD_BATCH_SIZE = 100
+
+pyqp_search = table('pyqp_search', column('rowid'), column('subject'), column('description'),
+                    column('filename'), column('content'))
+# None until the first lookup, which checks whether the FTS5 table exists
+search_index_enabled = None
+
+def search_index_available():
+    global search_index_enabled
+    if search_index_enabled is None:
+        search_index_enabled = db.engine.dialect.name == 'sqlite' and inspect(db.engine).has_table('pyqp_search')
+    return search_index_enabled
+
+def ensure_search_index():
+    global search_index_enabled
+    try:
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS pyqp_search "
+            "USING fts5(subject, description, filename, content, tokenize='porter unicode61')"
+        ))
+        db.session.commit()
+        search_index_enabled = True
+    except Exception as e:
+        print(f"Full-text search unavailable, falling back to LIKE filters: {e}")
+        db.session.rollback()
+        search_index_enabled = False
+
+def extract_pyqp_text(paper):
+    try:
+        with local_stored_file(get_pyqp_key(paper)) as full_path:
+            return read_pdf_text(full_path, SEARCH_TEXT_MAX_PAGES, SEARCH_TEXT_MAX_CHARS)
+    except Exception as e:
+        print(f"Error reading PYQP {paper.id}: {e}")
+        return ''
+
+def build_match_query(text_query):
+    # Quote every term so user input can never be parsed as FTS5 syntax, and
+    # let the last term match as a prefix for search-as-you-type
+    terms = re.findall(r'\w+', text_query or '')
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+def remove_from_search_index(paper_id):
+    if search_index_available():
+        db.session.execute(text('DELETE FROM pyqp_search WHERE rowid = :id'), {'id': paper_id})
+
+def write_search_entry(paper, content):
+    remove_from_search_index(paper.id)
+    if paper.is_active:
+        db.session.execute(text(
+            'INSERT INTO pyqp_search (rowid, subject, description, filename, content) '
+            'VALUES (:id, :subject, :description, :filename, :content)'
+        ), {
+            'id': paper.id,
+            'subject': paper.subject,
+            'description': paper.description or '',
+            'filename': paper.filename,
+            'content': content
+        })
+
+def index_pyqp(paper, content=None):
+    if not search_index_available():
+        return
+    try:
+        if content is None:
+            content = extract_pyqp_text(paper)
+        write_search_entry(paper, content)
+        db.session.commit()
+    except Exception as e:
+        print(f"Error indexing PYQP {paper.id}: {e}")
+        db.session.rollback()
+
+def rebuild_search_index():
+    ensure_search_index()
+    if not search_index_available():
+        return 0
+
+    db.session.execute(text('DELETE FROM pyqp_search'))
+    db.session.commit()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        batch = PYQP.query.filter_by(is_active=True).filter(PYQP.id > last_id) \
+            .order_by(PYQP.id).limit(SEARCH_REBUILD_BATCH_SIZE).all()
+        if not batch:
+            break
+        for paper in batch:
+            content = extract_pyqp_text(paper)
+            write_search_entry(paper, content)
+        db.session.commit()
+        indexed += len(batch)
+        last_id = batch[-1].id
+    return indexed
+
+def search_pyqp(text_query, limit=PYQP_PAGE_SIZE):
+    """Return (paper, snippet) pairs ranked by BM25, weighting subject and
+    filename matches above matches in the extracted PDF text."""
+    match = build_match_query(text_query)
+    if not match:
+        return []
+
+    if not search_index_available():
+        papers, _ = paginate_pyqp(text_query=text_query, limit=limit)
+        return [(paper, '') for paper in papers]
+
+    rows = db.session.execute(text(
+        "SELECT rowid, snippet(pyqp_search, 3, '', '', '...', 12) AS snippet "
+        "FROM pyqp_search WHERE pyqp_search MATCH :match "
+        "ORDER BY bm25(pyqp_search, 10.0, 2.0, 5.0, 1.0) LIMIT :limit"
+    ), {'match': match, 'limit': limit}).all()
+    if not rows:
+        return []
+
+    ids = [row.rowid for row in rows]
+    papers = {paper.id: paper for paper in PYQP.query.filter_by(is_active=True).filter(PYQP.id.in_(ids))}
+    return [(papers[row.rowid], row.snippet) for row in rows if row.rowid in papers]
+
+# Background PDF processing: jobs are claimed with a conditional UPDATE so
+# any number of dispatchers can share the queue, and retried with backoff
+PDF_JOB_RETRY_DELAY = 30
+
+def get_thumbnail_path(content_hash):
+    return '/'.join(['pyqp', 'thumbs', content_hash[:2], f'{content_hash}.png'])
+
+def enqueue_pdf_job(paper):
+    paper.processing_status = 'pending'
+    job = PDFJob(pyqp=paper)
+    db.session.add(job)
+    return job
+
+def pdf_scratch_paths(job_id):
+    scratch_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'pyqp', 'processing')
+    return os.path.join(scratch_dir, f'{job_id}.pdf'), os.path.join(scratch_dir, f'{job_id}.png')
+
+def pdf_job_args(job):
+    # Worker processes read and write local files, so a paper kept in an
+    # object store is processed from a scratch copy
+    paper = job.pyqp
+    if storage.is_local:
+        full_path = storage.path(get_pyqp_key(paper))
+        thumbnail_path = storage.path(get_thumbnail_path(paper.content_hash)) if paper.content_hash else None
+    else:
+        full_path, thumbnail_path = pdf_scratch_paths(job.id)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        storage.download(get_pyqp_key(paper), full_path)
+        if not paper.content_hash:
+            thumbnail_path = None
+    return (full_path, thumbnail_path, SEARCH_TEXT_MAX_PAGES, SEARCH_TEXT_MAX_CHARS,
+            app.config['PDF_THUMBNAIL_WIDTH'])
+
+def discard_pdf_scratch(job_id):
+    if storage.is_local:
+        return
+    for path in pdf_scratch_paths(job_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+def claim_pdf_jobs(limit):
+    """Mark up to ``limit`` due jobs as running and return their
+    (job_id, process_pdf arguments)."""
+    with app.app_context():
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=app.config['PDF_JOB_TIMEOUT'])
+        candidates = PDFJob.query.filter(or_(
+            and_(PDFJob.status == 'pending', PDFJob.run_after <= now),
+            and_(PDFJob.status == 'running', PDFJob.started_at < stale)
+        )).order_by(PDFJob.id).limit(limit).all()
+
+        claimed = []
+        for job in candidates:
+            if job.attempts >= app.config['PDF_JOB_MAX_ATTEMPTS']:
+                # Its worker died or hung on the last attempt
+                record_pdf_job_failure(job, 'Timed out')
+                continue
+            updated = db.session.execute(
+                PDFJob.__table__.update()
+                .where(PDFJob.id == job.id, PDFJob.status == job.status, PDFJob.attempts == job.attempts)
+                .values(status='running', started_at=now, attempts=job.attempts + 1)
+            ).rowcount
+            if updated:
+                try:
+                    claimed.append((job.id, pdf_job_args(job)))
+                except Exception as e:
+                    # Reload the claimed row so the failure is written over it
+                    db.session.expire(job)
+                    discard_pdf_scratch(job.id)
+                    record_pdf_job_failure(job, e)
+        db.session.commit()
+        return claimed
+
+def complete_pdf_job(job_id, result):
+    with app.app_context():
+        job = db.session.get(PDFJob, job_id)
+        if job is None:
+            # The paper was deleted while its job ran
+            discard_pdf_scratch(job_id)
+            return
+        paper = job.pyqp
+        thumbnail = result['thumbnail']
+        if thumbnail and not storage.is_local:
+            try:
+                storage.put_file(pdf_scratch_paths(job_id)[1], get_thumbnail_path(paper.content_hash),
+                                 content_type='image/png')
+            except Exception as e:
+                app.logger.error('Error storing thumbnail for PYQP %s: %s', paper.id, e)
+                thumbnail = False
+        discard_pdf_scratch(job_id)
+        paper.page_count = result['page_count']
+        paper.thumbnail_path = get_thumbnail_path(paper.content_hash) if thumbnail else None
+        paper.processing_status = 'ready'
+        if search_index_available():
+            write_search_entry(paper, result['text'])
+        db.session.delete(job)
+        db.session.commit()
+
+def record_pdf_job_failure(job, error):
+    job.last_error = str(error)[:1000]
+    if job.attempts >= app.config['PDF_JOB_MAX_ATTEMPTS']:
+        job.status = 'failed'
+        job.pyqp.processing_status = 'failed'
+    else:
+        job.status = 'pending'
+        job.run_after = datetime.utcnow() + timedelta(seconds=PDF_JOB_RETRY_DELAY * 2 ** max(job.attempts - 1, 0))
+
+def fail_pdf_job(job_id, error):
+    with app.app_context():
+        discard_pdf_scratch(job_id)
+        job = db.session.get(PDFJob, job_id)
+        if job is None:
+            return
+        app.logger.warning('PDF job %s for PYQP %s failed: %s', job_id, job.pyqp_id, error)
+        record_pdf_job_failure(job, error)
+        db.session.commit()
+
+pdf_worker = JobWorker(
+    claim_pdf_jobs,
+    process_pdf,
+    complete_pdf_job,
+    fail_pdf_job,
+    processes=app.config['PDF_WORKER_PROCESSES'],
+    logger=app.logger,
+    name='pdf-job-dispatcher'
+)
+
+def start_pdf_job(job):
+    mode = app.config['PDF_JOBS_MODE']
+    if mode == 'thread':
+        pdf_worker.ensure_started()
+        pdf_worker.notify()
+    elif mode == 'inline':
+        job.attempts += 1
+        job.status = 'running'
+        db.session.commit()
+        try:
+            result = process_pdf(*pdf_job_args(job))
+        except Exception as e:
+            fail_pdf_job(job.id, e)
+        else:
+            complete_pdf_job(job.id, result)
+
+def enqueue_unprocessed_pyqps(batch_size=500):
+    """Queue papers uploaded before PDF jobs existed. Returns how many."""
+    queued = 0
+    while True:
+        batch = PYQP.query.filter(PYQP.processing_status.is_(None)).limit(batch_size).all()
+        if not batch:
+            return queued
+        for paper in batch:
+            enqueue_pdf_job(paper)
+        db.session.commit()
+        queued += len(batch)
+
+@app.before_request
+def start_pdf_worker():
+    # Picks up jobs left over from before a restart
+    if app.config['PDF_JOBS_MODE'] == 'thread':
+        pdf_worker.ensure_started()
+
+# Background photo resizing: the same claim/retry scheme as PDF jobs. Variants
+# are content-addressed by the original's hash, so a photo used twice is
+# stored once
+
+def get_variant_path(content_hash, filename):
+    return '/'.join(['photos', 'variants', content_hash[:2], content_hash, filename])
+
+def photo_scratch_dir(job_id):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'photos', 'processing', str(job_id))
+
+def photo_job_args(job):
+    output_dir = photo_scratch_dir(job.id)
+    path = normalize_image_path(job.image_path)
+    if is_remote_image(path):
+        source = path
+    elif storage.exists(path):
+        if storage.is_local:
+            source = storage.path(path)
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+            source = os.path.join(output_dir, 'source')
+            storage.download(path, source)
+    elif os.path.isfile(os.path.join(app.static_folder, *path.split('/'))):
+        source = os.path.join(app.static_folder, *path.split('/'))
+    else:
+        raise FileNotFoundError(f'Photo {job.image_path} not found')
+    return (source, output_dir, app.config['PHOTO_VARIANT_WIDTHS'], app.config['PHOTO_VARIANT_FORMATS'],
+            app.config['PHOTO_VARIANT_QUALITY'], app.config['PHOTO_MAX_BYTES'])
+
+def claim_photo_jobs(limit):
+    """Mark up to ``limit`` due jobs as running and return their
+    (job_id, render_variants arguments)."""
+    with app.app_context():
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=app.config['PHOTO_JOB_TIMEOUT'])
+        candidates = PhotoJob.query.filter(or_(
+            and_(PhotoJob.status == 'pending', PhotoJob.run_after <= now),
+            and_(PhotoJob.status == 'running', PhotoJob.started_at < stale)
+        )).order_by(PhotoJob.id).limit(limit).all()
+
+        claimed = []
+        for job in candidates:
+            if is_remote_image(job.image_path) and not app.config['PHOTO_FETCH_REMOTE']:
+                # Queued before remote fetching was turned off; the original is shown
+                db.session.delete(job)
+                continue
+            if job.attempts >= app.config['PHOTO_JOB_MAX_ATTEMPTS']:
+                record_photo_job_failure(job, 'Timed out')
+                continue
+            updated = db.session.execute(
+                PhotoJob.__table__.update()
+                .where(PhotoJob.id == job.id, PhotoJob.status == job.status, PhotoJob.attempts == job.attempts)
+                .values(status='running', started_at=now, attempts=job.attempts + 1)
+            ).rowcount
+            if updated:
+                try:
+                    claimed.append((job.id, photo_job_args(job)))
+                except Exception as e:
+                    db.session.expire(job)
+                    discard_output(photo_scratch_dir(job.id))
+                    record_photo_job_failure(job, e)
+        db.session.commit()
+        return claimed
+
+def complete_photo_job(job_id, result):
+    with app.app_context():
+        output_dir = photo_scratch_dir(job_id)
+        try:
+            job = db.session.get(PhotoJob, job_id)
+            if job is None:
+                return
+            member = job.faculty_member
+            if member.image_path == job.image_path:
+                variants = {}
+                for name, entries in result['variants'].items():
+                    variants[name] = []
+                    for width, filename in entries:
+                        key = get_variant_path(result['content_hash'], filename)
+                        if not storage.exists(key):
+                            storage.put_file(os.path.join(output_dir, filename), key,
+                                             content_type=variant_content_type(filename))
+                        upload_file_index.add(key)
+                        variants[name].append([width, key])
+                member.image_variants = json.dumps({
+                    'source': job.image_path, 'width': result['width'], 'height': result['height'],
+                    'variants': variants
+                }, separators=(',', ':'))
+            # Otherwise the photo changed while the job ran, and a newer job
+            # renders the new one
+            db.session.delete(job)
+            db.session.commit()
+        finally:
+            discard_output(output_dir)
+
+def record_photo_job_failure(job, error):
+    job.last_error = str(error)[:1000]
+    if job.attempts >= app.config['PHOTO_JOB_MAX_ATTEMPTS']:
+        # Pages keep showing the original
+        job.status = 'failed'
+    else:
+        job.status = 'pending'
+        job.run_after = datetime.utcnow() + timedelta(seconds=app.config['PHOTO_JOB_RETRY_DELAY'] * 2 ** max(job.attempts - 1, 0))
+
+def fail_photo_job(job_id, error):
+    with app.app_context():
+        discard_output(photo_scratch_dir(job_id))
+        job = db.session.get(PhotoJob, job_id)
+        if job is None:
+            return
+        app.logger.warning('Photo job %s for faculty member %s failed: %s', job_id, job.faculty_member_id, error)
+        record_photo_job_failure(job, error)
+        db.session.commit()
+
+photo_worker = JobWorker(
+    claim_photo_jobs,
+    render_variants,
+    complete_photo_job,
+    fail_photo_job,
+    processes=app.config['PHOTO_WORKER_PROCESSES'],
+    logger=app.logger,
+    name='photo-job-dispatcher'
+)
+
+def enqueue_missing_photo_jobs():
+    """Queue photos that have no variants and no job. Returns how many."""
+    members = FacultyMember.query.filter(
+        FacultyMember.image_path.isnot(None),
+        FacultyMember.image_path != '',
+        ~FacultyMember.image_path.startswith('data:'),
+        FacultyMember.image_variants.is_(None),
+        ~FacultyMember.photo_jobs.any()
+    ).all()
+    members = [member for member in members if needs_photo_job(member.image_path)]
+    for member in members:
+        db.session.add(PhotoJob(faculty_member=member, image_path=member.image_path))
+    db.session.commit()
+    return len(members)
+
+@app.before_request
+def start_photo_worker():
+    if app.config['PHOTO_JOBS_MODE'] == 'thread':
+        photo_worker.ensure_started()
+
+# Contact inbox: bulk actions are single UPDATE statements, and replies are
+# queued in outbound_email and sent in batches by mail_sender
+INBOX_VIEWS = ('unread', 'all', 'archived')
+MAIL_RETRY_DELAY = 60
+
+def inbox_filter(view):
+    if view == 'archived':
+        return ContactMessage.archived_at.isnot(None)
+    if view == 'all':
+        return ContactMessage.archived_at.is_(None)
+    return and_(ContactMessage.is_read == False, ContactMessage.archived_at.is_(None))
+
+def update_inbox_messages(action, ids=None, view='unread', through=None):
+    """Apply ``action`` to the messages in ``ids``, or to every message in
+    ``view`` up to the ``through`` cursor (the newest one the user saw), in
+    one UPDATE. Returns the number of messages changed."""
+    table = ContactMessage.__table__
+    if action == 'mark_read':
+        statement = table.update().where(ContactMessage.is_read == False).values(is_read=True)
+    elif action == 'mark_unread':
+        statement = table.update().where(ContactMessage.is_read == True).values(is_read=False)
+    elif action == 'archive':
+        statement = table.update().where(ContactMessage.archived_at.is_(None)).values(archived_at=datetime.utcnow())
+    elif action == 'unarchive':
+        statement = table.update().where(ContactMessage.archived_at.isnot(None)).values(archived_at=None)
+    else:
+        raise ValueError(f'Unknown inbox action {action!r}')
+
+    if ids is not None:
+        if not ids:
+            return 0
+        statement = statement.where(ContactMessage.id.in_(ids))
+    else:
+        statement = statement.where(inbox_filter(view))
+        position = decode_created_cursor(through) if through else None
+        if through and position is None:
+            raise ValueError('Invalid cursor')
+        if position:
+            created_at, message_id = position
+            statement = statement.where(or_(
+                ContactMessage.created_at < created_at,
+                and_(ContactMessage.created_at == created_at, ContactMessage.id <= message_id)
+            ))
+    updated = db.session.execute(statement).rowcount
+    db.session.commit()
+    return updated
+
+def contact_message_to_dict(message):
+    return {
+        'id': message.id,
+        'name': message.name,
+        'email': message.email,
+        'phone': message.phone,
+        'subject': message.subject,
+        'message': message.message,
+        'created_at': message.created_at.isoformat() if message.created_at else None,
+        'is_read': bool(message.is_read),
+        'replied_at': message.replied_at.isoformat() if message.replied_at else None,
+        'archived_at': message.archived_at.isoformat() if message.archived_at else None,
+        'cursor': encode_created_cursor(message)
+    }
+
+def queue_contact_reply(message, reply_text):
+    message.reply_message = reply_text
+    message.replied_at = datetime.utcnow()
+    message.is_read = True
+    outbound = OutboundEmail(
+        contact_message_id=message.id,
+        recipient=message.email,
+        subject=f'Re: {message.subject}'[:200],
+        body=reply_text
+    )
+    db.session.add(outbound)
+    return outbound
+
+def build_email(outbound):
+    email = EmailMessage()
+    email['From'] = app.config['MAIL_FROM']
+    email['To'] = outbound.recipient
+    email['Subject'] = outbound.subject
+    email['Date'] = format_datetime(outbound.created_at.replace(tzinfo=timezone.utc), usegmt=True)
+    # Stable across retries, so a receiver can drop a copy sent twice
+    domain = parseaddr(app.config['MAIL_FROM'])[1].rpartition('@')[2] or 'localhost'
+    email['Message-ID'] = f'<outbound-{outbound.id}.{outbound.created_at:%Y%m%d%H%M%S}@{domain}>'
+    email.set_content(outbound.body)
+    return email
+
+def claim_outbound_emails(limit):
+    """Mark up to ``limit`` due messages as sending with one UPDATE and
+    return their (id, EmailMessage) pairs."""
+    with app.app_context():
+        table = OutboundEmail.__table__
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=app.config['MAIL_SEND_TIMEOUT'])
+        # A sender died or hung while handing these over on their last attempt
+        db.session.execute(
+            table.update()
+            .where(OutboundEmail.status == 'sending', OutboundEmail.started_at < stale,
+                   OutboundEmail.attempts >= app.config['MAIL_MAX_ATTEMPTS'])
+            .values(status='failed', last_error='Timed out', claim_token=None)
+        )
+        due = or_(
+            and_(OutboundEmail.status == 'pending', OutboundEmail.run_after <= now),
+            and_(OutboundEmail.status == 'sending', OutboundEmail.started_at < stale)
+        )
+        token = os.urandom(16).hex()
+        db.session.execute(
+            table.update()
+            .where(OutboundEmail.id.in_(select(OutboundEmail.id).where(due).order_by(OutboundEmail.id).limit(limit)), due)
+            .values(status='sending', claim_token=token, started_at=now, attempts=OutboundEmail.attempts + 1)
+        )
+        claimed = OutboundEmail.query.filter_by(status='sending', claim_token=token).order_by(OutboundEmail.id).all()
+        messages = [(outbound.id, build_email(outbound)) for outbound in claimed]
+        db.session.commit()
+        return messages
+
+def finish_outbound_emails(sent_ids, failures):
+    with app.app_context():
+        if sent_ids:
+            db.session.execute(
+                OutboundEmail.__table__.update()
+                .where(OutboundEmail.id.in_(sent_ids))
+                .values(status='sent', sent_at=datetime.utcnow(), claim_token=None, last_error=None)
+            )
+        if failures:
+            for outbound in OutboundEmail.query.filter(OutboundEmail.id.in_(list(failures))):
+                outbound.last_error = str(failures[outbound.id])[:1000]
+                outbound.claim_token = None
+                if outbound.attempts >= app.config['MAIL_MAX_ATTEMPTS']:
+                    outbound.status = 'failed'
+                else:
+                    outbound.status = 'pending'
+                    outbound.run_after = datetime.utcnow() + timedelta(seconds=MAIL_RETRY_DELAY * 2 ** max(outbound.attempts - 1, 0))
+        db.session.commit()
+
+mail_sender = OutboxSender(
+    claim_outbound_emails,
+    finish_outbound_emails,
+    create_transport(app.config),
+    batch_size=app.config['MAIL_BATCH_SIZE'],
+    logger=app.logger
+)
+
+def deliver_queued_mail():
+    mode = app.config['MAIL_OUTBOX_MODE']
+    if mode == 'thread':
+        mail_sender.ensure_started()
+        mail_sender.notify()
+    elif mode == 'inline':
+        mail_sender.run(until_idle=True)
+
+@app.before_request
+def start_mail_sender():
+    # Picks up mail left queued before a restart
+    if app.config['MAIL_OUTBOX_MODE'] == 'thread':
+        mail_sender.ensure_started()
 
 @app.context_processor
 def inject_template_helpers():
     return {
-        'get_image_url': get_image_url
+        'get_image_url': get_image_url,
+        'get_image_sources': get_image_sources
     }
 
 # =====================
@@ -200,6 +2189,7 @@ def inject_template_helpers():
 # =====================
 
 @app.route('/')
+@response_cache.cached()
 def index():
     if current_user.is_authenticated:
         # Redirect based on role
@@ -211,10 +2201,12 @@ def index():
     return render_template('index.html')
 
 @app.route('/about')
+@response_cache.cached()
 def about():
     return render_template('about.html')
 
 @app.route('/faculty')
+@response_cache.cached('faculty')
 def faculty():
     faculty_members = FacultyMember.query.filter(
         FacultyMember.name.isnot(None),
@@ -229,16 +2221,55 @@ def faculty():
     return render_template('faculty.html', faculty_members=faculty_members)
 
 @app.route('/pyqp')
+@response_cache.cached('pyqp')
 def pyqp():
-    papers = PYQP.query.filter_by(is_active=True).order_by(PYQP.year.desc(), PYQP.subject).all()
+    filters = {
+        'subject': request.args.get('subject', '').strip(),
+        'year': request.args.get('year', type=int),
+        'q': request.args.get('q', '').strip()
+    }
+    try:
+        papers, next_cursor = paginate_pyqp(
+            subject=filters['subject'] or None,
+            year=filters['year'],
+            text_query=filters['q'] or None,
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit'))
+        )
+    except ValueError:
+        abort(400)
     subjects = {}
     for paper in papers:
         if paper.subject not in subjects:
             subjects[paper.subject] = []
         subjects[paper.subject].append(paper)
-    return render_template('pyqp.html', subjects=subjects)
+    subject_options, year_options = get_pyqp_filter_options()
+    popular = []
+    if not request.args.get('cursor') and not any(filters.values()):
+        popular = popular_subject_years(app.config['POPULAR_PYQP_DAYS'])
+    return render_template('pyqp.html',
+                         subjects=subjects,
+                         popular=popular,
+                         popular_days=app.config['POPULAR_PYQP_DAYS'],
+                         filters=filters,
+                         subject_options=subject_options,
+                         year_options=year_options,
+                         next_cursor=next_cursor,
+                         is_first_page=not request.args.get('cursor'))
+
+def client_ip():
+    return request.remote_addr
+
+def submitted_username():
+    return request.form.get('username', '').strip().lower()
+
+def submitted_username_and_ip():
+    username = submitted_username()
+    return f'{username}|{client_ip()}' if username else ''
 
 @app.route('/contact', methods=['GET', 'POST'])
+@rate_limiter.limit('contact_ip', app.config['RATE_LIMIT_CONTACT_PER_IP'], client_ip,
+                    message='You have sent too many messages. Please try again later.')
 def contact():
     if request.method == 'POST':
         name = request.form['name']
@@ -267,15 +2298,59 @@ def contact():
     return render_template('contact.html')
 
 @app.route('/announcements')
+@response_cache.cached('announcements')
 def announcements():
     active_announcements = Announcement.query.filter_by(is_active=True).order_by(Announcement.created_at.desc()).all()
     return render_template('announcements.html', announcements=active_announcements)
 
+@app.route('/announcements.atom')
+def announcements_atom():
+    cursor = request.args.get('cursor')
+    if cursor and decode_created_cursor(cursor) is None:
+        abort(400)
+
+    def build_response():
+        items, next_cursor = paginate_announcements(cursor=cursor)
+        body = render_template('announcements.xml', announcements=items, next_cursor=next_cursor,
+                               updated=items[0].created_at if items else datetime.utcnow())
+        return app.response_class(body, mimetype='application/atom+xml')
+    return announcement_feed_response(build_response)
+
+@app.route('/announcements/stream')
+def announcements_stream():
+    if not app.config['ANNOUNCEMENT_STREAM']:
+        abort(404)
+    # A reconnecting EventSource sends the id of the last event it received
+    try:
+        position = max(0, int(request.headers.get('Last-Event-ID') or request.args['last_event_id']))
+    except (KeyError, ValueError):
+        position = db.session.query(db.func.max(Announcement.id)).scalar() or 0
+    try:
+        subscription = announcement_stream.subscribe(position)
+    except StreamFull:
+        response = app.response_class('Too many open announcement streams', status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = '30'
+        return response
+
+    heartbeat_ms = app.config['ANNOUNCEMENT_STREAM_HEARTBEAT'] * 1000
+    response = app.response_class(announcement_stream.stream(subscription, retry_ms=heartbeat_ms),
+                                  mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    # Stop nginx from buffering events until its buffer fills
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # =====================
 # AUTHENTICATION ROUTES
 # =====================
 
 @app.route('/faculty/login', methods=['GET', 'POST'])
+@rate_limiter.limit('login_ip', app.config['RATE_LIMIT_LOGIN_PER_IP'], client_ip,
+                    message='Too many login attempts. Please wait a minute and try again.')
+@rate_limiter.limit('login_username_ip', app.config['RATE_LIMIT_LOGIN_PER_USERNAME_IP'], submitted_username_and_ip,
+                    message='Too many login attempts. Please wait a minute and try again.')
+@rate_limiter.limit('login_username', app.config['RATE_LIMIT_LOGIN_PER_USERNAME'], submitted_username,
+                    message='Too many login attempts. Please wait a minute and try again.')
 def faculty_login():
     if current_user.is_authenticated:
         return redirect(url_for('faculty_dashboard'))
@@ -329,7 +2404,7 @@ def faculty_logout():
 @login_required
 def faculty_dashboard():
     try:
-        pyqp_count = PYQP.query.filter_by(uploaded_by=current_user.id).count()
+        pyqp_count = get_pyqp_count(uploaded_by=current_user.id)
         recent_pyqps = PYQP.query.filter_by(uploaded_by=current_user.id).order_by(PYQP.uploaded_at.desc()).limit(5).all()
         recent_activities = ActivityLog.query.filter_by(faculty_id=current_user.id).order_by(ActivityLog.created_at.desc()).limit(10).all()
         
@@ -356,55 +2431,32 @@ def faculty_upload_pyqp():
         
         if file and allowed_file(file.filename, ALLOWED_PDF_EXTENSIONS):
             filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            unique_filename = f"{timestamp}_{filename}"
-            
-            pyqp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'pyqp')
-            os.makedirs(pyqp_dir, exist_ok=True)
-            
-            file_path = os.path.join('pyqp', unique_filename)
-            full_path = os.path.join(app.config['UPLOAD_FOLDER'], file_path)
+            file_path = None
             
             try:
-                file.save(full_path)
-                
-                file_size = os.path.getsize(full_path)
-                subject = request.form['subject']
-                if subject == 'Other' and request.form.get('custom_subject'):
-                    subject = request.form['custom_subject']
-                
-                new_pyqp = PYQP(
-                    subject=subject,
-                    year=int(request.form['year']),
-                    filename=filename,
-                    file_path=file_path,
-                    description=request.form.get('description', ''),
-                    uploaded_by=current_user.id,
-                    file_size=file_size
-                )
-                db.session.add(new_pyqp)
-                db.session.commit()
-                
-                log_activity(
-                    current_user.id,
-                    'upload_pyqp',
-                    f'Uploaded PYQP: {subject} {request.form["year"]}',
-                    request.remote_addr,
-                    request.headers.get('User-Agent')
-                )
+                file_path, content_hash, file_size = store_pyqp_upload(file)
+                save_uploaded_pyqp(request.form, filename, file_path, content_hash, file_size)
                 
                 flash('PYQP uploaded successfully!', 'success')
                 return redirect(url_for('faculty_upload_pyqp'))
                 
+            except ValueError:
+                db.session.rollback()
+                if file_path:
+                    release_pyqp_blob(file_path)
+                flash('Invalid file. Please upload a valid PDF file.', 'error')
+                return redirect(request.url)
             except Exception:
                 db.session.rollback()
+                if file_path:
+                    release_pyqp_blob(file_path)
                 flash('Error uploading file. Please try again.', 'error')
                 return redirect(request.url)
         else:
             flash('Invalid file type. Please upload PDF files only.', 'error')
     
     try:
-        total_pyqp = PYQP.query.count()
+        total_pyqp = get_pyqp_count()
         recent_pyqps = PYQP.query.filter_by(uploaded_by=current_user.id).order_by(PYQP.uploaded_at.desc()).limit(10).all()
     except Exception:
         total_pyqp = 0
@@ -415,6 +2467,137 @@ def faculty_upload_pyqp():
                          recent_pyqps=recent_pyqps,
                          current_year=datetime.now().year)
 
+def upload_error_response(error):
+    payload = {'error': str(error)}
+    if isinstance(error, OffsetMismatch):
+        payload['offset'] = error.expected_offset
+    return jsonify(payload), error.status_code
+
+@app.route('/faculty/upload_pyqp/chunked', methods=['POST'])
+@login_required
+def faculty_start_chunked_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename, ALLOWED_PDF_EXTENSIONS):
+        return jsonify({'error': 'Invalid file type. Please upload PDF files only.'}), 400
+
+    try:
+        total_size = int(data['size']) if data.get('size') is not None else None
+        upload_id = chunked_uploads.create(current_user.id, filename, total_size)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid file size.'}), 400
+    except UploadError as e:
+        return upload_error_response(e)
+
+    return jsonify({
+        'upload_id': upload_id,
+        'offset': 0,
+        'chunk_size': app.config['CHUNKED_UPLOAD_CHUNK_SIZE']
+    }), 201
+
+@app.route('/faculty/upload_pyqp/chunked/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+@login_required
+def faculty_chunked_upload(upload_id):
+    try:
+        if request.method == 'GET':
+            return jsonify({'offset': chunked_uploads.load(upload_id, current_user.id)['offset']})
+
+        if request.method == 'DELETE':
+            chunked_uploads.load(upload_id, current_user.id)
+            chunked_uploads.discard(upload_id)
+            return '', 204
+
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            return jsonify({'error': 'Upload-Offset header is required.'}), 400
+        new_offset = chunked_uploads.append(upload_id, offset, request.stream, current_user.id)
+        return jsonify({'offset': new_offset})
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.route('/faculty/upload_pyqp/chunked/<upload_id>/complete', methods=['POST'])
+@login_required
+def faculty_complete_chunked_upload(upload_id):
+    try:
+        int(request.form['year'])
+        if not request.form['subject']:
+            raise ValueError
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Subject and year are required.'}), 400
+
+    file_path = None
+    try:
+        part_path, content_hash, file_size, filename = chunked_uploads.finish(upload_id, current_user.id)
+        file_path = commit_blob(part_path, content_hash)
+        save_uploaded_pyqp(request.form, filename, file_path, content_hash, file_size)
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception:
+        db.session.rollback()
+        if file_path:
+            release_pyqp_blob(file_path)
+        return jsonify({'error': 'Error uploading file. Please try again.'}), 500
+
+    flash('PYQP uploaded successfully!', 'success')
+    return jsonify({'redirect': url_for('faculty_upload_pyqp')}), 201
+
+@app.route('/faculty/upload_pyqp/bulk', methods=['POST'])
+@login_required
+def faculty_bulk_import_pyqp():
+    archive = request.files.get('archive')
+    if not archive or not allowed_file(archive.filename, {'zip'}):
+        return jsonify({'error': 'Please upload a ZIP archive.'}), 400
+    manifest = request.files.get('manifest')
+
+    try:
+        source = open_source(archive.stream, secure_filename(archive.filename))
+        try:
+            if manifest and manifest.filename:
+                rows = load_manifest(source, manifest.read(), manifest.filename)
+            else:
+                rows = load_manifest(source)
+            summary = import_pyqps(source, rows, current_user.id, request.remote_addr,
+                                   request.headers.get('User-Agent'))
+        finally:
+            source.close()
+    except ManifestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception:
+        db.session.rollback()
+        return jsonify({'error': 'Error importing papers. Please try again.'}), 500
+
+    return jsonify(summary)
+
+@app.route('/faculty/pyqp/<int:paper_id>/delete', methods=['POST'])
+@login_required
+def faculty_delete_pyqp(paper_id):
+    paper = PYQP.query.get_or_404(paper_id)
+    if paper.uploaded_by != current_user.id and not current_user.is_admin:
+        flash('You can only delete question papers you uploaded.', 'error')
+        return redirect(url_for('faculty_upload_pyqp'))
+
+    file_path = paper.file_path
+    details = f'Deleted PYQP: {paper.subject} {paper.year}'
+    try:
+        remove_from_search_index(paper.id)
+        db.session.delete(paper)
+        db.session.commit()
+        release_pyqp_blob(file_path)
+
+        log_activity(
+            current_user.id,
+            'delete_pyqp',
+            details,
+            request.remote_addr,
+            request.headers.get('User-Agent')
+        )
+
+        flash('PYQP deleted successfully.', 'success')
+    except Exception:
+        db.session.rollback()
+        flash('Error deleting PYQP. Please try again.', 'error')
+    return redirect(url_for('faculty_upload_pyqp'))
+
 @app.route('/faculty/profile', methods=['GET', 'POST'])
 @login_required
 def faculty_profile():
@@ -497,50 +2680,422 @@ def faculty_announcements():
     posted_announcements = Announcement.query.order_by(Announcement.created_at.desc()).all()
     return render_template('auth/faculty_announcements.html', announcements=posted_announcements)
 
+@app.route('/faculty/messages')
+@login_required
+def faculty_messages():
+    if not current_user.is_admin:
+        flash('Only administrators can read contact messages.', 'error')
+        return redirect(url_for('faculty_dashboard'))
+
+    view = request.args.get('view', 'unread')
+    if view not in INBOX_VIEWS:
+        view = 'unread'
+    cursor = request.args.get('cursor')
+    query = ContactMessage.query.filter(inbox_filter(view))
+    try:
+        messages, next_cursor = paginate_by_created(query, ContactMessage, cursor, app.config['INBOX_PAGE_SIZE'])
+    except ValueError:
+        abort(400)
+    # "Apply to all" stops at the newest message shown, so nothing that
+    # arrives meanwhile is marked without being seen
+    newest = messages[0] if messages and not cursor else query.order_by(
+        ContactMessage.created_at.desc(), ContactMessage.id.desc()).first()
+    return render_template('auth/faculty_messages.html',
+                           messages=messages,
+                           view=view,
+                           views=INBOX_VIEWS,
+                           next_cursor=next_cursor,
+                           through=encode_created_cursor(newest) if newest else None,
+                           unread_count=ContactMessage.query.filter(inbox_filter('unread')).count())
+
+@app.route('/faculty/messages/bulk', methods=['POST'])
+@login_required
+def faculty_messages_bulk():
+    if not current_user.is_admin:
+        if request.is_json:
+            return jsonify({'error': 'Only administrators can update contact messages'}), 403
+        flash('Only administrators can update contact messages.', 'error')
+        return redirect(url_for('faculty_dashboard'))
+    payload = request.get_json(silent=True) if request.is_json else request.form
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+    action = payload.get('action')
+    view = payload.get('view') if payload.get('view') in INBOX_VIEWS else 'unread'
+    if payload.get('scope') == 'view':
+        ids = None
+    elif request.is_json:
+        ids = [int(message_id) for message_id in payload.get('ids') or [] if str(message_id).isdigit()]
+    else:
+        ids = request.form.getlist('ids', type=int)
+
+    try:
+        updated = update_inbox_messages(action, ids=ids, view=view, through=payload.get('through'))
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 400
+        if action in ('mark_read', 'mark_unread', 'archive', 'unarchive'):
+            flash('The inbox changed since the page was loaded. Please try again.', 'error')
+        else:
+            flash('Choose an action for the selected messages.', 'error')
+        return redirect(url_for('faculty_messages', view=view))
+    except Exception:
+        db.session.rollback()
+        if request.is_json:
+            return jsonify({'error': 'Error updating messages'}), 500
+        flash('Error updating messages. Please try again.', 'error')
+        return redirect(url_for('faculty_messages', view=view))
+
+    log_activity(
+        current_user.id,
+        'update_contact_messages',
+        f'{action}: {updated} messages',
+        request.remote_addr,
+        request.headers.get('User-Agent')
+    )
+    if request.is_json:
+        return jsonify({'updated': updated})
+    flash(f'{updated} message{"" if updated == 1 else "s"} updated.', 'success')
+    return redirect(url_for('faculty_messages', view=view))
+
+@app.route('/faculty/messages/<int:message_id>', methods=['GET', 'POST'])
+@login_required
+def faculty_message(message_id):
+    if not current_user.is_admin:
+        flash('Only administrators can read contact messages.', 'error')
+        return redirect(url_for('faculty_dashboard'))
+
+    message = ContactMessage.query.get_or_404(message_id)
+    if request.method == 'POST':
+        reply = request.form.get('reply', '').strip()
+        if not reply:
+            flash('Reply message is required.', 'error')
+            return redirect(url_for('faculty_message', message_id=message.id))
+        try:
+            queue_contact_reply(message, reply)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            flash('Error queuing reply. Please try again.', 'error')
+            return redirect(url_for('faculty_message', message_id=message.id))
+
+        deliver_queued_mail()
+        log_activity(
+            current_user.id,
+            'reply_contact_message',
+            f'Replied to message {message.id}: {message.subject}',
+            request.remote_addr,
+            request.headers.get('User-Agent')
+        )
+        flash('Reply queued for sending.', 'success')
+        return redirect(url_for('faculty_message', message_id=message.id))
+
+    if not message.is_read:
+        message.is_read = True
+        db.session.commit()
+    outbound_emails = OutboundEmail.query.filter_by(contact_message_id=message.id).order_by(OutboundEmail.id).all()
+    return render_template('auth/faculty_message.html', message=message, outbound_emails=outbound_emails)
+
+# =====================
+# API ROUTES
+# =====================
+
+@app.route('/api/pyqp')
+def api_pyqp():
+    try:
+        papers, next_cursor = paginate_pyqp(
+            subject=request.args.get('subject', '').strip() or None,
+            year=request.args.get('year', type=int),
+            text_query=request.args.get('q', '').strip() or None,
+            cursor=request.args.get('cursor'),
+            limit=parse_page_size(request.args.get('limit'))
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'papers': [pyqp_to_dict(paper) for paper in papers],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/pyqp/popular')
+@response_cache.cached()
+def api_pyqp_popular():
+    days = max(1, min(request.args.get('days', app.config['POPULAR_PYQP_DAYS'], type=int), 366))
+    limit = max(1, min(request.args.get('limit', 10, type=int), PYQP_MAX_PAGE_SIZE))
+    return jsonify({
+        'days': days,
+        'subject_years': popular_subject_years(days, limit),
+        'papers': [dict(pyqp_to_dict(paper), downloads=downloads)
+                   for paper, downloads in most_downloaded_pyqps(limit)]
+    })
+
+@app.route('/api/downloads/stats')
+@login_required
+def api_download_stats():
+    return jsonify(download_counter.get_stats())
+
+@app.route('/api/announcements')
+def api_announcements():
+    cursor = request.args.get('cursor')
+    since = request.args.get('since')
+    # A cursor that doesn't decode is the client's bug; answering with the
+    # first page would hide it, and echo a bad ``since`` back as since_cursor
+    if cursor and decode_created_cursor(cursor) is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    if since is not None and decode_created_cursor(since) is None:
+        return jsonify({'error': 'Invalid since cursor'}), 400
+
+    def build_response():
+        limit = parse_page_size(request.args['limit']) if request.args.get('limit') else None
+        items, next_cursor = paginate_announcements(cursor=cursor, since=since, limit=limit)
+        # Clients poll with ?since=<since_cursor> to fetch only what is new
+        if since is not None:
+            since_cursor = encode_created_cursor(items[-1]) if items else since
+        else:
+            since_cursor = encode_created_cursor(items[0]) if items and not cursor else None
+        return jsonify({
+            'announcements': [announcement_to_dict(announcement) for announcement in items],
+            'next_cursor': next_cursor,
+            'since_cursor': since_cursor
+        })
+    return announcement_feed_response(build_response)
+
+@app.route('/api/pyqp/search')
+def api_pyqp_search():
+    text_query = request.args.get('q', '').strip()
+    results = search_pyqp(text_query, limit=parse_page_size(request.args.get('limit')))
+    return jsonify({
+        'query': text_query,
+        'results': [dict(pyqp_to_dict(paper), snippet=snippet) for paper, snippet in results]
+    })
+
+@app.route('/api/cache/stats')
+@login_required
+def api_cache_stats():
+    return jsonify(response_cache.get_stats())
+
+@app.route('/api/activity_log/stats')
+@login_required
+def api_activity_log_stats():
+    return jsonify(activity_writer.get_stats())
+
+@app.route('/api/activity_log')
+@login_required
+def api_activity_log():
+    # Faculty see their own history; administrators may ask for anyone's
+    faculty_id = current_user.id
+    if current_user.is_admin:
+        faculty_id = request.args.get('faculty_id', type=int)
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'start and end must be ISO 8601 dates'}), 400
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    return jsonify({
+        'activities': query_activity_logs(faculty_id, request.args.get('action') or None, start, end, limit)
+    })
+
+@app.route('/api/activity_log/archive/stats')
+@login_required
+def api_activity_archive_stats():
+    return jsonify(activity_archive.get_stats())
+
+@app.route('/api/rate_limit/stats')
+@login_required
+def api_rate_limit_stats():
+    return jsonify(rate_limiter.get_stats())
+
+@app.route('/api/messages')
+@login_required
+def api_messages():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Only administrators can read contact messages'}), 403
+    view = request.args.get('view', 'unread')
+    if view not in INBOX_VIEWS:
+        return jsonify({'error': f'view must be one of {", ".join(INBOX_VIEWS)}'}), 400
+    limit = parse_page_size(request.args['limit']) if request.args.get('limit') else app.config['INBOX_PAGE_SIZE']
+    try:
+        messages, next_cursor = paginate_by_created(ContactMessage.query.filter(inbox_filter(view)), ContactMessage,
+                                                    request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'messages': [contact_message_to_dict(message) for message in messages],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/mail/stats')
+@login_required
+def api_mail_stats():
+    stats = mail_sender.get_stats()
+    stats['queue'] = dict(db.session.query(OutboundEmail.status, db.func.count()).group_by(OutboundEmail.status).all())
+    return jsonify(stats)
+
+@app.route('/api/announcements/stream/stats')
+@login_required
+def api_announcement_stream_stats():
+    return jsonify(announcement_stream.get_stats())
+
+@app.route('/api/user_cache/stats')
+@login_required
+def api_user_cache_stats():
+    return jsonify(user_cache.get_stats())
+
+@app.route('/metrics')
+def metrics():
+    if not request_profiler.enabled:
+        abort(404)
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not current_user.is_authenticated and not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        return 'Unauthorized', 401
+    body = request_profiler.render_metrics() + rate_limiter.render_metrics(app.config['METRICS_PREFIX'])
+    return app.response_class(body, mimetype='text/plain; version=0.0.4')
+
 # =====================
 # FILE SERVING ROUTES
 # =====================
 
+static_manifest = StaticManifest(app.static_folder)
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and static_manifest.entries:
+        built = static_manifest.lookup(values.get('filename'))
+        if built:
+            values['filename'] = built
+
+def serve_static_file(filename):
+    if not static_manifest.is_fingerprinted(filename):
+        return app.send_static_file(filename)
+
+    # A fingerprinted name never changes content, so browsers can keep it for
+    # a year without revalidating; the precompressed copy is picked per client
+    served_name, encoding = static_manifest.pick_variant(filename, request.accept_encodings)
+    response = send_from_directory(
+        app.static_folder,
+        served_name,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        max_age=app.config['STATIC_ASSET_MAX_AGE']
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+app.view_functions['static'] = serve_static_file
+
 @app.route('/uploads/<path:filename>')
 def serve_uploaded_file(filename):
+    # Files that are missing (e.g. lost from Vercel's ephemeral disk) show
+    # the placeholder image instead
+    placeholder = url_for('static', filename='images/image-placeholder.svg')
     try:
         if '..' in filename or filename.startswith('/'):
             return "Invalid file path", 400
-            
+
+        if not storage.is_local:
+            # The object store serves the file; the redirect is cached for
+            # half the signature's lifetime so the URL is still valid when reused
+            response = redirect(storage.url(filename))
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['STORAGE_URL_EXPIRES'] // 2
+            return response
+
         uploads_dir = app.config['UPLOAD_FOLDER']
-        full_path = os.path.join(uploads_dir, filename)
+        full_path = storage.path(filename)
         
-        # On Vercel, files might not persist, so return a placeholder
         if not os.path.exists(full_path):
-            return redirect('https://images.unsplash.com/photo-1523050854058-8df90110c9f1?ixlib=rb-4.0.3&auto=format&fit=crop&w=500&q=80')
+            return redirect(placeholder)
         
         if not os.path.isfile(full_path):
             return "Not a file", 400
             
         return send_from_directory(uploads_dir, filename)
     except Exception:
-        return redirect('https://images.unsplash.com/photo-1523050854058-8df90110c9f1?ixlib=rb-4.0.3&auto=format&fit=crop&w=500&q=80')
+        return redirect(placeholder)
+
+def offload_pyqp_download(paper, full_path, download_name, mode):
+    # The proxy reads the file and handles Range itself; Flask only answers
+    # the conditional part of the request
+    response = app.response_class(mimetype='application/pdf')
+    if mode == 'x-accel-redirect':
+        relative_path = paper.file_path.replace('\\', '/')
+        response.headers['X-Accel-Redirect'] = app.config['PYQP_ACCEL_REDIRECT_PREFIX'].rstrip('/') + '/' + relative_path
+    else:
+        response.headers['X-Sendfile'] = full_path
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return response
 
 @app.route('/download_pyqp/<int:paper_id>')
 def download_pyqp(paper_id):
     try:
         paper = PYQP.query.get_or_404(paper_id)
-        full_path = os.path.join(app.config['UPLOAD_FOLDER'], paper.file_path)
-        
-        if not os.path.exists(full_path):
+        max_age = app.config['PYQP_DOWNLOAD_MAX_AGE']
+
+        # Revalidation of an already-downloaded paper never touches the disk
+        if paper.content_hash and request.if_none_match.contains(paper.content_hash):
+            response = app.response_class(status=304)
+            response.set_etag(paper.content_hash)
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            return response
+
+        key = get_pyqp_key(paper)
+        download_name = f"{paper.subject}_{paper.year}.pdf"
+        mode = app.config['PYQP_DOWNLOAD_MODE']
+        if not storage.is_local and mode in ('x-sendfile', 'x-accel-redirect'):
+            # A proxy can only offload files on its own disk
+            mode = 'redirect'
+
+        if mode == 'redirect':
+            # Signing the URL needs no request to the object store; a missing
+            # object is reported by the store. Local storage has no URLs and
+            # falls through to sending the file
+            url = storage.url(key, download_name=download_name, content_type='application/pdf')
+            if url:
+                response = redirect(url)
+                count_pyqp_download(paper, response)
+                return response
+            mode = 'direct'
+
+        if not storage.exists(key):
             flash('Requested file not found.', 'error')
             return redirect(url_for('pyqp'))
-        
-        file_dir = os.path.join(app.config['UPLOAD_FOLDER'], os.path.dirname(paper.file_path))
-        filename = os.path.basename(paper.file_path)
-        
-        return send_from_directory(
-            file_dir,
-            filename,
-            as_attachment=True,
-            download_name=f"{paper.subject}_{paper.year}.pdf"
-        )
+
+        full_path = storage.path(key) if storage.is_local else None
+        if not paper.content_hash and full_path:
+            # Papers uploaded before hashes were stored get one on first download
+            with request_profiler.phase('file'):
+                paper.content_hash = compute_file_hash(full_path)
+            db.session.commit()
+
+        if mode in ('x-sendfile', 'x-accel-redirect'):
+            response = offload_pyqp_download(paper, full_path, download_name, mode)
+            response.set_etag(paper.content_hash)
+            response.last_modified = paper.uploaded_at
+            response.make_conditional(request)
+        else:
+            response = send_file(
+                full_path or storage.open(key),
+                mimetype='application/pdf',
+                as_attachment=True,
+                download_name=download_name,
+                conditional=True,
+                etag=paper.content_hash,
+                last_modified=paper.uploaded_at,
+                max_age=max_age
+            )
+            response.headers['Accept-Ranges'] = 'bytes'
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        count_pyqp_download(paper, response)
+        return response
     except Exception:
+        db.session.rollback()
         flash('Error downloading file. Please try again.', 'error')
         return redirect(url_for('pyqp'))
 
@@ -548,7 +3103,38 @@ def download_pyqp(paper_id):
 # DATABASE INITIALIZATION
 # =====================
 
-def init_db():
+def missing_schema():
+    """Tables and columns of the models that the database lacks, as
+    'table' or 'table.column'."""
+    inspector = inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            missing.append(table.name)
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(f'{table.name}.{column.name}' for column in table.columns
+                       if column.name not in existing_columns)
+    return missing
+
+def upgrade_schema():
+    # db.create_all() only creates missing tables, so bring existing ones up
+    # to date with nullable columns and indexes added since they were created
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        db.session.commit()
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def init_db(seed=True):
     with app.app_context():
         try:
             # Create upload directories
@@ -557,77 +3143,86 @@ def init_db():
             
             # Create tables
             db.create_all()
+            upgrade_schema()
+            ensure_search_index()
+            if PYQPCounter.query.first() is None:
+                rebuild_pyqp_counters()
 
-            # Sample faculty accounts
-            if Faculty.query.count() == 0:
-                faculty_accounts = [
-                    {'username': 'admin', 'email': 'admin@globalhighschool.edu.in', 'password': 'admin123', 'name': 'Administrator', 'role': 'System Administrator', 'department': 'Administration', 'is_admin': True},
-                    {'username': 'principal', 'email': 'principal@globalhighschool.edu.in', 'password': 'principal123', 'name': 'Dr. Rajesh Kumar', 'role': 'Principal', 'department': 'Administration'},
-                    {'username': 'maths', 'email': 'maths@globalhighschool.edu.in', 'password': 'maths123', 'name': 'Mrs. Sunita Reddy', 'role': 'Mathematics HOD', 'department': 'Mathematics'}
-                ]
-                for account in faculty_accounts:
-                    faculty = Faculty(
-                        username=account['username'],
-                        email=account['email'],
-                        name=account['name'],
-                        role=account['role'],
-                        department=account.get('department', ''),
-                        is_admin=account.get('is_admin', False)
-                    )
-                    faculty.set_password(account['password'])
-                    db.session.add(faculty)
-                db.session.commit()
-
-            # Sample faculty members
-            if FacultyMember.query.count() == 0:
-                sample_faculty = [
-                    FacultyMember(
-                        name="Mr. Sami Ullah Khan",
-                        role="Principal",
-                        qualification="Ph.D. in Education, M.Ed., B.Sc.",
-                        description="Leading our institution with vision and dedication towards academic excellence.",
-                        image_path="https://scontent.fhyd11-2.fna.fbcdn.net/v/t39.30808-6/519085037_752778251032594_214901603916856522_n.jpg?_nc_cat=104&ccb=1-7&_nc_sid=127cfc&_nc_ohc=XF7uQZu9Ql0Q7kNvwF2z4ba&_nc_oc=AdlYI4eLBodyh_S0TCjiJJY9pQ4Wy2j9InW_mgvcZB71koZL3hTYrvsCP0UlsZ6ceZR3gH4JL0IS_9GbpMUcW9K1&_nc_zt=23&_nc_ht=scontent.fhyd11-2.fna&_nc_gid=cT-7-gsOPP8k8HMNAHHzvQ&oh=00_AfZq4RHr16KYjhnPnOjzaKvY_fMQp2Zj8bzNSUsCVlAQvw&oe=68E16B95",
-                        experience="25+ years",
-                        specialization="Educational Leadership"
-                    ),
-                    FacultyMember(
-                        name="Ms. Afreen Sami Ulah Khan", 
-                        role="Mathematics HOD",
-                        qualification="M.Sc. Mathematics, B.Ed., M.Phil.",
-                        description="Specialized in making complex mathematical concepts easy to understand.",
-                        image_path="https://images.unsplash.com/photo-1577881590026-6d5fd6c15037",
-                        experience="15 years",
-                        specialization="Algebra, Calculus"
-                    )
-                ]
-                db.session.add_all(sample_faculty)
-                db.session.commit()
-
-            # Sample announcements
-            if Announcement.query.count() == 0:
-                announcer = Faculty.query.filter_by(username='admin').first() or Faculty.query.first()
-                if announcer:
-                    default_announcements = [
-                        Announcement(
-                            title='Welcome to the Academic Portal',
-                            message='Students and parents can now check latest updates, notices, and events from this announcements page.',
-                            created_by=announcer.id
-                        ),
-                        Announcement(
-                            title='New PYQP Uploads Available',
-                            message='Faculty have uploaded updated previous year question papers. Visit the PYQP section for details.',
-                            created_by=announcer.id
-                        )
-                    ]
-                    db.session.add_all(default_announcements)
-                    db.session.commit()
-                
+            if seed:
+                seed_db()
             print("Database initialized successfully!")
             
         except Exception as e:
             print(f"Error initializing database: {e}")
             db.session.rollback()
 
+def seed_db():
+    # Sample faculty accounts. The hashes are of the documented passwords
+    # (admin123, principal123, maths123), computed ahead of time so that a
+    # serverless cold start does not spend a second in PBKDF2.
+    if Faculty.query.first() is None:
+        faculty_accounts = [
+            {'username': 'admin', 'email': 'admin@globalhighschool.edu.in', 'password_hash': 'pbkdf2:sha256:600000$KPF6TrxU14YxPehj$dc80642a3abf7ca3fe17f3359743f7e5d4bfce64190bac239053436f6b58b9e7', 'name': 'Administrator', 'role': 'System Administrator', 'department': 'Administration', 'is_admin': True},
+            {'username': 'principal', 'email': 'principal@globalhighschool.edu.in', 'password_hash': 'pbkdf2:sha256:600000$29VfbzDcIEUrLMUK$4e94ce8b2ebe79d6fbbedc4435325d69538130663eab5bf9a12a0478a7615da8', 'name': 'Dr. Rajesh Kumar', 'role': 'Principal', 'department': 'Administration'},
+            {'username': 'maths', 'email': 'maths@globalhighschool.edu.in', 'password_hash': 'pbkdf2:sha256:600000$iomuVJqFKzpqeFPF$8d8ac7839f9aada22e3b7561f69d511e7c74c6935f44a0db2fd12390ead7f5e9', 'name': 'Mrs. Sunita Reddy', 'role': 'Mathematics HOD', 'department': 'Mathematics'}
+        ]
+        for account in faculty_accounts:
+            faculty = Faculty(
+                username=account['username'],
+                email=account['email'],
+                password_hash=account['password_hash'],
+                name=account['name'],
+                role=account['role'],
+                department=account.get('department', ''),
+                is_admin=account.get('is_admin', False)
+            )
+            db.session.add(faculty)
+        db.session.commit()
+
+    # Sample faculty members
+    if FacultyMember.query.first() is None:
+        sample_faculty = [
+            FacultyMember(
+                name="Mr. Sami Ullah Khan",
+                role="Principal",
+                qualification="Ph.D. in Education, M.Ed., B.Sc.",
+                description="Leading our institution with vision and dedication towards academic excellence.",
+                image_path="https://scontent.fhyd11-2.fna.fbcdn.net/v/t39.30808-6/519085037_752778251032594_214901603916856522_n.jpg?_nc_cat=104&ccb=1-7&_nc_sid=127cfc&_nc_ohc=XF7uQZu9Ql0Q7kNvwF2z4ba&_nc_oc=AdlYI4eLBodyh_S0TCjiJJY9pQ4Wy2j9InW_mgvcZB71koZL3hTYrvsCP0UlsZ6ceZR3gH4JL0IS_9GbpMUcW9K1&_nc_zt=23&_nc_ht=scontent.fhyd11-2.fna&_nc_gid=cT-7-gsOPP8k8HMNAHHzvQ&oh=00_AfZq4RHr16KYjhnPnOjzaKvY_fMQp2Zj8bzNSUsCVlAQvw&oe=68E16B95",
+                experience="25+ years",
+                specialization="Educational Leadership"
+            ),
+            FacultyMember(
+                name="Ms. Afreen Sami Ulah Khan", 
+                role="Mathematics HOD",
+                qualification="M.Sc. Mathematics, B.Ed., M.Phil.",
+                description="Specialized in making complex mathematical concepts easy to understand.",
+                image_path="https://images.unsplash.com/photo-1577881590026-6d5fd6c15037",
+                experience="15 years",
+                specialization="Algebra, Calculus"
+            )
+        ]
+        db.session.add_all(sample_faculty)
+        db.session.commit()
+
+    # Sample announcements
+    if Announcement.query.first() is None:
+        announcer = Faculty.query.filter_by(username='admin').first() or Faculty.query.first()
+        if announcer:
+            default_announcements = [
+                Announcement(
+                    title='Welcome to the Academic Portal',
+                    message='Students and parents can now check latest updates, notices, and events from this announcements page.',
+                    created_by=announcer.id
+                ),
+                Announcement(
+                    title='New PYQP Uploads Available',
+                    message='Faculty have uploaded updated previous year question papers. Visit the PYQP section for details.',
+                    created_by=announcer.id
+                )
+            ]
+            db.session.add_all(default_announcements)
+            db.session.commit()
+
 # =====================
 # ERROR HANDLERS
 # =====================
@@ -636,11 +3231,146 @@ def init_db():
 def not_found_error(error):
     return render_template('404.html'), 404
 
+@app.errorhandler(429)
+def too_many_requests_error(error):
+    response = app.make_response((render_template('429.html', message=error.description), 429))
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
+# =====================
+# CLI COMMANDS
+# =====================
+
+@app.cli.command('init-db')
+@click.option('--no-seed', is_flag=True, help='Only create and upgrade the schema, without sample data.')
+def init_db_command(no_seed):
+    """Create or upgrade the database schema and add the sample data."""
+    init_db(seed=not no_seed)
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the PYQP full-text search index from existing papers."""
+    indexed = rebuild_search_index()
+    print(f"Indexed {indexed} papers.")
+
+@app.cli.command('process-pdf-jobs')
+@click.option('--processes', type=int, default=None, help='Worker processes (default PDF_WORKER_PROCESSES).')
+@click.option('--until-idle', is_flag=True, help='Exit once the queue is empty instead of waiting for new jobs.')
+@click.option('--backfill', is_flag=True, help='First queue papers that were never processed.')
+def process_pdf_jobs_command(processes, until_idle, backfill):
+    """Extract page counts, thumbnails and text for queued papers."""
+    if backfill:
+        print(f"Queued {enqueue_unprocessed_pyqps()} papers.")
+    if processes:
+        pdf_worker.processes = processes
+    finished = pdf_worker.run(until_idle=until_idle)
+    print(f"Finished {finished} PDF jobs.")
+
+@app.cli.command('process-photos')
+@click.option('--processes', type=int, default=None, help='Worker processes (default PHOTO_WORKER_PROCESSES).')
+@click.option('--until-idle', is_flag=True, help='Exit once the queue is empty instead of waiting for new jobs.')
+@click.option('--backfill', is_flag=True, help='First queue photos that have no variants yet.')
+def process_photos_command(processes, until_idle, backfill):
+    """Render responsive variants of queued faculty photos."""
+    if backfill:
+        print(f"Queued {enqueue_missing_photo_jobs()} photos.")
+    if processes:
+        photo_worker.processes = processes
+    finished = photo_worker.run(until_idle=until_idle)
+    print(f"Finished {finished} photo jobs.")
+
+@app.cli.command('send-mail')
+@click.option('--until-idle', is_flag=True, help='Exit once the queue is empty instead of waiting for new mail.')
+def send_mail_command(until_idle):
+    """Send queued replies to contact messages."""
+    sent = mail_sender.run(until_idle=until_idle)
+    print(f"Sent {sent} messages.")
+
+@app.cli.command('import-pyqp')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--manifest', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='CSV or JSON manifest (default: manifest.csv/.json inside SOURCE).')
+@click.option('--uploaded-by', required=True, help='Username or email of the faculty account to credit.')
+def import_pyqp_command(source, manifest, uploaded_by):
+    """Import question papers from a ZIP archive or a directory."""
+    faculty = Faculty.query.filter(or_(Faculty.username == uploaded_by, Faculty.email == uploaded_by)).first()
+    if faculty is None:
+        raise click.ClickException(f'No faculty account {uploaded_by!r}.')
+    try:
+        source = open_source(source)
+        try:
+            if manifest:
+                with open(manifest, 'rb') as handle:
+                    rows = load_manifest(source, handle.read(), manifest)
+            else:
+                rows = load_manifest(source)
+            summary = import_pyqps(source, rows, faculty.id)
+        finally:
+            source.close()
+    except ManifestError as e:
+        raise click.ClickException(str(e))
+    for result in summary['results']:
+        if result['status'] in ('failed', 'skipped'):
+            print(f"{result['status']}: {result['file']}: {result['error']}")
+    print(f"Imported {summary['imported']} papers, {summary['duplicates']} duplicates, "
+          f"{summary['failed']} failed, {summary['skipped']} skipped.")
+
+@app.cli.command('rebuild-pyqp-counters')
+def rebuild_pyqp_counters_command():
+    """Recount papers per uploader and per subject/year."""
+    total = rebuild_pyqp_counters()
+    print(f"Counted {total} active papers.")
+
+@app.cli.command('archive-activity-log')
+@click.option('--days', type=int, default=None, help='Retention window (default ACTIVITY_LOG_RETENTION_DAYS).')
+def archive_activity_log_command(days):
+    """Move old activity log rows into compressed monthly archives."""
+    archived, segments = archive_activity_logs(days)
+    print(f"Archived {archived} activity log rows into {len(segments)} files.")
+
+@app.cli.command('intern-activity-user-agents')
+@click.option('--vacuum', is_flag=True, help='Compact the SQLite database afterwards to return the space.')
+def intern_activity_user_agents_command(vacuum):
+    """Replace inline user agents on older activity rows with references."""
+    converted = intern_activity_user_agents()
+    print(f"Converted {converted} activity log rows.")
+    if vacuum and db.engine.dialect.name == 'sqlite':
+        with db.engine.connect() as connection:
+            connection.execute(text('VACUUM'))
+        print("Database compacted.")
+
+@app.cli.command('build-static')
+def build_static_command():
+    """Minify, fingerprint and precompress everything under static/."""
+    manifest = build_static_assets(app.static_folder, exclude=[app.config['UPLOAD_FOLDER']])
+    static_manifest.load()
+    print(f"Built {len(manifest)} static assets into {os.path.join(app.static_folder, 'dist')}.")
+
+@app.cli.command('dedupe-pyqp-files')
+def dedupe_pyqp_files_command():
+    """Move existing PYQP files into content-addressed storage."""
+    if not storage.is_local:
+        raise click.ClickException('Run dedupe-pyqp-files with STORAGE_BACKEND=local, before push-uploads.')
+    migrated, duplicates, reclaimed = dedupe_pyqp_files()
+    print(f"Migrated {migrated} papers, {duplicates} duplicates merged, "
+          f"{reclaimed / 1024 / 1024:.2f} MB reclaimed.")
+
+@app.cli.command('push-uploads')
+@click.option('--source', type=click.Path(exists=True, file_okay=False), default=None,
+              help='Directory to copy from (default UPLOAD_FOLDER).')
+def push_uploads_command(source):
+    """Copy local uploads into the configured storage backend."""
+    if storage.is_local:
+        raise click.ClickException('STORAGE_BACKEND is local; there is nothing to push to.')
+    copied, skipped = push_uploads(source or app.config['UPLOAD_FOLDER'])
+    print(f"Copied {copied} files, {skipped} skipped.")
+
 # =====================
 # APPLICATION STARTUP
 # =====================
@@ -654,6 +3384,3 @@ if __name__ == '__main__':
     
     # Run the app
     app.run(host='0.0.0.0', port=port, debug=False)
-else:
-    # For Vercel deployment
-    init_db()
\ No newline at end of file
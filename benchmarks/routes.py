@@ -0,0 +1,428 @@
+"""Latency and throughput benchmark for every route in app.py.
+
+Seeds a fresh database with the requested volumes, then drives each route
+either in-process through the Flask test client (``--mode client``) or over
+HTTP against a local multi-process server (``--mode server``). Prints
+p50/p95/p99 latency, throughput and error counts per route plus peak RSS,
+and saves everything as JSON so two runs can be compared:
+
+    python benchmarks/routes.py --papers 100000 --activity 1000000
+    python benchmarks/routes.py --mode server --workers 4 --concurrency 16
+    python benchmarks/routes.py --compare benchmarks/results/routes-20260101-120000.json
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import platform
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import seed  # noqa: E402
+
+# (name, method, path, needs_login). Paths may reference {paper_id} and {etag}.
+ROUTES = [
+    ('index', 'GET', '/', False),
+    ('about', 'GET', '/about', False),
+    ('faculty', 'GET', '/faculty', False),
+    ('pyqp', 'GET', '/pyqp', False),
+    ('pyqp_subject', 'GET', '/pyqp?subject=Mathematics', False),
+    ('pyqp_keyword', 'GET', '/pyqp?q=benchmark', False),
+    ('api_pyqp', 'GET', '/api/pyqp', False),
+    ('api_pyqp_search', 'GET', '/api/pyqp/search?q=mathematics', False),
+    ('announcements', 'GET', '/announcements', False),
+    ('contact', 'GET', '/contact', False),
+    ('contact_post', 'POST', '/contact', False),
+    ('login_page', 'GET', '/faculty/login', False),
+    ('login_post', 'POST', '/faculty/login', False),
+    ('download', 'GET', '/download_pyqp/{paper_id}', False),
+    ('download_revalidate', 'GET', '/download_pyqp/{paper_id}', False),
+    ('dashboard', 'GET', '/faculty/dashboard', True),
+    ('upload_page', 'GET', '/faculty/upload_pyqp', True),
+    ('upload_post', 'POST', '/faculty/upload_pyqp', True),
+    ('profile', 'GET', '/faculty/profile', True),
+    ('faculty_announcements', 'GET', '/faculty/announcements', True),
+]
+
+CONTACT_FORM = {'name': 'Benchmark Parent', 'email': 'parent@example.com', 'phone': '9000000000',
+                'subject': 'Benchmark', 'message': 'Load test message'}
+LOGIN_FORM = {'username': seed.BENCH_USERNAME, 'password': seed.BENCH_PASSWORD}
+UPLOAD_FORM = {'subject': 'Mathematics', 'year': '2024', 'description': 'Benchmark upload'}
+UPLOAD_PDF = seed.make_pdf('Benchmark upload')
+# A logged-in session short-circuits the login view, so every request starts anonymous
+FRESH_SESSION_ROUTES = {'login_post'}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 3)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+
+
+def request_headers(name, context):
+    if name == 'download_revalidate':
+        return {'If-None-Match': context['etag']}
+    return {}
+
+
+# ---------------------------------------------------------------------------
+# In-process mode
+# ---------------------------------------------------------------------------
+
+def run_client_mode(school, routes, context, args):
+    # https base URL so the Secure session cookie round-trips in the test client
+    authenticated = school.app.test_client()
+    authenticated.post('/faculty/login', data=LOGIN_FORM, base_url='https://localhost')
+
+    results = {}
+    for name, method, path, needs_login in routes:
+        client = authenticated if needs_login else school.app.test_client()
+        url = path.format(**context)
+        headers = request_headers(name, context)
+        latencies = []
+        errors = 0
+
+        for _ in range(args.warmup):
+            issue_client_request(client, name, method, url, headers)
+
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            if name in FRESH_SESSION_ROUTES:
+                client = school.app.test_client()
+            request_started = time.perf_counter()
+            status = issue_client_request(client, name, method, url, headers)
+            if status >= 500:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - request_started)
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+        print_progress(name, results[name])
+    return results
+
+
+def issue_client_request(client, name, method, url, headers):
+    kwargs = {'headers': headers, 'base_url': 'https://localhost'}
+    if name == 'contact_post':
+        kwargs['data'] = CONTACT_FORM
+    elif name == 'login_post':
+        kwargs['data'] = LOGIN_FORM
+    elif name == 'upload_post':
+        kwargs['data'] = dict(UPLOAD_FORM, pdf=(io.BytesIO(UPLOAD_PDF), 'benchmark.pdf'))
+        kwargs['content_type'] = 'multipart/form-data'
+    response = client.open(url, method=method, **kwargs)
+    response.close()
+    return response.status_code
+
+
+# ---------------------------------------------------------------------------
+# Server mode
+# ---------------------------------------------------------------------------
+
+def encode_multipart(fields, file_field, filename, payload):
+    boundary = uuid.uuid4().hex
+    lines = []
+    for key, value in fields.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+    lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                 f'filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'.encode() + payload + b'\r\n')
+    lines.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(lines), f'multipart/form-data; boundary={boundary}'
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def make_opener(base_url, login):
+    opener = urllib.request.build_opener(
+        NoRedirect(), urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+    )
+    if login:
+        issue_http_request(opener, base_url, 'login_post', 'POST', '/faculty/login', {})
+    return opener
+
+
+def issue_http_request(opener, base_url, name, method, url, headers):
+    body = None
+    headers = dict(headers)
+    if name in ('contact_post', 'login_post'):
+        body = urllib.parse.urlencode(CONTACT_FORM if name == 'contact_post' else LOGIN_FORM).encode()
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    elif name == 'upload_post':
+        body, headers['Content-Type'] = encode_multipart(UPLOAD_FORM, 'pdf', 'benchmark.pdf', UPLOAD_PDF)
+    request = urllib.request.Request(base_url + url, data=body, headers=headers, method=method)
+    try:
+        with opener.open(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not start on port {port}')
+
+
+def process_tree_peak_rss_kb(pid):
+    """Sum of VmHWM over a process and its children (Linux only)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as handle:
+                for line in handle:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as handle:
+                    pending.extend(int(child) for child in handle.read().split())
+        except OSError:
+            continue
+    return total or None
+
+
+def run_server_mode(routes, context, args, env):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', str(port), '--workers', str(args.workers)],
+        env=env, cwd=env['BENCH_WORKDIR'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    results = {}
+    peak_rss = None
+    try:
+        wait_for_port(port)
+        for name, method, path, needs_login in routes:
+            url = path.format(**context)
+            headers = request_headers(name, context)
+            latencies = []
+            errors = [0]
+            lock = threading.Lock()
+            per_worker = max(1, args.requests // args.concurrency)
+
+            def worker(opener):
+                for _ in range(args.warmup // args.concurrency):
+                    issue_http_request(opener, base_url, name, method, url, headers)
+                for _ in range(per_worker):
+                    if name in FRESH_SESSION_ROUTES:
+                        opener = make_opener(base_url, False)
+                    request_started = time.perf_counter()
+                    try:
+                        status = issue_http_request(opener, base_url, name, method, url, headers)
+                    except OSError:
+                        status = 599
+                    elapsed = time.perf_counter() - request_started
+                    with lock:
+                        if status >= 500:
+                            errors[0] += 1
+                        else:
+                            latencies.append(elapsed)
+
+            # Log in before the clock starts so only the route itself is timed
+            threads = [threading.Thread(target=worker, args=(make_opener(base_url, needs_login),))
+                       for _ in range(args.concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = summarize(latencies, errors[0], time.perf_counter() - started)
+            print_progress(name, results[name])
+        peak_rss = process_tree_peak_rss_kb(server.pid)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+    return results, peak_rss
+
+
+def serve(port, workers):
+    """Pre-forked pool of threaded werkzeug servers sharing one socket, the
+    same shape as a gunicorn deployment with threaded workers."""
+    sys.path.insert(0, REPO_ROOT)
+    from werkzeug.serving import make_server
+    import app as school
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', port))
+    listener.listen(128)
+    for _ in range(workers - 1):
+        if os.fork() == 0:
+            break
+    make_server('127.0.0.1', port, school.app, threaded=True, fd=listener.fileno()).serve_forever()
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def print_progress(name, result):
+    print(f'{name:<24} {result["p50_ms"]!s:>9} {result["p95_ms"]!s:>9} {result["p99_ms"]!s:>9} '
+          f'{result["throughput_rps"]!s:>9} {result["errors"]:>6}', flush=True)
+
+
+def print_comparison(current, baseline_path):
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    print(f'\nChange against {baseline_path} (negative is faster)')
+    print(f'{"route":<24} {"p50":>9} {"p95":>9} {"p99":>9} {"rps":>9}')
+
+    def change(new, old):
+        if new is None or not old:
+            return '-'
+        return f'{(new - old) / old * 100:+.1f}%'
+
+    for name, result in current['routes'].items():
+        old = baseline['routes'].get(name)
+        if not old:
+            continue
+        print(f'{name:<24} {change(result["p50_ms"], old["p50_ms"]):>9} '
+              f'{change(result["p95_ms"], old["p95_ms"]):>9} {change(result["p99_ms"], old["p99_ms"]):>9} '
+              f'{change(result["throughput_rps"], old["throughput_rps"]):>9}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', choices=['client', 'server'], default='client')
+    parser.add_argument('--faculty', type=int, default=100)
+    parser.add_argument('--papers', type=int, default=1000)
+    parser.add_argument('--announcements', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--activity', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per route')
+    parser.add_argument('--workers', type=int, default=4, help='Server processes (server mode)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads (server mode)')
+    parser.add_argument('--routes', nargs='+', help='Only run these route names')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the rendered-page cache')
+    parser.add_argument('--output', help='Result file (default benchmarks/results/routes-<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.workers)
+        return
+
+    routes = [route for route in ROUTES if not args.routes or route[0] in args.routes]
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ,
+                   BENCH_WORKDIR=workdir,
+                   DATABASE_URL=f'sqlite:///{os.path.join(workdir, "bench.db")}',
+                   UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+                   SESSION_COOKIE_SECURE='0' if args.mode == 'server' else '1',
+                   RESPONSE_CACHE_DIR=os.path.join(workdir, 'page_cache'),
+                   # Uploaded papers stay queued, so no PDF work outlives the run's workdir
+                   PDF_JOBS_MODE='worker',
+                   # Every login and contact POST comes from one address
+                   RATE_LIMIT_BACKEND='null')
+        if args.no_cache:
+            env['RESPONSE_CACHE_BACKEND'] = 'null'
+        os.environ.update(env)
+        sys.path.insert(0, REPO_ROOT)
+        import app as school
+
+        school.init_db()
+        seed_started = time.perf_counter()
+        counts = seed.seed_database(school, faculty=args.faculty, papers=args.papers,
+                                    announcements=args.announcements, messages=args.messages,
+                                    activity=args.activity)
+        seed_seconds = round(time.perf_counter() - seed_started, 2)
+        with school.app.app_context():
+            paper = school.PYQP.query.order_by(school.PYQP.id).first()
+            context = {'paper_id': paper.id, 'etag': f'"{paper.content_hash}"'}
+        print(f'Seeded {counts} in {seed_seconds}s')
+        print(f'{"route":<24} {"p50_ms":>9} {"p95_ms":>9} {"p99_ms":>9} {"rps":>9} {"errors":>6}')
+
+        if args.mode == 'client':
+            results = run_client_mode(school, routes, context, args)
+            school.activity_writer.flush()
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        else:
+            with school.app.app_context():
+                school.db.engine.dispose()
+            results, peak_rss = run_server_mode(routes, context, args, env)
+
+    report = {
+        'benchmark': 'routes',
+        'timestamp': datetime.utcnow().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'mode': args.mode,
+        'config': {key: value for key, value in vars(args).items() if key not in ('serve', 'compare', 'output')},
+        'seeded': counts,
+        'seed_seconds': seed_seconds,
+        'peak_rss_kb': peak_rss,
+        'routes': results,
+    }
+    print(f'Peak RSS: {peak_rss} KB')
+
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', f'routes-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        print_comparison(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
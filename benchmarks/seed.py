@@ -0,0 +1,148 @@
+"""Bulk seeding of a benchmark database.
+
+Rows are inserted with executemany in large batches, and every seeded
+faculty account shares one password hash so seeding 10^5 accounts does not
+spend minutes in PBKDF2.
+"""
+import hashlib
+import itertools
+import os
+import random
+from datetime import datetime, timedelta
+
+SUBJECTS = ['Mathematics', 'Science', 'Social Studies', 'English', 'Telugu', 'Hindi',
+            'Physics', 'Chemistry', 'Biology']
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'Mozilla/5.0 (Linux; Android 13; SM-A515F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+]
+ACTIONS = ['login', 'logout', 'upload_pyqp', 'update_profile', 'create_announcement']
+BENCH_USERNAME = 'benchadmin'
+BENCH_PASSWORD = 'benchmark'
+BATCH_SIZE = 10000
+DISTINCT_PDFS = 20
+
+
+def make_pdf(text):
+    """A minimal one-page PDF with ``text`` on it that pypdf can parse."""
+    stream = f'BT /F1 24 Tf 72 720 Td ({text}) Tj ET'.encode('latin-1')
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    output = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+    return output
+
+
+def insert_rows(school, model, rows):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+        school.db.session.execute(model.__table__.insert(), batch)
+    school.db.session.commit()
+
+
+def write_blobs(school, count):
+    """Store ``count`` distinct PDFs content-addressed and return their
+    (file_path, content_hash, size) tuples."""
+    blobs = []
+    for number in range(count):
+        payload = make_pdf(f'Benchmark question paper {number}')
+        content_hash = hashlib.sha256(payload).hexdigest()
+        file_path = school.get_blob_path(content_hash)
+        full_path = os.path.join(school.app.config['UPLOAD_FOLDER'], *file_path.split('/'))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as handle:
+            handle.write(payload)
+        blobs.append((file_path, content_hash, len(payload)))
+    return blobs
+
+
+def seed_database(school, faculty=100, papers=1000, announcements=100, messages=1000, activity=10000, seed=42):
+    """Fill the configured database with synthetic rows and return the counts."""
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    def past(max_days=3650):
+        return now - timedelta(seconds=rng.randint(0, max_days * 86400))
+
+    with school.app.app_context():
+        password_hash = generate_password_hash(BENCH_PASSWORD)
+        existing = school.Faculty.query.filter_by(username=BENCH_USERNAME).first()
+        if existing is None:
+            insert_rows(school, school.Faculty, [{
+                'username': BENCH_USERNAME, 'email': 'bench@example.com', 'password_hash': password_hash,
+                'name': 'Benchmark Admin', 'role': 'Administrator', 'department': 'Administration',
+                'is_active': True, 'is_admin': True, 'created_at': now, 'updated_at': now
+            }])
+
+        insert_rows(school, school.Faculty, ({
+            'username': f'bench{number}', 'email': f'bench{number}@example.com', 'password_hash': password_hash,
+            'name': f'Teacher {number}', 'role': 'Faculty', 'department': rng.choice(SUBJECTS),
+            'is_active': True, 'is_admin': False, 'created_at': past(), 'updated_at': now
+        } for number in range(faculty)))
+        faculty_ids = [row[0] for row in school.db.session.query(school.Faculty.id)]
+
+        insert_rows(school, school.FacultyMember, ({
+            'name': f'Teacher {number}', 'role': f'{rng.choice(SUBJECTS)} Teacher',
+            'qualification': 'M.Sc., B.Ed.', 'description': 'Dedicated to student success.',
+            'image_path': f'uploads/photos/teacher_{number}.jpg', 'experience': f'{rng.randint(1, 30)} years',
+            'specialization': rng.choice(SUBJECTS), 'created_at': past(), 'updated_at': now
+        } for number in range(min(faculty, 500))))
+
+        blobs = write_blobs(school, min(DISTINCT_PDFS, max(papers, 1)))
+        insert_rows(school, school.PYQP, ({
+            'subject': SUBJECTS[number % len(SUBJECTS)], 'year': 2000 + number % 25,
+            'filename': f'paper_{number}.pdf', 'file_path': blobs[number % len(blobs)][0],
+            'content_hash': blobs[number % len(blobs)][1], 'file_size': blobs[number % len(blobs)][2],
+            'description': f'Benchmark paper {number} covering {rng.choice(SUBJECTS).lower()}',
+            'uploaded_by': rng.choice(faculty_ids), 'uploaded_at': past(), 'is_active': True
+        } for number in range(papers)))
+        school.rebuild_pyqp_counters()
+        if school.search_index_enabled:
+            school.db.session.execute(school.text(
+                'INSERT INTO pyqp_search (rowid, subject, description, filename, content) '
+                'SELECT id, subject, description, filename, \'\' FROM pyqp '
+                'WHERE id NOT IN (SELECT rowid FROM pyqp_search)'
+            ))
+            school.db.session.commit()
+
+        insert_rows(school, school.Announcement, ({
+            'title': f'Announcement {number}', 'message': 'Exam schedule and school updates. ' * 5,
+            'created_by': rng.choice(faculty_ids), 'created_at': past(365), 'is_active': True
+        } for number in range(announcements)))
+
+        insert_rows(school, school.ContactMessage, ({
+            'name': f'Parent {number}', 'email': f'parent{number}@example.com', 'phone': '9000000000',
+            'subject': 'Admission enquiry', 'message': 'Please share the admission details. ' * 3,
+            'created_at': past(365), 'is_read': rng.random() < 0.5
+        } for number in range(messages)))
+
+        agent_ids = list(school.intern_user_agents(USER_AGENTS).values())
+        insert_rows(school, school.ActivityLog, ({
+            'faculty_id': rng.choice(faculty_ids), 'action': rng.choice(ACTIONS), 'details': 'Benchmark activity',
+            'ip_address': f'10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+            'user_agent_id': rng.choice(agent_ids), 'created_at': past(365)
+        } for _ in range(activity)))
+
+    return {'faculty': faculty, 'papers': papers, 'announcements': announcements,
+            'messages': messages, 'activity': activity}
@@ -0,0 +1,179 @@
+"""Catalogue read throughput while other requests are writing.
+
+Runs the same workload once per SQLite engine profile, each in a fresh
+database (the profile is read at import time): reader processes page
+through the PYQP catalogue while writer processes commit contact messages,
+mirroring /pyqp traffic during contact form and activity log writes.
+
+    python benchmarks/sqlite_profile.py --papers 20000 --seconds 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUBJECTS = ['Mathematics', 'Science', 'Social Studies', 'English', 'Telugu', 'Hindi',
+            'Physics', 'Chemistry', 'Biology']
+
+
+def seed_papers(school, count):
+    with school.app.app_context():
+        uploader = school.Faculty.query.first()
+        rows = [{
+            'subject': SUBJECTS[i % len(SUBJECTS)],
+            'year': 2000 + i % 25,
+            'filename': f'paper_{i}.pdf',
+            'file_path': f'pyqp/paper_{i}.pdf',
+            'description': f'Benchmark paper {i}',
+            'uploaded_by': uploader.id,
+            'uploaded_at': datetime.utcnow(),
+            'is_active': True,
+            'file_size': 1024
+        } for i in range(count)]
+        for start in range(0, len(rows), 5000):
+            school.db.session.execute(school.PYQP.__table__.insert(), rows[start:start + 5000])
+        school.db.session.commit()
+        school.rebuild_pyqp_counters()
+
+
+def reader(school, worker, deadline, results):
+    with school.app.app_context():
+        school.db.engine.dispose(close=False)
+        subject = SUBJECTS[worker % len(SUBJECTS)]
+        reads = errors = 0
+        latencies = []
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                school.paginate_pyqp(subject=subject if worker % 2 else None)
+                school.db.session.rollback()
+                latencies.append(time.perf_counter() - started)
+                reads += 1
+            except Exception:
+                school.db.session.rollback()
+                errors += 1
+    results.put({'reads': reads, 'read_errors': errors, 'latencies': latencies})
+
+
+def writer(school, worker, deadline, write_interval, results):
+    with school.app.app_context():
+        school.db.engine.dispose(close=False)
+        writes = errors = 0
+        while time.time() < deadline:
+            try:
+                school.db.session.add(school.ContactMessage(
+                    name=f'Writer {worker}', email='bench@example.com',
+                    subject='Benchmark', message='x' * 200
+                ))
+                school.db.session.commit()
+                writes += 1
+            except Exception:
+                school.db.session.rollback()
+                errors += 1
+            if write_interval:
+                time.sleep(write_interval)
+    results.put({'writes': writes, 'write_errors': errors})
+
+
+def run_child(args):
+    sys.path.insert(0, REPO_ROOT)
+    import app as school
+
+    school.init_db()
+    seed_papers(school, args.papers)
+    with school.app.app_context():
+        school.db.engine.dispose()
+
+    # One process per reader and writer so the comparison measures SQLite
+    # locking rather than the GIL
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.time() + args.seconds
+    processes = [context.Process(target=reader, args=(school, i, deadline, results))
+                 for i in range(args.readers)]
+    processes += [context.Process(target=writer, args=(school, i, deadline, args.write_interval, results))
+                  for i in range(args.writers)]
+    for process in processes:
+        process.start()
+
+    totals = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    latencies = []
+    for _ in processes:
+        result = results.get()
+        latencies.extend(result.pop('latencies', []))
+        for name, value in result.items():
+            totals[name] += value
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+    print(json.dumps({
+        'profile': os.environ['SQLITE_PROFILE'],
+        'reads_per_second': round(totals['reads'] / args.seconds, 1),
+        'writes_per_second': round(totals['writes'] / args.seconds, 1),
+        'read_errors': totals['read_errors'],
+        'write_errors': totals['write_errors'],
+        'read_p50_ms': percentile(0.50),
+        'read_p99_ms': percentile(0.99)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--papers', type=int, default=20000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--write-interval', type=float, default=0.02,
+                        help='Pause between commits of each writer, so both profiles see the same write load '
+                             '(0 writes as fast as possible)')
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'])
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for profile in args.profiles:
+            env = dict(os.environ,
+                       DATABASE_URL=f'sqlite:///{os.path.join(workdir, profile + ".db")}',
+                       SQLITE_PROFILE=profile,
+                       RESPONSE_CACHE_BACKEND='null',
+                       ACTIVITY_LOG_ASYNC='0')
+            command = [sys.executable, os.path.abspath(__file__), '--child',
+                       '--papers', str(args.papers), '--seconds', str(args.seconds),
+                       '--readers', str(args.readers), '--writers', str(args.writers),
+                       '--write-interval', str(args.write_interval)]
+            output = subprocess.run(command, env=env, cwd=workdir, check=True,
+                                    capture_output=True, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    columns = ['profile', 'reads_per_second', 'writes_per_second', 'read_p50_ms', 'read_p99_ms',
+               'read_errors', 'write_errors']
+    print('  '.join(f'{name:>18}' for name in columns))
+    for result in results:
+        print('  '.join(f'{str(result[name]):>18}' for name in columns))
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump({'benchmark': 'sqlite_profile', 'args': vars(args), 'results': results}, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
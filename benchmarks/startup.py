@@ -0,0 +1,144 @@
+"""Cold start benchmark: time from importing app.py to its first response.
+
+Every run is a fresh Python process, as on a serverless cold start. The
+``cold`` scenario starts from an empty database with ``AUTO_INIT_DB=1`` (the
+Vercel setup, where the schema and sample data are created before the first
+request); ``warm`` starts against a database prepared by ``flask init-db``.
+Reports import time, import-to-first-response time and whole-process time,
+and saves them as JSON so two runs can be compared:
+
+    python benchmarks/startup.py --runs 20
+    python benchmarks/startup.py --compare benchmarks/results/startup-20260101-120000.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from routes import git_revision, percentile  # noqa: E402
+
+SCENARIOS = ['cold', 'warm']
+METRICS = ['import_ms', 'first_response_ms', 'process_ms']
+
+
+def child(path):
+    started = time.perf_counter()
+    sys.path.insert(0, REPO_ROOT)
+    import app as school
+    imported = time.perf_counter()
+    response = school.app.test_client().get(path)
+    responded = time.perf_counter()
+    print(json.dumps({
+        'status': response.status_code,
+        'import_ms': round((imported - started) * 1000, 3),
+        'first_response_ms': round((responded - started) * 1000, 3),
+    }))
+
+
+def run_once(path, env):
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', path],
+                               env=env, capture_output=True, text=True, cwd=REPO_ROOT)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr)
+    # init_db prints progress, so the measurement is the last line
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process_ms'] = round(elapsed * 1000, 3)
+    return result
+
+
+def scenario_env(workdir, scenario, run):
+    database = os.path.join(workdir, f'{scenario}-{run}.db' if scenario == 'cold' else 'warm.db')
+    return dict(os.environ,
+                DATABASE_URL=f'sqlite:///{database}',
+                UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+                RESPONSE_CACHE_DIR=os.path.join(workdir, 'page_cache'),
+                AUTO_INIT_DB='1' if scenario == 'cold' else '0')
+
+
+def summarize(samples):
+    summary = {'runs': len(samples), 'statuses': sorted({sample['status'] for sample in samples})}
+    for metric in METRICS:
+        values = sorted(sample[metric] / 1000 for sample in samples)
+        summary[metric] = {'p50': percentile(values, 0.50), 'p95': percentile(values, 0.95),
+                           'min': round(values[0] * 1000, 3)}
+    return summary
+
+
+def print_comparison(current, baseline_path):
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    print(f'\nChange against {baseline_path} (negative is faster)')
+    print(f'{"scenario":<10} ' + ' '.join(f'{metric:>18}' for metric in METRICS))
+    for scenario, result in current['scenarios'].items():
+        old = baseline['scenarios'].get(scenario)
+        if not old:
+            continue
+        changes = []
+        for metric in METRICS:
+            new_value, old_value = result[metric]['p50'], old.get(metric, {}).get('p50')
+            changes.append(f'{(new_value - old_value) / old_value * 100:+.1f}%' if old_value else '-')
+        print(f'{scenario:<10} ' + ' '.join(f'{change:>18}' for change in changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10, help='Processes started per scenario')
+    parser.add_argument('--path', default='/', help='Route requested by the first request')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--output', help='Result file (default benchmarks/results/startup-<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    results = {}
+    print(f'{"scenario":<10} {"import p50":>12} {"first resp p50":>15} {"process p50":>12} {"first resp p95":>15}')
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'warm' in args.scenarios:
+            subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'],
+                           env=scenario_env(workdir, 'warm', 0), cwd=REPO_ROOT,
+                           check=True, capture_output=True)
+        for scenario in args.scenarios:
+            # One unmeasured run so the first sample does not pay for .pyc compilation
+            run_once(args.path, scenario_env(workdir, scenario, 'warmup'))
+            samples = [run_once(args.path, scenario_env(workdir, scenario, run)) for run in range(args.runs)]
+            results[scenario] = summary = summarize(samples)
+            print(f'{scenario:<10} {summary["import_ms"]["p50"]!s:>12} {summary["first_response_ms"]["p50"]!s:>15} '
+                  f'{summary["process_ms"]["p50"]!s:>12} {summary["first_response_ms"]["p95"]!s:>15}', flush=True)
+
+    report = {
+        'benchmark': 'startup',
+        'timestamp': datetime.utcnow().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {'runs': args.runs, 'path': args.path},
+        'scenarios': results,
+    }
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', f'startup-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        print_comparison(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
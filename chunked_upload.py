@@ -0,0 +1,231 @@
+"""Resumable chunked uploads.
+
+Each upload session is a ``<upload_id>.part`` file that chunks are appended
+to, plus a ``<upload_id>.json`` sidecar with its owner and declared size. The
+part file's length is the authoritative offset, so a client that lost a
+connection asks for the offset and continues from there. The running sha256
+is kept in memory while chunks arrive in order on the same worker and
+recomputed from the part file otherwise. One request at a time writes to a
+session: a second one arriving meanwhile is refused with ``UploadBusy``
+rather than writing at the same offset.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only requests within this process are kept apart
+    fcntl = None
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class OffsetMismatch(UploadError):
+    status_code = 409
+
+    def __init__(self, expected_offset):
+        super().__init__(f'Expected chunk at offset {expected_offset}')
+        self.expected_offset = expected_offset
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UploadBusy(UploadError):
+    status_code = 409
+
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChunkedUploadStore:
+    def __init__(self, directory, max_size, magic=None, expiry_seconds=24 * 3600, chunk_size=64 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.magic = magic
+        self.expiry_seconds = expiry_seconds
+        self.chunk_size = chunk_size
+        self._hashers = {}
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def _paths(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise UploadNotFound('Unknown upload')
+        base = os.path.join(self.directory, upload_id)
+        return base + '.part', base + '.json'
+
+    def create(self, owner_id, filename, total_size=None):
+        if total_size is not None and total_size > self.max_size:
+            raise UploadTooLarge(f'File exceeds the {self.max_size // (1024 * 1024)}MB limit')
+        os.makedirs(self.directory, exist_ok=True)
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w') as handle:
+            json.dump({
+                'owner_id': owner_id,
+                'filename': filename,
+                'total_size': total_size,
+                'created_at': time.time()
+            }, handle)
+        with self._lock:
+            self._hashers[upload_id] = (0, hashlib.sha256())
+        return upload_id
+
+    def load(self, upload_id, owner_id=None):
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as handle:
+                metadata = json.load(handle)
+        except (OSError, ValueError):
+            raise UploadNotFound('Unknown upload')
+        if owner_id is not None and metadata.get('owner_id') != owner_id:
+            raise UploadNotFound('Unknown upload')
+        metadata['offset'] = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        return metadata
+
+    @contextlib.contextmanager
+    def _writing(self, upload_id):
+        """Open the part file for writing, holding an exclusive lock on it
+        (per thread within this process, and with flock across processes)."""
+        part_path, _ = self._paths(upload_id)
+        with self._lock:
+            if upload_id in self._busy:
+                raise UploadBusy('Another request is writing to this upload')
+            self._busy.add(upload_id)
+        try:
+            try:
+                handle = open(part_path, 'r+b')
+            except OSError:
+                raise UploadNotFound('Unknown upload')
+            with handle:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        raise UploadBusy('Another request is writing to this upload')
+                yield handle
+        finally:
+            with self._lock:
+                self._busy.discard(upload_id)
+
+    def append(self, upload_id, offset, stream, owner_id=None):
+        """Append the request body at ``offset`` and return the new offset."""
+        with self._writing(upload_id) as handle:
+            return self._append(handle, upload_id, offset, stream, owner_id)
+
+    def _append(self, handle, upload_id, offset, stream, owner_id):
+        # The offset is read under the lock, so it can't change until we return
+        metadata = self.load(upload_id, owner_id)
+        if offset != metadata['offset']:
+            raise OffsetMismatch(metadata['offset'])
+
+        limit = metadata['total_size'] if metadata['total_size'] is not None else self.max_size
+        with self._lock:
+            hashed_offset, hasher = self._hashers.pop(upload_id, (None, None))
+        if hashed_offset != offset:
+            hasher = None
+
+        # The magic is checked as its bytes arrive, however the client splits
+        # them across reads and chunks
+        head = b''
+        if self.magic:
+            handle.seek(0)
+            head = handle.read(min(offset, len(self.magic)))
+
+        written = offset
+        handle.seek(offset)
+        try:
+            for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                if self.magic and len(head) < len(self.magic):
+                    head += chunk[:len(self.magic) - len(head)]
+                    if not self.magic.startswith(head):
+                        raise UploadError('File is not a valid PDF')
+                written += len(chunk)
+                if written > limit:
+                    raise UploadTooLarge('Upload exceeds the declared file size')
+                handle.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+        except UploadError:
+            # Keep only the bytes that were valid before this chunk
+            handle.truncate(offset)
+            if offset == 0:
+                self.discard(upload_id)
+            raise
+
+        if hasher is not None:
+            with self._lock:
+                self._hashers[upload_id] = (written, hasher)
+        return written
+
+    def finish(self, upload_id, owner_id=None):
+        """Close the session and return (part_path, content_hash, size,
+        filename). The caller owns ``part_path`` afterwards."""
+        with self._writing(upload_id):
+            return self._finish(upload_id, owner_id)
+
+    def _finish(self, upload_id, owner_id):
+        metadata = self.load(upload_id, owner_id)
+        size = metadata['offset']
+        if size == 0:
+            raise UploadError('No data was uploaded')
+        if self.magic and size < len(self.magic):
+            raise UploadError('File is not a valid PDF')
+        if metadata['total_size'] is not None and size != metadata['total_size']:
+            raise UploadError(f'Upload incomplete: {size} of {metadata["total_size"]} bytes received')
+
+        part_path, meta_path = self._paths(upload_id)
+        with self._lock:
+            hashed_offset, hasher = self._hashers.pop(upload_id, (None, None))
+        if hashed_offset != size:
+            hasher = hashlib.sha256()
+            with open(part_path, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(self.chunk_size), b''):
+                    hasher.update(chunk)
+        os.remove(meta_path)
+        return part_path, hasher.hexdigest(), size, metadata['filename']
+
+    def discard(self, upload_id):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cleanup_expired(self):
+        cutoff = time.time() - self.expiry_seconds
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            for upload_id in list(self._hashers):
+                if not os.path.exists(os.path.join(self.directory, upload_id + '.json')):
+                    self._hashers.pop(upload_id, None)
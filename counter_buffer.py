@@ -0,0 +1,95 @@
+"""Write-behind counters: increments are summed in memory and written in
+batches.
+
+``add(key)`` only bumps a dict entry under a lock, so counting costs a
+request no I/O. A daemon thread hands everything accumulated since the last
+write, as ``{key: count}``, to the ``flush`` callable every
+``flush_interval`` seconds, or sooner once ``max_keys`` distinct keys are
+pending. Counts from a failed write are merged back and retried with the
+next one. Counts still in memory when a process is killed are lost, so at
+most ``flush_interval`` seconds' worth; a normal exit writes them first.
+"""
+import atexit
+import collections
+import logging
+import os
+import threading
+
+
+class CounterBuffer:
+    def __init__(self, flush, flush_interval=10.0, max_keys=1000, logger=None, name='counter-buffer'):
+        self.flush_counts = flush
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.logger = logger or logging.getLogger(__name__)
+        self.name = name
+        self._pending = collections.Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats = {'counted': 0, 'written': 0, 'failed_flushes': 0, 'flushes': 0}
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        # Like the activity writer, every forked web worker runs its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Counts inherited across a fork are the parent's to write
+                with self._lock:
+                    self._pending = collections.Counter()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def add(self, key, amount=1):
+        self._ensure_started()
+        with self._lock:
+            self._pending[key] += amount
+            self._stats['counted'] += amount
+            full = len(self._pending) >= self.max_keys
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write the pending counts now. Returns the number of keys written."""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._pending = self._pending, collections.Counter()
+            if not counts:
+                return 0
+            try:
+                self.flush_counts(dict(counts))
+            except Exception as e:
+                with self._lock:
+                    self._pending.update(counts)
+                    self._stats['failed_flushes'] += 1
+                self.logger.error('Error writing %d buffered counters: %s', len(counts), e)
+                return 0
+            with self._lock:
+                self._stats['written'] += sum(counts.values())
+                self._stats['flushes'] += 1
+            return len(counts)
+
+    def close(self):
+        if self._pid == os.getpid():
+            self.flush()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_keys'] = len(self._pending)
+            stats['pending'] = sum(self._pending.values())
+        return stats
@@ -0,0 +1,149 @@
+"""Server-sent event fan-out for one web process.
+
+Every open stream is a ``Subscription``: a queue plus the id of the last
+event it sent. One dispatcher thread per process calls ``fetch(after_id,
+limit)``, which returns ``(id, payload)`` pairs newer than ``after_id`` in id
+order, and hands each batch to every subscription. It fetches when
+``notify`` is called (an event committed in this process) and every
+``poll_interval`` seconds otherwise, so events committed by other workers
+arrive too, and it sleeps while no stream is open. A stream that reconnects
+with ``Last-Event-ID`` first receives what it missed.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+
+
+class StreamFull(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, position):
+        self.position = position
+        self.queue = queue.Queue()
+
+
+def format_event(event_id, event, payload):
+    data = json.dumps(payload, separators=(',', ':'))
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+
+class EventBroadcaster:
+    def __init__(self, fetch, event='message', poll_interval=5.0, heartbeat=15.0,
+                 max_clients=100, batch_size=100, logger=None):
+        self.fetch = fetch
+        self.event = event
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self._subscriptions = set()
+        self._last_id = None
+        self._delivered = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def notify(self):
+        """Wake the dispatcher because an event was just committed."""
+        self._wake.set()
+
+    def ensure_started(self):
+        # Like the PDF job dispatcher, every forked web worker runs its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Streams opened before a fork belong to the parent
+                with self._lock:
+                    self._subscriptions = set()
+                    self._last_id = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name='event-stream-dispatcher', daemon=True)
+            self._thread.start()
+
+    def subscribe(self, position):
+        """Open a stream that starts after event ``position``. Raises
+        StreamFull when ``max_clients`` streams are already open."""
+        self.ensure_started()
+        subscription = Subscription(position)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_clients:
+                raise StreamFull()
+            self._subscriptions.add(subscription)
+            # Fetching from the lowest open position both catches a
+            # reconnecting stream up and closes the gap between its position
+            # and the dispatcher's; streams skip events they already sent
+            if self._last_id is None or position < self._last_id:
+                self._last_id = position
+        self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            if not self._subscriptions:
+                self._last_id = None
+
+    def stream(self, subscription, retry_ms=None):
+        """Yield the text of a ``text/event-stream`` response, with a comment
+        line every ``heartbeat`` seconds so proxies keep it open and a closed
+        connection is noticed."""
+        try:
+            if retry_ms:
+                yield f'retry: {int(retry_ms)}\n\n'
+            while True:
+                try:
+                    events = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                for event_id, payload in events:
+                    if event_id <= subscription.position:
+                        continue
+                    subscription.position = event_id
+                    yield format_event(event_id, self.event, payload)
+        finally:
+            self.unsubscribe(subscription)
+
+    def run(self):
+        while True:
+            with self._lock:
+                after = self._last_id if self._subscriptions else None
+            if after is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            try:
+                events = self.fetch(after, self.batch_size)
+            except Exception as e:
+                self.logger.error('Error fetching stream events: %s', e)
+                events = []
+            if events:
+                with self._lock:
+                    # A stream that subscribed meanwhile may have moved the
+                    # position back; the next fetch starts from there instead
+                    if self._last_id == after:
+                        self._last_id = events[-1][0]
+                    for subscription in self._subscriptions:
+                        subscription.queue.put(events)
+                    self._delivered += len(events) * len(self._subscriptions)
+                if len(events) >= self.batch_size:
+                    continue
+
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {'streams': len(self._subscriptions), 'max_streams': self.max_clients,
+                    'events_delivered': self._delivered}
@@ -0,0 +1,71 @@
+"""In-memory index of the files under a directory tree.
+
+Lookups are plain set membership tests. The tree is rescanned at most every
+``refresh_interval`` seconds, and only when the mtime of one of the indexed
+directories changed (adding or removing a file updates its directory's
+mtime), so steady-state lookups never touch the filesystem.
+"""
+import os
+import threading
+import time
+
+
+class FileIndex:
+    def __init__(self, root, exclude=(), refresh_interval=60):
+        self.root = os.path.abspath(root)
+        self.exclude = {os.path.abspath(path) for path in exclude}
+        self.refresh_interval = refresh_interval
+        self.generation = 0
+        self._files = None
+        self._dir_mtimes = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        files = set()
+        dir_mtimes = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames
+                           if os.path.join(dirpath, name) not in self.exclude]
+            try:
+                dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            relative_dir = os.path.relpath(dirpath, self.root)
+            for filename in filenames:
+                relative_path = filename if relative_dir == '.' else os.path.join(relative_dir, filename)
+                files.add(relative_path.replace(os.sep, '/'))
+        return files, dir_mtimes
+
+    def _changed(self):
+        if not self._dir_mtimes:
+            # The root did not exist at the last scan
+            return os.path.isdir(self.root)
+        for dirpath, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._files is not None and now - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = now
+            if force or self._files is None or self._changed():
+                self._files, self._dir_mtimes = self._scan()
+                self.generation += 1
+
+    def add(self, relative_path):
+        """Record a file the application just wrote, ahead of the next rescan."""
+        self.refresh()
+        with self._lock:
+            self._files = self._files | {relative_path.replace('\\', '/')}
+            self.generation += 1
+
+    def __contains__(self, relative_path):
+        self.refresh()
+        return relative_path in self._files
@@ -0,0 +1,49 @@
+"""Per-process cache of logged-in users for Flask-Login's user loader.
+
+Entries are plain dicts of column values keyed by user id, held in an LRU
+with a TTL. The cache knows nothing of other processes: the caller checks a
+hit against whichever columns must never be stale, and invalidates it when
+they differ.
+"""
+import threading
+
+from response_cache import MemoryBackend
+
+
+class IdentityCache:
+    def __init__(self, max_entries=1024, ttl=60):
+        self.ttl = ttl
+        self.enabled = ttl > 0
+        self.backend = MemoryBackend(max_entries)
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, user_id):
+        if not self.enabled:
+            return None
+        values = self.backend.get(user_id)
+        self._count('misses' if values is None else 'hits')
+        return values
+
+    def set(self, user_id, values):
+        if self.enabled:
+            self.backend.set(user_id, values, self.ttl)
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self.backend.delete(user_id)
+            self._count('invalidations')
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats['entries'] = len(self.backend)
+        stats['max_entries'] = self.backend.max_entries
+        stats['ttl'] = self.ttl
+        return stats
@@ -0,0 +1,119 @@
+"""Resized photo variants for responsive images, run in the background
+worker processes.
+
+``render_variants`` reads an original (a local file, or an http(s) URL it
+downloads first), and writes one file per width and format into an output
+directory: ``<width>.avif``, ``<width>.webp`` and ``<width>.jpg``. Widths
+larger than the original are skipped, so small photos are never upscaled.
+Like ``pdf_processing``, it takes and returns plain values. It needs
+Pillow; AVIF is only written when the installed Pillow can encode it.
+"""
+import hashlib
+import os
+import shutil
+import urllib.request
+
+# format name -> (Pillow format, file extension, content type)
+FORMATS = {
+    'avif': ('AVIF', 'avif', 'image/avif'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+FETCH_CHUNK_SIZE = 64 * 1024
+
+
+def content_type(filename):
+    extension = filename.rsplit('.', 1)[-1]
+    for _, format_extension, mimetype in FORMATS.values():
+        if format_extension == extension:
+            return mimetype
+    return None
+
+
+def available_formats(formats):
+    """The formats from ``formats`` this Pillow build can encode."""
+    from PIL import features
+
+    available = []
+    for name in formats:
+        if name not in FORMATS:
+            continue
+        if name == 'jpeg' or features.check(name):
+            available.append(name)
+    return available
+
+
+def fetch_image(url, destination, max_bytes, timeout=30):
+    request = urllib.request.Request(url, headers={'User-Agent': 'ghs-photo-variants/1.0'})
+    size = 0
+    with urllib.request.urlopen(request, timeout=timeout) as response, open(destination, 'wb') as handle:
+        for chunk in iter(lambda: response.read(FETCH_CHUNK_SIZE), b''):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f'Image is larger than {max_bytes} bytes')
+            handle.write(chunk)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(FETCH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_variants(source, output_dir, widths, formats, quality=80, max_bytes=10 * 1024 * 1024):
+    """Write the variants of ``source`` into ``output_dir``. Returns
+    {'content_hash', 'width', 'height', 'variants': {format: [[width, filename], ...]}}
+    with each format's widths in ascending order."""
+    from PIL import Image, ImageOps
+
+    os.makedirs(output_dir, exist_ok=True)
+    if source.startswith(('http://', 'https://')):
+        original_path = os.path.join(output_dir, 'original')
+        fetch_image(source, original_path, max_bytes)
+    else:
+        original_path = source
+
+    try:
+        with Image.open(original_path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                # Photos are shown on a light card; flatten any transparency onto white
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                if image.mode in ('RGBA', 'LA', 'P'):
+                    image = image.convert('RGBA')
+                    background.paste(image, mask=image.getchannel('A'))
+                else:
+                    background.paste(image.convert('RGB'))
+                image = background
+            original_width, original_height = image.size
+
+            targets = sorted({width for width in widths if width < original_width})
+            if any(width >= original_width for width in widths):
+                # Widths beyond the original are served at its own size
+                targets.append(original_width)
+
+            variants = {}
+            for width in targets:
+                height = max(1, round(original_height * width / original_width))
+                resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+                for name in available_formats(formats):
+                    pillow_format, extension, _ = FORMATS[name]
+                    filename = f'{width}.{extension}'
+                    options = {'quality': quality}
+                    if name == 'jpeg':
+                        options.update(optimize=True, progressive=True)
+                    elif name == 'webp':
+                        options['method'] = 6
+                    resized.save(os.path.join(output_dir, filename), pillow_format, **options)
+                    variants.setdefault(name, []).append([width, filename])
+        return {'content_hash': file_hash(original_path), 'width': original_width,
+                'height': original_height, 'variants': variants}
+    finally:
+        if original_path != source and os.path.exists(original_path):
+            os.remove(original_path)
+
+
+def discard_output(output_dir):
+    shutil.rmtree(output_dir, ignore_errors=True)
@@ -0,0 +1,148 @@
+"""Dispatcher that feeds queued jobs to a process pool.
+
+The queue itself lives in the database; this class only needs callables:
+``claim(limit)`` returns up to ``limit`` (job_id, args) pairs it marked as
+running, ``task(*args)`` runs in a worker process, and ``complete(job_id,
+result)`` or ``fail(job_id, error)`` record the outcome. The dispatcher runs
+in the foreground for a dedicated worker, or in a daemon thread started on
+demand inside the web process. Pool processes are spawned rather than
+forked by default: a fork from that thread would copy locks other threads
+hold (logging, the database pool) into the child, where nothing releases
+them.
+"""
+import logging
+import os
+import threading
+
+
+class JobWorker:
+    def __init__(self, claim, task, complete, fail, processes=2, poll_interval=5.0, logger=None,
+                 name='job-dispatcher', start_method='spawn'):
+        self.claim = claim
+        self.task = task
+        self.complete = complete
+        self.fail = fail
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.name = name
+        self.start_method = start_method
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def notify(self):
+        """Wake the dispatcher because a job was just queued."""
+        self._wake.set()
+
+    def ensure_started(self):
+        # Like the activity writer, every forked web worker runs its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _finish(self, job_id, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._call(self.fail, job_id, e)
+        else:
+            self._call(self.complete, job_id, result)
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            self.logger.error('Error recording job %s: %s', args[0], e)
+
+    def run(self, until_idle=False):
+        """Process jobs until ``stop`` is called, or until the queue is empty
+        when ``until_idle`` is set. Returns the number of jobs finished."""
+        # multiprocessing is only imported once a dispatcher actually runs,
+        # keeping it off the web process's import path
+        import multiprocessing
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        from concurrent.futures.process import BrokenProcessPool
+
+        context = multiprocessing.get_context(self.start_method)
+
+        finished = 0
+        pool = ProcessPoolExecutor(self.processes, mp_context=context)
+        running = {}
+        shutting_down = False
+        try:
+            while not self._stop.is_set():
+                free = self.processes - len(running)
+                if free:
+                    try:
+                        claimed = self.claim(free)
+                    except Exception as e:
+                        self.logger.error('Error claiming jobs: %s', e)
+                        claimed = []
+                    for position, (job_id, args) in enumerate(claimed):
+                        try:
+                            running[pool.submit(self.task, *args)] = job_id
+                        except BrokenProcessPool as e:
+                            # A worker died since the last poll. Every job of
+                            # the old pool fails and is retried; start over
+                            for failed_id, _ in claimed[position:]:
+                                self._call(self.fail, failed_id, e)
+                                finished += 1
+                            for other in list(running):
+                                self._finish(running.pop(other), other)
+                                finished += 1
+                            pool.shutdown(wait=False)
+                            pool = ProcessPoolExecutor(self.processes, mp_context=context)
+                            break
+                        except RuntimeError as e:
+                            # The interpreter is exiting and no longer starts
+                            # work; the claimed jobs are retried by the next run
+                            for failed_id, _ in claimed[position:]:
+                                self._call(self.fail, failed_id, e)
+                                finished += 1
+                            shutting_down = True
+                            break
+                    if shutting_down:
+                        break
+
+                if not running:
+                    if until_idle:
+                        break
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(running.pop(future), future)
+                    finished += 1
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        # A worker died (e.g. a crashing PDF or image library); the
+                        # remaining futures fail the same way, then start over
+                        for other in list(running):
+                            self._finish(running.pop(other), other)
+                            finished += 1
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(self.processes, mp_context=context)
+                        break
+
+            # Record jobs still running when stopped, rather than leaving
+            # them to be reclaimed after the timeout
+            for future in list(running):
+                self._finish(running.pop(future), future)
+                finished += 1
+        finally:
+            pool.shutdown(wait=True)
+        return finished
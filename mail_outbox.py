@@ -0,0 +1,167 @@
+"""Outbound mail transports and the dispatcher that sends queued mail.
+
+The queue lives in the database; ``OutboxSender`` only needs callables:
+``claim(limit)`` returns up to ``limit`` (message_id, EmailMessage) pairs it
+marked as sending, and ``finish(sent_ids, failures)`` records a batch's
+outcome, ``failures`` mapping ids to error text. Each batch goes through one
+transport connection. Like the PDF job dispatcher, the sender runs in the
+foreground for a dedicated worker, in a daemon thread started on demand in
+the web process, or until the queue is empty.
+"""
+import logging
+import os
+import threading
+import time
+
+
+class FileTransport:
+    """Writes each message to ``directory`` as an ``.eml`` file, for
+    development or for a host where another program delivers them."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send_batch(self, messages):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        failures = {}
+        for message_id, message in messages:
+            path = os.path.join(self.directory, f'{stamp}-{message_id}.eml')
+            try:
+                with open(path + '.tmp', 'wb') as handle:
+                    handle.write(bytes(message))
+                os.replace(path + '.tmp', path)
+            except OSError as e:
+                failures[message_id] = str(e)
+        return failures
+
+
+class SMTPTransport:
+    def __init__(self, host, port=587, username=None, password=None, security='starttls', timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+
+    def send_batch(self, messages):
+        import smtplib
+
+        connection_class = smtplib.SMTP_SSL if self.security == 'ssl' else smtplib.SMTP
+        failures = {}
+        with connection_class(self.host, self.port, timeout=self.timeout) as connection:
+            if self.security == 'starttls':
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password)
+            for position, (message_id, message) in enumerate(messages):
+                try:
+                    connection.send_message(message)
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    # The connection is gone; everything not yet handed over
+                    # is retried with the next batch
+                    for remaining_id, _ in messages[position:]:
+                        failures[remaining_id] = str(e)
+                    break
+                except smtplib.SMTPException as e:
+                    failures[message_id] = str(e)
+        return failures
+
+
+def create_transport(config):
+    if config.get('MAIL_TRANSPORT', 'file') == 'smtp':
+        return SMTPTransport(
+            config['MAIL_SMTP_HOST'],
+            port=config['MAIL_SMTP_PORT'],
+            username=config.get('MAIL_SMTP_USERNAME'),
+            password=config.get('MAIL_SMTP_PASSWORD'),
+            security=config.get('MAIL_SMTP_SECURITY', 'starttls')
+        )
+    return FileTransport(config['MAIL_FILE_DIR'])
+
+
+class OutboxSender:
+    def __init__(self, claim, finish, transport, batch_size=50, poll_interval=30.0, logger=None):
+        self.claim = claim
+        self.finish = finish
+        self.transport = transport
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats = {'sent': 0, 'failed': 0, 'batches': 0}
+        self._stats_lock = threading.Lock()
+
+    def notify(self):
+        """Wake the sender because mail was just queued."""
+        self._wake.set()
+
+    def ensure_started(self):
+        # Like the PDF job dispatcher, every forked web worker runs its own thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='mail-outbox-sender', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def send_batch(self):
+        """Claim and send one batch. Returns the number of messages claimed."""
+        try:
+            batch = self.claim(self.batch_size)
+        except Exception as e:
+            self.logger.error('Error claiming queued mail: %s', e)
+            return 0
+        if not batch:
+            return 0
+
+        try:
+            failures = self.transport.send_batch(batch)
+        except Exception as e:
+            # Connecting or logging in failed, so nothing was handed over
+            failures = {message_id: str(e) for message_id, _ in batch}
+        sent_ids = [message_id for message_id, _ in batch if message_id not in failures]
+        try:
+            self.finish(sent_ids, failures)
+        except Exception as e:
+            self.logger.error('Error recording sent mail: %s', e)
+        if failures:
+            self.logger.warning('%d of %d queued messages could not be sent', len(failures), len(batch))
+        with self._stats_lock:
+            self._stats['sent'] += len(sent_ids)
+            self._stats['failed'] += len(failures)
+            self._stats['batches'] += 1
+        return len(batch)
+
+    def run(self, until_idle=False):
+        """Send mail until ``stop`` is called, or until the queue is empty
+        when ``until_idle`` is set. Returns the number of messages sent."""
+        with self._stats_lock:
+            sent_before = self._stats['sent']
+        while not self._stop.is_set():
+            if self.send_batch():
+                continue
+            if until_idle:
+                break
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        with self._stats_lock:
+            return self._stats['sent'] - sent_before
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['transport'] = type(self.transport).__name__
+        return stats
@@ -0,0 +1,96 @@
+"""PDF analysis run in the background worker processes.
+
+Everything here takes and returns plain values, so it can be handed to a
+process pool without touching the database. Thumbnails are rendered with
+PyMuPDF when it is installed, else with poppler's ``pdftoppm`` when it is on
+the PATH; without either, papers are processed without a thumbnail.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+def extract_text(reader, max_pages, max_chars):
+    chunks = []
+    total_chars = 0
+    for page_number, page in enumerate(reader.pages):
+        if page_number >= max_pages or total_chars >= max_chars:
+            break
+        page_text = page.extract_text() or ''
+        chunks.append(page_text)
+        total_chars += len(page_text)
+    return '\n'.join(chunks)[:max_chars]
+
+
+def extract_pdf_text(full_path, max_pages, max_chars):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return ''
+
+    try:
+        return extract_text(PdfReader(full_path), max_pages, max_chars)
+    except Exception as e:
+        print(f"Error extracting text from {full_path}: {e}")
+        return ''
+
+
+def render_with_pymupdf(full_path, output_path, width):
+    try:
+        import fitz
+    except ImportError:
+        return False
+    with fitz.open(full_path) as document:
+        page = document[0]
+        zoom = width / page.rect.width
+        page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(output_path)
+    return True
+
+
+def render_with_pdftoppm(full_path, output_path, width):
+    if shutil.which('pdftoppm') is None:
+        return False
+    output_prefix = output_path[:-len('.png')]
+    subprocess.run(
+        ['pdftoppm', '-png', '-singlefile', '-f', '1', '-l', '1', '-scale-to-x', str(width),
+         '-scale-to-y', '-1', full_path, output_prefix],
+        check=True, capture_output=True, timeout=60
+    )
+    return True
+
+
+def render_thumbnail(full_path, output_path, width):
+    """Render the first page as a PNG at ``output_path``. Returns False when
+    no renderer is available."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix='.png')
+    os.close(fd)
+    try:
+        for renderer in (render_with_pymupdf, render_with_pdftoppm):
+            if renderer(full_path, temp_path, width):
+                os.replace(temp_path, output_path)
+                return True
+        return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def process_pdf(full_path, thumbnail_path, max_pages, max_chars, thumbnail_width):
+    """Return {'page_count', 'text', 'thumbnail'} for one PDF. Errors are
+    raised so the job can be retried."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(full_path)
+    result = {
+        'page_count': len(reader.pages),
+        'text': extract_text(reader, max_pages, max_chars),
+        'thumbnail': False
+    }
+    if thumbnail_path:
+        # Thumbnails are content-addressed, so duplicates reuse the first one
+        result['thumbnail'] = os.path.exists(thumbnail_path) or render_thumbnail(
+            full_path, thumbnail_path, thumbnail_width
+        )
+    return result
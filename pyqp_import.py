@@ -0,0 +1,184 @@
+"""Sources and manifests for bulk PYQP imports.
+
+An import reads PDFs from a ZIP archive or a directory and takes each
+paper's subject, year and description from a CSV or JSON manifest, either
+passed alongside the source or stored in it as ``manifest.csv`` /
+``manifest.json``. Manifest rows name their PDF by its path inside the
+source; a bare file name also matches when it is unique. Nothing here
+touches the database: the application stores the files and inserts rows.
+"""
+import csv
+import io
+import json
+import os
+import posixpath
+import zipfile
+
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+IGNORED_PREFIXES = ('__MACOSX/', '.')
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def parse_manifest(name, data):
+    """Return manifest rows as dicts with ``file``, ``subject``, ``year``,
+    ``description`` and ``error`` (None for valid rows)."""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.json':
+        try:
+            records = json.loads(data)
+        except ValueError as e:
+            raise ManifestError(f'Manifest is not valid JSON: {e}')
+        if isinstance(records, dict):
+            records = records.get('papers')
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ManifestError('JSON manifest must be a list of objects or {"papers": [...]}')
+    elif extension == '.csv':
+        reader = csv.DictReader(io.StringIO(data))
+        fields = {field.strip().lower() for field in reader.fieldnames or []}
+        if not {'subject', 'year'} <= fields or not fields & {'file', 'filename'}:
+            raise ManifestError('CSV manifest needs file, subject and year columns')
+        records = [{key.strip().lower(): value for key, value in record.items() if key} for record in reader]
+    else:
+        raise ManifestError('Manifest must be a .csv or .json file')
+
+    rows = []
+    for record in records:
+        row = {
+            'file': normalize_path(str(record.get('file') or record.get('filename') or '')),
+            'subject': str(record.get('subject') or '').strip(),
+            'year': None,
+            'description': str(record.get('description') or '').strip(),
+            'error': None
+        }
+        try:
+            row['year'] = int(str(record.get('year')).strip())
+        except ValueError:
+            row['error'] = 'Invalid year'
+        if not row['subject']:
+            row['error'] = 'Subject is required'
+        elif len(row['subject']) > 100:
+            row['error'] = 'Subject is longer than 100 characters'
+        if not row['file']:
+            row['error'] = 'File is required'
+        rows.append(row)
+    return rows
+
+
+def normalize_path(path):
+    path = path.replace('\\', '/').strip().lstrip('/')
+    return posixpath.normpath(path) if path else ''
+
+
+class ZipSource:
+    def __init__(self, fileobj, name='archive.zip'):
+        try:
+            self.archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            raise ManifestError('File is not a valid ZIP archive')
+        self.name = name
+        self.members = {}
+        for info in self.archive.infolist():
+            path = normalize_path(info.filename)
+            if info.is_dir() or path.startswith(IGNORED_PREFIXES) or path.startswith('..'):
+                continue
+            self.members[path] = info
+
+    def paths(self):
+        return list(self.members)
+
+    def size(self, path):
+        return self.members[path].file_size
+
+    def open(self, path):
+        return self.archive.open(self.members[path])
+
+    def close(self):
+        self.archive.close()
+
+
+class DirectorySource:
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        if not os.path.isdir(self.directory):
+            raise ManifestError(f'{directory} is not a directory')
+        self.name = os.path.basename(self.directory)
+        self.members = {}
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith('.'))
+            for filename in sorted(filenames):
+                if filename.startswith('.'):
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                self.members[os.path.relpath(full_path, self.directory).replace(os.sep, '/')] = full_path
+
+    def paths(self):
+        return list(self.members)
+
+    def size(self, path):
+        return os.path.getsize(self.members[path])
+
+    def open(self, path):
+        return open(self.members[path], 'rb')
+
+    def close(self):
+        pass
+
+
+def open_source(path_or_file, name=None):
+    """Open a directory, a ZIP file path or a ZIP file object."""
+    if isinstance(path_or_file, str):
+        if os.path.isdir(path_or_file):
+            return DirectorySource(path_or_file)
+        return ZipSource(path_or_file, name or os.path.basename(path_or_file))
+    return ZipSource(path_or_file, name or 'archive.zip')
+
+
+def load_manifest(source, manifest=None, manifest_name=None):
+    """Parse ``manifest`` (bytes or str) or the manifest stored in
+    ``source``."""
+    if manifest is None:
+        for candidate in MANIFEST_NAMES:
+            if candidate in source.members:
+                with source.open(candidate) as handle:
+                    return parse_manifest(candidate, handle.read())
+        raise ManifestError('No manifest given and none found in the archive')
+    return parse_manifest(manifest_name or 'manifest.csv', manifest)
+
+
+def plan_import(source, rows):
+    """Match manifest rows to source files. Returns (entries, results):
+    entries for files to import, and results for rows and files that cannot
+    be imported."""
+    by_name = {}
+    for path in source.paths():
+        by_name.setdefault(posixpath.basename(path), []).append(path)
+
+    entries = []
+    results = []
+    matched = set()
+    for row in rows:
+        if row['error']:
+            results.append({'file': row['file'], 'status': 'failed', 'error': row['error']})
+            continue
+        path = row['file']
+        if path not in source.members:
+            candidates = by_name.get(path, [])
+            path = candidates[0] if len(candidates) == 1 else None
+        if path is None:
+            results.append({'file': row['file'], 'status': 'failed', 'error': 'File not found in the archive'})
+            continue
+        if path in matched:
+            results.append({'file': row['file'], 'status': 'failed', 'error': 'File is listed more than once'})
+            continue
+        matched.add(path)
+        entries.append(dict(row, file=path))
+
+    for path in source.paths():
+        if path not in matched and path not in MANIFEST_NAMES:
+            results.append({'file': path, 'status': 'skipped', 'error': 'Not listed in the manifest'})
+    return entries, results
@@ -0,0 +1,244 @@
+"""Token-bucket rate limiting for abuse-prone endpoints.
+
+A limit such as ``5/minute`` is a bucket of five tokens per key (a client
+IP, a submitted username) that refills evenly over the minute. Every request
+takes a token, and an empty bucket rejects the request with 429 and a
+``Retry-After`` header. The check runs before the view, so a rejected
+request never reaches the database or the password hash.
+
+Buckets are kept in a per-process dict by default. The ``sqlite`` backend
+keeps them in a small database file shared by every worker on the host,
+and the ``redis`` backend in any server speaking the Redis protocol. Keys
+are hashed, so IPs and usernames are never stored as given. If the store
+fails, requests are let through rather than locking everyone out.
+"""
+import hashlib
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request
+from werkzeug.exceptions import TooManyRequests
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+LIMIT_PATTERN = re.compile(r'^\s*(\d+)\s*/\s*(\d+)?\s*(second|minute|hour|day)s?\s*$')
+# Buckets idle this long are full again, so stored copies can be dropped
+PRUNE_AFTER = 86400
+
+
+def parse_limit(limit):
+    """``'5/minute'`` or ``'100/10minutes'`` -> (capacity, period_seconds).
+    Empty or zero limits return None."""
+    if not limit or not str(limit).strip() or str(limit).strip() == '0':
+        return None
+    match = LIMIT_PATTERN.match(str(limit).lower())
+    if not match:
+        raise ValueError(f'Invalid rate limit {limit!r}, expected e.g. "5/minute"')
+    capacity = int(match.group(1))
+    if not capacity:
+        return None
+    return capacity, int(match.group(2) or 1) * PERIODS[match.group(3)]
+
+
+def take_token(state, now, capacity, period):
+    """Refill a (tokens, updated_at) bucket up to ``now`` and take a token.
+    Returns (new_state, allowed, retry_after_seconds)."""
+    tokens, updated_at = state if state else (capacity, now)
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, now), True, 0.0
+    return (tokens, now), False, (1 - tokens) * period / capacity
+
+
+class MemoryStore:
+    """Per-process buckets; the least recently used are evicted first."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self._lock:
+            state, allowed, retry_after = take_token(self._buckets.get(key), now, capacity, period)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class SQLiteStore:
+    """Buckets in a local SQLite file shared by every worker on the host."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            # Connections must not cross a fork into the web workers
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_bucket '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL) WITHOUT ROWID'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, key, capacity, period, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated_at FROM rate_limit_bucket WHERE key = ?', (key,)
+            ).fetchone()
+            state, allowed, retry_after = take_token(row, now, capacity, period)
+            connection.execute(
+                'INSERT INTO rate_limit_bucket (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, state[0], state[1])
+            )
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                connection.execute('DELETE FROM rate_limit_bucket WHERE updated_at < ?', (now - PRUNE_AFTER,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+
+class RedisStore:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...)."""
+
+    # The refill-and-take runs server side so concurrent workers cannot both
+    # spend the last token
+    SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * capacity / period)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(period))
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, url, prefix='ghs:ratelimit:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, period, now):
+        allowed, tokens = self.script(keys=[self.prefix + key], args=[capacity, period, now])
+        if allowed:
+            return True, 0.0
+        return False, (1 - float(tokens)) * period / capacity
+
+
+def create_store(config):
+    backend = config.get('RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'sqlite':
+        return SQLiteStore(config['RATE_LIMIT_SQLITE_PATH'])
+    if backend == 'redis':
+        return RedisStore(config['RATE_LIMIT_REDIS_URL'])
+    return MemoryStore()
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.store = None
+        self.logger = logging.getLogger(__name__)
+        self._stats = {}
+        self._errors = 0
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_BACKEND', 'memory') != 'null'
+        self.store = create_store(app.config) if self.enabled else None
+        self.logger = app.logger
+        app.extensions['rate_limiter'] = self
+
+    def _count(self, name, result):
+        with self._stats_lock:
+            counts = self._stats.setdefault(name, {'allowed': 0, 'rejected': 0})
+            counts[result] += 1
+
+    def hit(self, name, capacity, period, key):
+        """Take a token from ``name``'s bucket for ``key``. Returns
+        (allowed, retry_after_seconds)."""
+        bucket = name + ':' + hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        try:
+            allowed, retry_after = self.store.take(bucket, capacity, period, time.time())
+        except Exception as e:
+            self.logger.error('Rate limit store unavailable, allowing request: %s', e)
+            with self._stats_lock:
+                self._errors += 1
+            return True, 0.0
+        self._count(name, 'allowed' if allowed else 'rejected')
+        return allowed, retry_after
+
+    def limit(self, name, limit, key_func, methods=('POST',), message='Too many requests. Please try again later.'):
+        """Decorate a view so ``methods`` requests take a token from the
+        ``limit`` bucket of ``key_func()``; an empty key is not limited."""
+        parsed = parse_limit(limit)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if self.enabled and parsed and request.method in methods:
+                    key = key_func()
+                    if key:
+                        allowed, retry_after = self.hit(name, parsed[0], parsed[1], key)
+                        if not allowed:
+                            raise TooManyRequests(description=message, retry_after=max(1, math.ceil(retry_after)))
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = {'limits': {name: dict(counts) for name, counts in self._stats.items()},
+                     'store_errors': self._errors}
+        stats['backend'] = type(self.store).__name__ if self.store else None
+        return stats
+
+    def render_metrics(self, prefix):
+        stats = self.get_stats()
+        lines = [f'# HELP {prefix}_rate_limit_requests_total Rate-limited requests by limit and outcome.',
+                 f'# TYPE {prefix}_rate_limit_requests_total counter']
+        for name, counts in sorted(stats['limits'].items()):
+            for result, count in sorted(counts.items()):
+                lines.append(f'{prefix}_rate_limit_requests_total{{limit="{name}",result="{result}"}} {count}')
+        lines.append(f'# HELP {prefix}_rate_limit_store_errors_total Checks let through because the store failed.')
+        lines.append(f'# TYPE {prefix}_rate_limit_store_errors_total counter')
+        lines.append(f'{prefix}_rate_limit_store_errors_total {stats["store_errors"]}')
+        return '\n'.join(lines) + '\n'
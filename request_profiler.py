@@ -0,0 +1,254 @@
+"""Opt-in per-request profiling.
+
+Every request is split into phases: SQL (timed through SQLAlchemy cursor
+events), template rendering (Flask's template signals) and file sending.
+``send_file`` only wraps the file, which the server reads after the view has
+returned, so for a passthrough response the file phase runs from the end of
+the request until the server closes the body (plus any file work a view
+wraps in ``profiler.phase('file')``). The phase totals known when the
+headers go out are returned to the browser in a ``Server-Timing`` header;
+all of them, file sending included, are aggregated into per-endpoint
+histograms that ``render_metrics`` writes in the Prometheus text format. Queries slower than the threshold are logged with
+their parameters. Metrics are kept per process.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.wsgi import ClosingIterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('db', 'template', 'file')
+PHASE_DESCRIPTIONS = {'db': 'SQL', 'template': 'Template render', 'file': 'File send'}
+MAX_LOGGED_PARAMETERS = 500
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+
+def format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+class RequestProfiler:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_query_seconds = None
+        self.buckets = DEFAULT_BUCKETS
+        self.prefix = 'app'
+        self.logger = logging.getLogger(__name__)
+        self._durations = {}
+        self._phases = {}
+        self._requests = {}
+        self._queries = {}
+        self._slow_queries = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('REQUEST_PROFILING', False)
+        threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 200)
+        self.slow_query_seconds = threshold / 1000 if threshold else None
+        self.prefix = app.config.get('METRICS_PREFIX', 'app')
+        self.logger = app.logger
+        app.extensions['request_profiler'] = self
+        if not self.enabled:
+            return
+
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    # Request phases
+
+    def _current(self):
+        if not has_request_context():
+            return None
+        return g.get('_request_profile')
+
+    def _start_request(self):
+        g._request_profile = {
+            'started': time.perf_counter(),
+            'phases': dict.fromkeys(PHASES, 0.0),
+            'queries': 0,
+            'template_started': None
+        }
+
+    def _add(self, phase, seconds):
+        profile = self._current()
+        if profile is not None:
+            profile['phases'][phase] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - started)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        profile = self._current()
+        if profile is not None:
+            profile['phases']['db'] += elapsed
+            profile['queries'] += 1
+        if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+            with self._lock:
+                self._slow_queries += 1
+            endpoint = request.endpoint if has_request_context() else None
+            self.logger.warning('Slow query (%.1f ms, endpoint %s): %s parameters=%s',
+                                elapsed * 1000, endpoint, statement,
+                                repr(parameters)[:MAX_LOGGED_PARAMETERS])
+
+    def _before_render(self, sender, template, context, **extra):
+        profile = self._current()
+        if profile is not None:
+            profile['template_started'] = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        profile = self._current()
+        if profile is not None and profile['template_started'] is not None:
+            profile['phases']['template'] += time.perf_counter() - profile['template_started']
+            profile['template_started'] = None
+
+    def _finish_request(self, response):
+        profile = self._current()
+        if profile is None:
+            return response
+        phases = profile['phases']
+        elapsed = time.perf_counter() - profile['started']
+        timings = [f'{phase};dur={phases[phase] * 1000:.2f};desc="{PHASE_DESCRIPTIONS[phase]}"'
+                   for phase in PHASES if phases[phase]]
+        timings.append(f'total;dur={elapsed * 1000:.2f}')
+        response.headers.add('Server-Timing', ', '.join(timings))
+
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        status = response.status_code
+        queries = profile['queries']
+        handed_over = time.perf_counter()
+
+        def record():
+            # Runs once the body has been sent, so streamed files are included
+            finished = time.perf_counter()
+            if response.direct_passthrough:
+                phases['file'] += finished - handed_over
+            self._record(endpoint, method, status, finished - profile['started'], phases, queries)
+
+        if response.direct_passthrough:
+            self._close_with(response, record)
+        else:
+            response.call_on_close(record)
+        return response
+
+    @staticmethod
+    def _close_with(response, callback):
+        # A passthrough body goes to the server as it is, without the
+        # response's close hooks. Hooking the body's own close keeps a file
+        # wrapper intact, so the server can still sendfile() it
+        body = response.response
+        body_close = getattr(body, 'close', None)
+
+        def close():
+            try:
+                if body_close is not None:
+                    body_close()
+            finally:
+                callback()
+
+        try:
+            body.close = close
+        except AttributeError:
+            # Generators and lists take no attributes
+            response.response = ClosingIterator(body, callback)
+
+    # Aggregation
+
+    def _record(self, endpoint, method, status, duration, phases, queries):
+        key = (endpoint, method)
+        with self._lock:
+            if key not in self._durations:
+                self._durations[key] = Histogram(self.buckets)
+            self._durations[key].observe(duration)
+            for phase in PHASES:
+                if phase == 'db' or phases[phase]:
+                    phase_key = (endpoint, method, phase)
+                    if phase_key not in self._phases:
+                        self._phases[phase_key] = Histogram(self.buckets)
+                    self._phases[phase_key].observe(phases[phase])
+            request_key = (endpoint, method, status)
+            self._requests[request_key] = self._requests.get(request_key, 0) + 1
+            self._queries[key] = self._queries.get(key, 0) + queries
+
+    def render_metrics(self):
+        prefix = self.prefix
+        lines = []
+
+        def write_histograms(name, help_text, histograms, label_names):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            for key, histogram in sorted(histograms.items()):
+                labels = list(zip(label_names, key))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_{name}_bucket{format_labels(labels + [("le", bound)])} {cumulative}')
+                lines.append(f'{prefix}_{name}_bucket{format_labels(labels + [("le", "+Inf")])} {histogram.count}')
+                lines.append(f'{prefix}_{name}_sum{format_labels(labels)} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_{name}_count{format_labels(labels)} {histogram.count}')
+
+        with self._lock:
+            write_histograms('request_duration_seconds', 'Request latency including the response body.',
+                             self._durations, ('endpoint', 'method'))
+            write_histograms('request_phase_seconds', 'Time spent per request in SQL, templates and file sending.',
+                             self._phases, ('endpoint', 'method', 'phase'))
+
+            lines.append(f'# HELP {prefix}_requests_total Requests by endpoint and status.')
+            lines.append(f'# TYPE {prefix}_requests_total counter')
+            for key, count in sorted(self._requests.items()):
+                labels = zip(('endpoint', 'method', 'status'), key)
+                lines.append(f'{prefix}_requests_total{format_labels(labels)} {count}')
+
+            lines.append(f'# HELP {prefix}_db_queries_total SQL statements executed by endpoint.')
+            lines.append(f'# TYPE {prefix}_db_queries_total counter')
+            for key, count in sorted(self._queries.items()):
+                labels = zip(('endpoint', 'method'), key)
+                lines.append(f'{prefix}_db_queries_total{format_labels(labels)} {count}')
+
+            lines.append(f'# HELP {prefix}_slow_queries_total SQL statements over the slow query threshold.')
+            lines.append(f'# TYPE {prefix}_slow_queries_total counter')
+            lines.append(f'{prefix}_slow_queries_total {self._slow_queries}')
+        return '\n'.join(lines) + '\n'
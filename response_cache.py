@@ -0,0 +1,259 @@
+"""Rendered-response cache for the public pages.
+
+Pages are cached per endpoint and normalised query string. Every page names
+the data tags it depends on (``pyqp``, ``announcements``, ``faculty``) and the
+current generation of each tag is part of the cache key, so invalidating a
+tag is a single counter increment that every worker sharing the backend sees.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+
+class MemoryBackend:
+    """Per-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemBackend:
+    """Pickled entries under a local directory, shared by every worker on the host."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _write(self, path, payload):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(payload)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as handle:
+                expires_at, value = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        self._write(self._path(key), pickle.dumps((time.time() + ttl, value)))
+
+    def get_counter(self, key):
+        try:
+            with open(self._path('counter:' + key), 'rb') as handle:
+                return int(handle.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def incr(self, key):
+        # Concurrent increments may collapse into one, which still moves the
+        # generation away from the value cached entries were keyed with
+        value = self.get_counter(key) + 1
+        self._write(self._path('counter:' + key), str(value).encode('ascii'))
+        return value
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...)."""
+
+    def __init__(self, url, prefix='ghs:cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        payload = self.client.get(self.prefix + key)
+        return pickle.loads(payload) if payload is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + 'counter:' + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + 'counter:' + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_backend(config):
+    backend = config.get('RESPONSE_CACHE_BACKEND', 'memory')
+    if backend == 'filesystem':
+        return FileSystemBackend(config['RESPONSE_CACHE_DIR'])
+    if backend == 'redis':
+        return RedisBackend(config['RESPONSE_CACHE_REDIS_URL'])
+    return MemoryBackend(config.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.default_ttl = 300
+        self._stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_BACKEND', 'memory') != 'null'
+        self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', 300)
+        self.backend = create_backend(app.config) if self.enabled else None
+        app.extensions['response_cache'] = self
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = type(self.backend).__name__ if self.backend else None
+        return stats
+
+    def make_key(self, endpoint, tags, args):
+        generations = ','.join(f'{tag}={self.backend.get_counter("gen:" + tag)}' for tag in tags)
+        query = '&'.join(f'{name}={value}' for name, value in sorted(args.items(multi=True)))
+        return f'page:{endpoint}:{generations}:{query}'
+
+    def invalidate(self, *tags):
+        if not self.enabled:
+            return
+        for tag in tags:
+            try:
+                self.backend.incr('gen:' + tag)
+            except Exception as e:
+                current_app.logger.warning('Could not invalidate cache tag %s: %s', tag, e)
+        self._count('invalidations')
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+    def should_bypass(self):
+        # Logged-in users see a different navigation bar and flashed messages
+        # are one-shot, so neither may be served from or stored in the cache
+        return (
+            request.method != 'GET'
+            or current_user.is_authenticated
+            or bool(session.get('_flashes'))
+        )
+
+    def cached(self, *tags, ttl=None):
+        """Cache the decorated view's 200 responses for anonymous GETs until
+        ``ttl`` expires or one of ``tags`` is invalidated."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or self.should_bypass():
+                    self._count('bypassed')
+                    return view(*args, **kwargs)
+
+                try:
+                    key = self.make_key(request.endpoint, tags, request.args)
+                    cached = self.backend.get(key)
+                except Exception as e:
+                    current_app.logger.warning('Response cache unavailable: %s', e)
+                    self._count('bypassed')
+                    return view(*args, **kwargs)
+
+                if cached is not None:
+                    self._count('hits')
+                    body, status, headers = cached
+                    response = current_app.response_class(body, status=status, headers=headers)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count('misses')
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    headers = [(name, value) for name, value in response.headers.items()
+                               if name.lower() != 'set-cookie']
+                    try:
+                        self.backend.set(key, (response.get_data(), response.status_code, headers),
+                                         ttl or self.default_ttl)
+                    except Exception as e:
+                        current_app.logger.warning('Could not store cached response: %s', e)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
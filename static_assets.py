@@ -0,0 +1,204 @@
+"""Fingerprinted, precompressed static assets.
+
+``build`` copies every file under the static folder into ``dist/`` with a
+content hash in its name (``css/styles.css`` becomes
+``dist/css/styles.<hash>.css``), minifying CSS (and JavaScript when
+``rjsmin`` is installed) and writing ``.gz`` and, when the ``brotli``
+package is installed, ``.br`` siblings for text files. ``dist/manifest.json``
+maps each source path to its fingerprinted path; ``StaticManifest`` loads it
+to rewrite ``url_for('static')`` and pick the precompressed variant that
+matches a request's ``Accept-Encoding``.
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map', '.ico'}
+# Preferred first: brotli is smaller, gzip is understood by every browser
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|(\s+)', re.S)
+CSS_TIGHT_AFTER = set('{};:,>(')
+CSS_TIGHT_BEFORE = set('{};,>)')
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+FINGERPRINT_PATTERN = re.compile(r'\.[0-9a-f]{%d}\.[^./]+$' % HASH_LENGTH)
+
+
+def _tokenize_css(source):
+    # CSS_TOKENS only matches strings, comments and whitespace, so interleave
+    # the unmatched text ourselves
+    position = 0
+    for match in CSS_TOKENS.finditer(source):
+        if match.start() > position:
+            yield None, source[position:match.start()]
+        yield match, match.group(0)
+        position = match.end()
+    if position < len(source):
+        yield None, source[position:]
+
+
+def minify_css(source):
+    output = []
+    pending_space = False
+    for match, chunk in _tokenize_css(source):
+        if match is None:
+            if pending_space and output and output[-1][-1:] not in CSS_TIGHT_AFTER \
+                    and chunk[:1] not in CSS_TIGHT_BEFORE:
+                output.append(' ')
+            pending_space = False
+            output.append(chunk)
+            continue
+        string, comment, space = match.groups()
+        if string:
+            if pending_space and output and output[-1][-1:] not in CSS_TIGHT_AFTER:
+                output.append(' ')
+            pending_space = False
+            output.append(string)
+        elif comment and comment.startswith('/*!'):
+            output.append(comment)
+        else:
+            pending_space = True
+    return ''.join(output).replace(';}', '}').strip()
+
+
+def rewrite_css_urls(source, relative_path, manifest):
+    """Point relative ``url()`` references at their fingerprinted copies."""
+    directory = posixpath.dirname(relative_path)
+
+    def replace(match):
+        quote, target = match.groups()
+        path, _, fragment = target.partition('#')
+        path = path.partition('?')[0]
+        if not path or '//' in path or path.startswith(('data:', '/')):
+            return match.group(0)
+        built = manifest.get(posixpath.normpath(posixpath.join(directory, path)))
+        if built is None:
+            return match.group(0)
+        # The stylesheet itself moves under dist/ too, so the link stays relative
+        rewritten = posixpath.relpath(built, posixpath.join(DIST_DIR, directory))
+        if fragment:
+            rewritten += '#' + fragment
+        return f'url({quote}{rewritten}{quote})'
+
+    return CSS_URL_PATTERN.sub(replace, source)
+
+
+def minify_js(source):
+    try:
+        import rjsmin
+    except ImportError:
+        # A safe JavaScript minifier needs a real tokenizer; compression
+        # still removes most of the redundancy
+        return source
+    return rjsmin.jsmin(source)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def fingerprinted_name(relative_path, digest):
+    root, extension = os.path.splitext(relative_path)
+    return f'{root}.{digest[:HASH_LENGTH]}{extension}'
+
+
+def write_compressed(path, payload):
+    with open(path + '.gz', 'wb') as handle:
+        with gzip.GzipFile(fileobj=handle, mode='wb', compresslevel=9, mtime=0) as compressed:
+            compressed.write(payload)
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(path + '.br', 'wb') as handle:
+        handle.write(brotli.compress(payload, quality=11))
+
+
+def build(static_folder, exclude=()):
+    """Rebuild ``dist/`` and its manifest. Returns the manifest."""
+    static_folder = os.path.abspath(static_folder)
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    excluded = {os.path.abspath(path) for path in exclude} | {dist_folder}
+    staging_folder = dist_folder + '.tmp'
+    shutil.rmtree(staging_folder, ignore_errors=True)
+
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        dirnames[:] = sorted(name for name in dirnames
+                             if os.path.join(dirpath, name) not in excluded | {staging_folder})
+        for filename in sorted(filenames):
+            source_path = os.path.join(dirpath, filename)
+            sources.append((os.path.relpath(source_path, static_folder).replace(os.sep, '/'), source_path))
+    # Stylesheets go last so their url()s can name the fingerprinted files
+    sources.sort(key=lambda item: (item[0].lower().endswith('.css'), item[0]))
+
+    manifest = {}
+    for relative_path, source_path in sources:
+        extension = os.path.splitext(relative_path)[1].lower()
+        with open(source_path, 'rb') as handle:
+            payload = handle.read()
+        if extension == '.css':
+            payload = rewrite_css_urls(payload.decode('utf-8'), relative_path, manifest).encode('utf-8')
+        if extension in MINIFIERS:
+            payload = MINIFIERS[extension](payload.decode('utf-8')).encode('utf-8')
+
+        output_name = fingerprinted_name(relative_path, hashlib.sha256(payload).hexdigest())
+        output_path = os.path.join(staging_folder, *output_name.split('/'))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'wb') as handle:
+            handle.write(payload)
+        if extension in COMPRESSIBLE_EXTENSIONS:
+            write_compressed(output_path, payload)
+        manifest[relative_path] = f'{DIST_DIR}/{output_name}'
+
+    with open(os.path.join(staging_folder, MANIFEST_NAME), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    # Swap the finished tree in so a running server never sees half a build
+    previous_folder = dist_folder + '.old'
+    shutil.rmtree(previous_folder, ignore_errors=True)
+    if os.path.exists(dist_folder):
+        os.rename(dist_folder, previous_folder)
+    os.rename(staging_folder, dist_folder)
+    shutil.rmtree(previous_folder, ignore_errors=True)
+    return manifest
+
+
+class StaticManifest:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.static_folder, DIST_DIR, MANIFEST_NAME)) as handle:
+                self.entries = json.load(handle)
+        except (OSError, ValueError):
+            self.entries = {}
+        self._available = {}
+
+    def lookup(self, filename):
+        return self.entries.get(filename)
+
+    @staticmethod
+    def is_fingerprinted(filename):
+        return filename.startswith(DIST_DIR + '/') and bool(FINGERPRINT_PATTERN.search(filename))
+
+    def pick_variant(self, filename, accept_encodings):
+        """Return (filename to send, Content-Encoding or None)."""
+        variants = self._available.get(filename)
+        if variants is None:
+            base = os.path.join(self.static_folder, *filename.split('/'))
+            variants = self._available[filename] = [
+                (encoding, suffix) for encoding, suffix in ENCODINGS if os.path.exists(base + suffix)
+            ]
+        for encoding, suffix in variants:
+            if accept_encodings[encoding]:
+                return filename + suffix, encoding
+        return filename, None
@@ -0,0 +1,230 @@
+"""Storage backends for uploaded files.
+
+Files are addressed by keys such as ``pyqp/ab/cd/<sha256>.pdf``.
+``LocalStorage`` keeps them under a directory and ``S3Storage`` in a bucket
+of any S3-compatible service (AWS S3, MinIO, Cloudflare R2, ...) through
+boto3, which is only imported when that backend is configured. Uploads are
+written to local scratch space first, since they are hashed and checked while
+they stream in, and then handed over with ``put_file``. ``url`` returns a
+presigned URL clients can fetch the file from directly, or None when the
+application has to serve it itself.
+"""
+import os
+import shutil
+import threading
+import time
+from urllib.parse import quote
+
+from file_index import FileIndex
+
+
+def attachment_disposition(filename):
+    """Content-Disposition for a download, with a UTF-8 name for browsers
+    that understand RFC 6266 and an ASCII fallback for those that do not."""
+    fallback = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'download'
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}'
+
+
+class LocalStorage:
+    is_local = True
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        # Older rows were saved on Windows with backslash separators
+        return os.path.join(self.root, *key.replace('\\', '/').split('/'))
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def put_file(self, source_path, key, content_type=None, move=True):
+        destination = self.path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if move:
+            os.replace(source_path, destination)
+        else:
+            shutil.copy2(source_path, destination)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def download(self, key, destination):
+        shutil.copyfile(self.path(key), destination)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except OSError:
+            return False
+
+    def url(self, key, download_name=None, content_type=None, expires=None):
+        return None
+
+    def file_index(self, exclude=(), refresh_interval=60):
+        return FileIndex(self.root, exclude=[self.path(key) for key in exclude], refresh_interval=refresh_interval)
+
+
+class S3Storage:
+    is_local = False
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 addressing_style=None, url_expires=3600):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.url_expires = url_expires
+        # Credentials left unset come from boto3's usual chain (environment,
+        # shared config, instance role)
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            config=Config(signature_version='s3v4', s3={'addressing_style': addressing_style or 'auto'})
+        )
+
+    def object_key(self, key):
+        return self.prefix + key.replace('\\', '/').lstrip('/')
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head['ContentLength']
+
+    def put_file(self, source_path, key, content_type=None, move=True):
+        extra_args = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(source_path, self.bucket, self.object_key(key), ExtraArgs=extra_args)
+        if move:
+            os.remove(source_path)
+
+    def open(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))['Body']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                raise FileNotFoundError(key)
+            raise
+
+    def download(self, key, destination):
+        self.client.download_file(self.bucket, self.object_key(key), destination)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+        return True
+
+    def url(self, key, download_name=None, content_type=None, expires=None):
+        params = {'Bucket': self.bucket, 'Key': self.object_key(key)}
+        if download_name:
+            params['ResponseContentDisposition'] = attachment_disposition(download_name)
+        if content_type:
+            params['ResponseContentType'] = content_type
+        # Signing is local; no request reaches the object store
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires or self.url_expires)
+
+    def list_keys(self, prefix='', recursive=True):
+        """Yield keys under ``prefix``; without ``recursive``, also yield each
+        next-level "directory" as a key ending in '/'."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        options = {'Bucket': self.bucket, 'Prefix': self.object_key(prefix) if prefix else self.prefix}
+        if not recursive:
+            options['Delimiter'] = '/'
+        for page in paginator.paginate(**options):
+            for entry in page.get('CommonPrefixes', []):
+                yield entry['Prefix'][len(self.prefix):]
+            for entry in page.get('Contents', []):
+                yield entry['Key'][len(self.prefix):]
+
+    def file_index(self, exclude=(), refresh_interval=60):
+        return BucketIndex(self, exclude=exclude, refresh_interval=refresh_interval)
+
+
+class BucketIndex:
+    """The ``FileIndex`` interface over a bucket. Listing a bucket costs a
+    request per thousand keys, so excluded top-level prefixes (the PYQP
+    blobs) are never listed, and the rest at most every
+    ``refresh_interval`` seconds."""
+
+    def __init__(self, storage, exclude=(), refresh_interval=60):
+        self.storage = storage
+        self.exclude = {key.strip('/') + '/' for key in exclude}
+        self.refresh_interval = refresh_interval
+        self.generation = 0
+        self._keys = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        keys = set()
+        for entry in self.storage.list_keys(recursive=False):
+            if not entry.endswith('/'):
+                keys.add(entry)
+            elif entry not in self.exclude:
+                keys.update(self.storage.list_keys(entry))
+        return keys
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._keys is not None and now - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = now
+            try:
+                keys = self._scan()
+            except Exception:
+                # Keep serving the last listing while the store is unreachable
+                if self._keys is None:
+                    self._keys = set()
+                return
+            if keys != self._keys:
+                self._keys = keys
+                self.generation += 1
+
+    def add(self, key):
+        """Record a file the application just wrote, ahead of the next listing."""
+        self.refresh()
+        with self._lock:
+            self._keys = self._keys | {key.replace('\\', '/')}
+            self.generation += 1
+
+    def __contains__(self, key):
+        self.refresh()
+        return key in self._keys
+
+
+def create_storage(config):
+    if config.get('STORAGE_BACKEND', 'local') == 's3':
+        return S3Storage(
+            config['STORAGE_S3_BUCKET'],
+            prefix=config.get('STORAGE_S3_PREFIX', ''),
+            endpoint_url=config.get('STORAGE_S3_ENDPOINT_URL'),
+            region=config.get('STORAGE_S3_REGION'),
+            access_key=config.get('STORAGE_S3_ACCESS_KEY'),
+            secret_key=config.get('STORAGE_S3_SECRET_KEY'),
+            addressing_style=config.get('STORAGE_S3_ADDRESSING_STYLE'),
+            url_expires=config.get('STORAGE_URL_EXPIRES', 3600)
+        )
+    return LocalStorage(config['UPLOAD_FOLDER'])
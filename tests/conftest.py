@@ -0,0 +1,56 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py reads its configuration at import time, so point it at a scratch
+# database and upload folder before any test imports it
+_scratch = tempfile.mkdtemp(prefix='ghs-tests-')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(_scratch, 'school.db'))
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(_scratch, 'uploads'))
+os.environ.setdefault('SESSION_COOKIE_SECURE', '0')
+os.environ.setdefault('PDF_JOBS_MODE', 'worker')
+os.environ.setdefault('PHOTO_JOBS_MODE', 'worker')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app as app_module
+
+    app_module.init_db()
+    return app_module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def admin_client(app_module, client):
+    with app_module.app.app_context():
+        admin = app_module.Faculty.query.filter_by(username='admin').first()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+    return client
+
+
+@pytest.fixture
+def upload_paper(app_module, admin_client):
+    """Upload a one-page PDF through the faculty form and return its id."""
+    pypdf = pytest.importorskip('pypdf')
+
+    def upload(subject='Physics', year=2021, description=''):
+        writer = pypdf.PdfWriter()
+        writer.add_blank_page(200, 200 + year)
+        pdf = io.BytesIO()
+        writer.write(pdf)
+        admin_client.post('/faculty/upload_pyqp', content_type='multipart/form-data', data={
+            'pdf': (io.BytesIO(pdf.getvalue()), 'paper.pdf'), 'subject': subject, 'year': str(year),
+            'description': description})
+        with app_module.app.app_context():
+            return app_module.PYQP.query.order_by(app_module.PYQP.id.desc()).first().id
+    return upload
@@ -0,0 +1,107 @@
+import io
+import threading
+
+import pytest
+
+from chunked_upload import ChunkedUploadStore, OffsetMismatch, UploadBusy, UploadError
+
+PDF = b'%PDF-1.4\n' + b'x' * 100
+
+
+class TrickleStream:
+    """A request body that returns at most ``step`` bytes per read."""
+
+    def __init__(self, data, step):
+        self.data = data
+        self.step = step
+
+    def read(self, size=-1):
+        chunk, self.data = self.data[:self.step], self.data[self.step:]
+        return chunk
+
+
+class BlockingStream:
+    """A request body that waits for ``release`` before its first read."""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size=-1):
+        self.reading.set()
+        self.release.wait(5)
+        return self.data.read(size)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(str(tmp_path), max_size=1024 * 1024, magic=b'%PDF-')
+
+
+def test_magic_split_across_chunks_is_accepted(store):
+    upload_id = store.create(1, 'paper.pdf', len(PDF))
+    assert store.append(upload_id, 0, io.BytesIO(PDF[:3]), 1) == 3
+    assert store.append(upload_id, 3, TrickleStream(PDF[3:], 1), 1) == len(PDF)
+    _, _, size, _ = store.finish(upload_id, 1)
+    assert size == len(PDF)
+
+
+def test_bad_magic_is_rejected_even_in_short_reads(store):
+    upload_id = store.create(1, 'paper.pdf')
+    store.append(upload_id, 0, io.BytesIO(b'%P'), 1)
+    with pytest.raises(UploadError):
+        store.append(upload_id, 2, TrickleStream(b'NG-data', 1), 1)
+    # The valid prefix is kept and the session survives
+    assert store.load(upload_id, 1)['offset'] == 2
+
+
+def test_upload_shorter_than_magic_cannot_finish(store):
+    upload_id = store.create(1, 'paper.pdf')
+    store.append(upload_id, 0, io.BytesIO(b'%PD'), 1)
+    with pytest.raises(UploadError):
+        store.finish(upload_id, 1)
+
+
+def test_concurrent_put_at_same_offset_is_refused(store):
+    upload_id = store.create(1, 'paper.pdf')
+    first = BlockingStream(PDF)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(store.append(upload_id, 0, first, 1)))
+    thread.start()
+    assert first.reading.wait(5)
+    with pytest.raises(UploadBusy) as error:
+        store.append(upload_id, 0, io.BytesIO(PDF), 1)
+    assert error.value.status_code == 409
+    first.release.set()
+    thread.join()
+    assert results == [len(PDF)]
+    with pytest.raises(OffsetMismatch):
+        store.append(upload_id, 0, io.BytesIO(PDF), 1)
+
+
+def test_put_is_refused_while_another_process_holds_the_lock(store):
+    fcntl = pytest.importorskip('fcntl')
+    upload_id = store.create(1, 'paper.pdf')
+    part_path, _ = store._paths(upload_id)
+    with open(part_path, 'r+b') as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with pytest.raises(UploadBusy):
+            store.append(upload_id, 0, io.BytesIO(PDF), 1)
+    assert store.append(upload_id, 0, io.BytesIO(PDF), 1) == len(PDF)
+
+
+def test_store_pyqp_stream_accepts_short_first_read(app_module):
+    with app_module.app.app_context():
+        _, _, size = app_module.store_pyqp_stream(TrickleStream(PDF, 3))
+        assert size == len(PDF)
+        with pytest.raises(ValueError):
+            app_module.store_pyqp_stream(TrickleStream(b'%PDX' + PDF, 3))
+        with pytest.raises(ValueError):
+            app_module.store_pyqp_stream(io.BytesIO(b''))
+
+
+def test_later_chunks_are_not_checked_for_magic(store):
+    upload_id = store.create(1, 'paper.pdf', len(PDF))
+    store.append(upload_id, 0, io.BytesIO(PDF[:50]), 1)
+    assert store.append(upload_id, 50, io.BytesIO(PDF[50:]), 1) == len(PDF)
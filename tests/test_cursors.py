@@ -0,0 +1,46 @@
+import base64
+
+import pytest
+
+BAD_CURSORS = [
+    '!!!',
+    'abc',
+    base64.urlsafe_b64encode(b'not json').decode('ascii'),
+    base64.urlsafe_b64encode(b'[1]').decode('ascii'),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode('ascii'),
+]
+
+
+@pytest.mark.parametrize('cursor', BAD_CURSORS)
+def test_decode_created_cursor_rejects_garbage(app_module, cursor):
+    assert app_module.decode_created_cursor(cursor) is None
+
+
+@pytest.mark.parametrize('parameter', ['cursor', 'since'])
+@pytest.mark.parametrize('cursor', BAD_CURSORS)
+def test_announcements_api_rejects_bad_cursor(client, parameter, cursor):
+    response = client.get('/api/announcements', query_string={parameter: cursor})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_announcements_api_accepts_its_own_cursors(client):
+    first = client.get('/api/announcements', query_string={'limit': 1}).get_json()
+    assert first['since_cursor']
+    response = client.get('/api/announcements', query_string={'since': first['since_cursor']})
+    assert response.status_code == 200
+    assert response.get_json()['since_cursor'] == first['since_cursor']
+
+
+@pytest.mark.parametrize('cursor', BAD_CURSORS)
+def test_inbox_rejects_bad_cursor(admin_client, cursor):
+    response = admin_client.get('/api/messages', query_string={'view': 'all', 'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+    assert admin_client.get('/faculty/messages', query_string={'cursor': cursor}).status_code == 400
+
+
+def test_inbox_bulk_rejects_bad_through(admin_client):
+    response = admin_client.post('/faculty/messages/bulk', json={
+        'action': 'mark_read', 'scope': 'view', 'view': 'all', 'through': '!!!'})
+    assert response.status_code == 400
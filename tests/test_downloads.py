@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture
+def paper_id(upload_paper):
+    return upload_paper()
+
+
+def download_count(app_module, paper_id):
+    app_module.download_counter.flush()
+    with app_module.app.app_context():
+        row = app_module.db.session.get(app_module.PYQPDownloadCount, paper_id)
+        return row.download_count if row else 0
+
+
+def test_probe_then_full_fetch_counts_once(app_module, client, paper_id):
+    probe = client.get(f'/download_pyqp/{paper_id}', headers={'Range': 'bytes=0-99'})
+    assert probe.status_code == 206
+    assert download_count(app_module, paper_id) == 0
+
+    assert client.get(f'/download_pyqp/{paper_id}').status_code == 200
+    assert download_count(app_module, paper_id) == 1
+
+
+def test_range_covering_the_whole_file_counts(app_module, client, paper_id):
+    response = client.get(f'/download_pyqp/{paper_id}', headers={'Range': 'bytes=0-'})
+    assert response.status_code == 206
+    assert download_count(app_module, paper_id) == 1
+    client.get(f'/download_pyqp/{paper_id}', headers={'Range': 'bytes=100-'})
+    assert download_count(app_module, paper_id) == 1
@@ -0,0 +1,32 @@
+import json
+
+
+def test_image_urls_follow_the_script_root(app_module):
+    app = app_module.app
+    with app.test_request_context('/'):
+        assert app_module.get_image_url(None) == '/static/images/image-placeholder.svg'
+    with app.test_request_context('/', base_url='http://localhost/school/'):
+        assert app_module.get_image_url(None) == '/school/static/images/image-placeholder.svg'
+
+
+def test_image_urls_follow_a_reloaded_static_manifest(app_module, monkeypatch):
+    app = app_module.app
+    with app.test_request_context('/'):
+        assert app_module.get_image_url('') == '/static/images/image-placeholder.svg'
+        monkeypatch.setattr(app_module.static_manifest, 'entries',
+                            {'images/image-placeholder.svg': 'dist/images/image-placeholder.0123abcd.svg'})
+        assert app_module.get_image_url('') == '/static/dist/images/image-placeholder.0123abcd.svg'
+
+
+def test_image_sources_follow_the_script_root(app_module):
+    variants = json.dumps({'source': 'photos/a.jpg', 'width': 400, 'height': 500, 'variants': {
+        'webp': [[320, 'photos/variants/ab/abc/320.webp']],
+        'jpeg': [[320, 'photos/variants/ab/abc/320.jpg']]}})
+    app = app_module.app
+    with app.test_request_context('/'):
+        plain = app_module.get_image_sources('photos/a.jpg', variants)
+    with app.test_request_context('/', base_url='http://localhost/school/'):
+        prefixed = app_module.get_image_sources('photos/a.jpg', variants)
+    assert plain['src'] == '/uploads/photos/variants/ab/abc/320.jpg'
+    assert prefixed['src'] == '/school/uploads/photos/variants/ab/abc/320.jpg'
+    assert prefixed['sources'][0]['srcset'] == '/school/uploads/photos/variants/ab/abc/320.webp 320w'
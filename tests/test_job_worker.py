@@ -0,0 +1,114 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from job_worker import JobWorker
+
+
+def square(value):
+    return value * value
+
+
+class Recorder:
+    """claim/complete/fail callables over an in-memory queue of values.
+    Jobs are claimed in batches, each once the previous one has finished,
+    so tests know exactly what is running."""
+
+    def __init__(self, values, before_claim=None):
+        self.queue = list(enumerate(values, 1))
+        self.before_claim = before_claim
+        self.claims = 0
+        self.outstanding = 0
+        self.completed = {}
+        self.failed = {}
+        self.lock = threading.Lock()
+
+    def claim(self, limit):
+        if self.outstanding:
+            return []
+        self.claims += 1
+        if self.before_claim:
+            self.before_claim(self)
+        with self.lock:
+            batch, self.queue = self.queue[:limit], self.queue[limit:]
+        self.outstanding = len(batch)
+        return [(job_id, (value,)) for job_id, value in batch]
+
+    def complete(self, job_id, result):
+        self.outstanding -= 1
+        self.completed[job_id] = result
+
+    def fail(self, job_id, error):
+        self.outstanding -= 1
+        self.failed[job_id] = error
+        # Failed jobs are queued again, as record_pdf_job_failure does
+        with self.lock:
+            self.queue.append((job_id, job_id + 1))
+
+
+def kill_pool_workers(recorder):
+    # Kill the pool's processes between polls, after the first batch ran
+    if recorder.claims == 2:
+        for child in multiprocessing.active_children():
+            child.kill()
+            child.join()
+        time.sleep(0.5)
+
+
+def test_run_recovers_when_a_worker_dies_between_polls():
+    recorder = Recorder([2, 3, 4, 5], before_claim=kill_pool_workers)
+    worker = JobWorker(recorder.claim, square, recorder.complete, recorder.fail,
+                       processes=2, poll_interval=0.1)
+    worker.run(until_idle=True)
+
+    # The jobs claimed into the dead pool failed instead of killing the
+    # dispatcher, and were queued for a retry
+    assert sorted(recorder.completed) == [1, 2]
+    assert sorted(recorder.failed) == [3, 4]
+    assert all(isinstance(error, BrokenProcessPool) for error in recorder.failed.values())
+
+    # The retries run in a working pool
+    worker.run(until_idle=True)
+    assert sorted(recorder.completed) == [1, 2, 3, 4]
+    assert not recorder.queue
+
+
+class ShutDownExecutor:
+    """A pool that refuses new work, as at interpreter exit."""
+
+    def __init__(self, processes, mp_context=None):
+        pass
+
+    def submit(self, *args):
+        raise RuntimeError('cannot schedule new futures after shutdown')
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_run_releases_claimed_jobs_when_the_pool_is_shut_down(monkeypatch):
+    import concurrent.futures
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', ShutDownExecutor)
+    recorder = Recorder([2, 3])
+    worker = JobWorker(recorder.claim, square, recorder.complete, recorder.fail,
+                       processes=2, poll_interval=0.1)
+
+    # Returns instead of the dispatcher thread dying with the exception
+    assert worker.run() == 2
+    assert sorted(recorder.failed) == [1, 2]
+    assert all(isinstance(error, RuntimeError) for error in recorder.failed.values())
+    assert recorder.claims == 1
+
+
+def test_stop_records_jobs_still_running():
+    recorder = Recorder([2])
+    worker = JobWorker(recorder.claim, time.sleep, recorder.complete, recorder.fail,
+                       processes=1, poll_interval=0.1)
+    recorder.queue = [(1, 0.5)]
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    time.sleep(0.2)
+    worker.stop()
+    thread.join(5)
+    assert recorder.completed == {1: None}
@@ -0,0 +1,20 @@
+def attempt(client, username, ip):
+    return client.post('/faculty/login', data={'username': username, 'password': 'wrong'},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def test_bad_passwords_from_one_address_do_not_lock_out_others(client):
+    for _ in range(5):
+        assert attempt(client, 'admin', '203.0.113.7').status_code == 200
+    assert attempt(client, 'admin', '203.0.113.7').status_code == 429
+
+    # The same account from another address, and another account from the
+    # limited address, can still log in
+    assert attempt(client, 'admin', '198.51.100.4').status_code == 200
+    assert attempt(client, 'someone-else', '203.0.113.7').status_code == 200
+
+
+def test_guesses_spread_over_addresses_hit_the_username_limit(client):
+    statuses = [attempt(client, 'guessed-user', f'192.0.2.{n // 5}').status_code for n in range(31)]
+    assert statuses[:30] == [200] * 30
+    assert statuses[30] == 429
@@ -0,0 +1,17 @@
+def test_remote_seed_photos_are_not_queued(app_module):
+    with app_module.app.app_context():
+        remote = [member for member in app_module.FacultyMember.query
+                  if app_module.is_remote_image(member.image_path)]
+        assert remote
+        assert app_module.enqueue_missing_photo_jobs() == 0
+        assert not any(member.photo_jobs for member in remote)
+
+
+def test_remote_jobs_are_dropped_when_fetching_is_off(app_module):
+    with app_module.app.app_context():
+        member = next(member for member in app_module.FacultyMember.query
+                      if app_module.is_remote_image(member.image_path))
+        app_module.db.session.add(app_module.PhotoJob(faculty_member=member, image_path=member.image_path))
+        app_module.db.session.commit()
+        assert app_module.claim_photo_jobs(10) == []
+        assert app_module.PhotoJob.query.count() == 0
@@ -0,0 +1,43 @@
+import base64
+
+import pytest
+
+BAD_CURSORS = [
+    '!!!',
+    base64.urlsafe_b64encode(b'not json').decode('ascii'),
+    base64.urlsafe_b64encode(b'[2023, "Maths"]').decode('ascii'),
+    base64.urlsafe_b64encode(b'["last year", "Maths", 1]').decode('ascii'),
+]
+
+
+@pytest.mark.parametrize('cursor', BAD_CURSORS)
+def test_bad_cursor_is_rejected(client, cursor):
+    response = client.get('/api/pyqp', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+    assert client.get('/pyqp', query_string={'cursor': cursor}).status_code == 400
+
+
+def test_cursors_page_through_the_catalogue(client, upload_paper):
+    for year in (2001, 2002, 2003):
+        upload_paper(subject='Geography', year=year)
+    first = client.get('/api/pyqp', query_string={'subject': 'Geography', 'limit': 2}).get_json()
+    second = client.get('/api/pyqp', query_string={'subject': 'Geography', 'limit': 2,
+                                                   'cursor': first['next_cursor']}).get_json()
+    assert [paper['year'] for paper in first['papers'] + second['papers']] == [2003, 2002, 2001]
+    assert second['next_cursor'] is None
+
+
+def test_like_search_treats_wildcards_literally(app_module, client, upload_paper, monkeypatch):
+    monkeypatch.setattr(app_module, 'search_index_available', lambda: False)
+    upload_paper(subject='Chemistry', year=2010, description='Covers 100% of the syllabus')
+    upload_paper(subject='Chemistry', year=2011, description='Unit_3 and unit 4')
+
+    def descriptions(q):
+        papers = client.get('/api/pyqp', query_string={'q': q}).get_json()['papers']
+        return sorted(paper['description'] for paper in papers)
+
+    assert descriptions('100%') == ['Covers 100% of the syllabus']
+    assert descriptions('%') == ['Covers 100% of the syllabus']
+    assert descriptions('t_3') == ['Unit_3 and unit 4']
+    assert descriptions('_') == ['Unit_3 and unit 4']
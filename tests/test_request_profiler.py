@@ -0,0 +1,64 @@
+import re
+import time
+
+from flask import Flask, Response, send_file
+
+from request_profiler import RequestProfiler
+
+
+def phase_sum(profiler, endpoint, phase):
+    pattern = r'app_request_phase_seconds_sum\{endpoint="%s",method="GET",phase="%s"\} ([0-9.]+)' % (endpoint, phase)
+    match = re.search(pattern, profiler.render_metrics())
+    return float(match.group(1)) if match else None
+
+
+def test_file_phase_times_the_body_being_sent():
+    app = Flask(__name__)
+    app.config['REQUEST_PROFILING'] = True
+    profiler = RequestProfiler(app)
+
+    def slow_body():
+        for _ in range(3):
+            time.sleep(0.05)
+            yield b'x' * 1024
+
+    @app.route('/file')
+    def send():
+        # As send_file does, the body is only read once the view has returned
+        return Response(slow_body(), direct_passthrough=True)
+
+    @app.route('/page')
+    def page():
+        return 'hello'
+
+    client = app.test_client()
+    response = client.get('/file')
+    assert 'File send' not in response.headers['Server-Timing']
+    assert len(response.get_data()) == 3 * 1024
+    response.close()
+    client.get('/page').close()
+
+    assert phase_sum(profiler, 'send', 'file') >= 0.15
+    assert phase_sum(profiler, 'page', 'file') is None
+
+
+def test_send_file_responses_are_recorded(tmp_path):
+    app = Flask(__name__)
+    app.config['REQUEST_PROFILING'] = True
+    profiler = RequestProfiler(app)
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'%PDF-' + b'x' * 4096)
+
+    @app.route('/download')
+    def download():
+        return send_file(str(path), conditional=True)
+
+    client = app.test_client()
+    response = client.get('/download')
+    assert len(response.get_data()) == 4101
+    response.close()
+    client.get('/download', headers={'Range': 'bytes=0-9'}).close()
+
+    assert phase_sum(profiler, 'download', 'file') is not None
+    assert 'app_requests_total{endpoint="download",method="GET",status="200"} 1' in profiler.render_metrics()
+    assert 'app_requests_total{endpoint="download",method="GET",status="206"} 1' in profiler.render_metrics()
@@ -0,0 +1,16 @@
+def test_requests_are_refused_until_the_schema_is_upgraded(app_module, client, monkeypatch):
+    with app_module.app.app_context():
+        app_module.db.session.execute(app_module.text('DROP TABLE pyqp_download_daily'))
+        app_module.db.session.execute(app_module.text('ALTER TABLE faculty_member DROP COLUMN image_variants'))
+        app_module.db.session.commit()
+        assert sorted(app_module.missing_schema()) == ['faculty_member.image_variants', 'pyqp_download_daily']
+    monkeypatch.setattr(app_module, 'db_ready', False)
+    monkeypatch.setitem(app_module.app.config, 'AUTO_INIT_DB', False)
+
+    response = client.get('/')
+    assert response.status_code == 503
+    assert b'flask --app app init-db' in response.data
+
+    app_module.init_db(seed=False)
+    assert client.get('/').status_code == 200
+    assert client.get('/').status_code == 200
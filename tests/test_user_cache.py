@@ -0,0 +1,56 @@
+import pytest
+
+
+@pytest.fixture
+def teacher(app_module):
+    with app_module.app.app_context():
+        faculty = app_module.Faculty.query.filter_by(username='cache-test').first()
+        if faculty is None:
+            faculty = app_module.Faculty(username='cache-test', email='cache-test@example.com',
+                                         name='Cache Test', role='Teacher')
+            faculty.set_password('first-password')
+            app_module.db.session.add(faculty)
+        faculty.is_active = True
+        app_module.db.session.commit()
+        return faculty.id
+
+
+@pytest.fixture
+def teacher_client(app_module, client, teacher):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(teacher)
+    return client
+
+
+def update_elsewhere(app_module, teacher, **values):
+    # A plain UPDATE, as another worker's change looks to this process: no
+    # ORM event invalidates the cached copy
+    assignments = ', '.join(f'{name} = :{name}' for name in values)
+    with app_module.app.app_context():
+        app_module.db.session.execute(app_module.text(f'UPDATE faculty SET {assignments} WHERE id = :id'),
+                                      dict(values, id=teacher))
+        app_module.db.session.commit()
+
+
+def test_deactivated_user_is_logged_out_despite_the_cache(app_module, teacher_client, teacher):
+    assert teacher_client.get('/faculty/dashboard').status_code == 200
+    assert teacher_client.get('/faculty/dashboard').status_code == 200
+    assert app_module.user_cache.get(teacher) is not None
+
+    update_elsewhere(app_module, teacher, is_active=False)
+    response = teacher_client.get('/faculty/dashboard')
+    assert response.status_code == 302
+    assert '/faculty/login' in response.headers['Location']
+
+
+def test_password_change_elsewhere_refreshes_the_cache(app_module, teacher_client, teacher):
+    assert teacher_client.get('/faculty/dashboard').status_code == 200
+    old_hash = app_module.user_cache.get(teacher)['password_hash']
+    with app_module.app.app_context():
+        replacement = app_module.Faculty()
+        replacement.set_password('second-password')
+
+    update_elsewhere(app_module, teacher, password_hash=replacement.password_hash)
+    assert teacher_client.get('/faculty/dashboard').status_code == 200
+    cached = app_module.user_cache.get(teacher)
+    assert cached['password_hash'] == replacement.password_hash != old_hash